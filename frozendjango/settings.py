@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'thewall.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,9 +85,17 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Second connection to the same file for the read endpoints, see thewall.db
+    'readonly': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['thewall.db.ReadWriteRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -143,4 +152,74 @@ WALL_CONSTRUCTION = {
     'CUBIC_YARDS_PER_CREW_PER_DAY': 195,
     'COST_PER_CUBIC_YARD': 1900,
     'MAX_HEIGHT': 30,
+    # Rows per INSERT statement when ingesting plans and progress
+    'BULK_BATCH_SIZE': 2000,
+    # Worker processes for the 'processes' engine, None uses all CPUs
+    'WORKERS': None,
+    # Read endpoint cache: in-process LRU entries, then this CACHES alias (None to disable)
+    'RESPONSE_CACHE_SIZE': 1024,
+    'RESPONSE_CACHE_ALIAS': 'default',
+    'RESPONSE_CACHE_TIMEOUT': 3600,
+    # Maximum number of (profile, day) lookups per batch request
+    'BATCH_LOOKUP_LIMIT': 10000,
+    # Rows fetched per round-trip when streaming a profile's series
+    'SERIES_CHUNK_SIZE': 5000,
+    # Store one DailyProgress row per profile and day next to the progress
+    # segments. The API reads the segments only, so long team-limited plans
+    # can turn this off to keep the database small.
+    'STORE_DAILY_PROGRESS': True,
+    # Progress batches buffered between the simulation and the writer thread
+    # (0 writes in the simulating thread), and rows per writer transaction
+    'WRITE_QUEUE_SIZE': 8,
+    'WRITE_TRANSACTION_ROWS': 20000,
+    # Progress segments kept by the simulation result store before the least
+    # recently used results are evicted, 0 disables reuse of results
+    'RESULT_STORE_MAX_ROWS': 1000000,
+    # Seconds after which a background job that is still queued or running
+    # but known to no process is reported as failed
+    'JOB_TIMEOUT': 3600,
+    # Seconds a replaced plan version is kept for requests still reading it
+    # before it is deleted in the background
+    'PLAN_GC_DELAY': 5,
+    # Seconds after which a version still being built is taken for abandoned
+    # (its process died mid-upload) and deleted
+    'PLAN_BUILD_TIMEOUT': 3600,
+    # Pragmas of every SQLite connection: WAL lets readers run while an upload
+    # writes, NORMAL only syncs at checkpoints in WAL mode
+    'SQLITE_PRAGMAS': {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # KiB
+    },
+    # Alias of the read endpoints, None reads from 'default'
+    'READ_DATABASE': 'readonly',
+    # Pragmas while an upload writes a plan version that nothing reads yet
+    'BULK_LOAD_PRAGMAS': {
+        'synchronous': 'off',
+    },
+    # Request latency and SQL metrics per URL name at /thewall/metrics/
+    'METRICS_ENABLED': True,
+    # Construction log of the team-limited engines (wall_progress.log, JSON lines).
+    # Events wait in a bounded queue for the log writer thread; when it is full
+    # 'block' makes the simulation wait up to PROGRESS_LOG_BLOCK_SECONDS and then
+    # drops the batch, 'drop_oldest' and 'drop_newest' lose events right away
+    'PROGRESS_LOG_ENABLED': True,
+    'PROGRESS_LOG_QUEUE_SIZE': 10000,
+    'PROGRESS_LOG_OVERFLOW': 'block',
+    'PROGRESS_LOG_BLOCK_SECONDS': 1.0,
+    # Lines per page of the log viewer on the dashboard and of /thewall/log/
+    'LOG_PAGE_LINES': 200,
+    # Live events at /thewall/live/: events kept for the clients that fall
+    # behind (slower ones skip ahead and get the coalesced state), and the
+    # idle seconds after which a keep-alive comment is sent
+    'LIVE_BUFFER_EVENTS': 20000,
+    'LIVE_HEARTBEAT_SECONDS': 15,
+    # Route the day and overview endpoints to their async versions. Meant for
+    # ASGI servers; under WSGI every request would start an event loop
+    'ASYNC_READ_VIEWS': False,
+    # pstats dumps of uploads made with ?profile=cprofile (None is
+    # BASE_DIR/upload_profiles) and how many of them are kept
+    'PROFILE_DIR': None,
+    'PROFILE_KEEP': 20,
 }
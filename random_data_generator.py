@@ -1,27 +1,20 @@
-import csv
-import random
+import argparse
 
-lines = 50
-max_values_per_line = 500
-value_range = (0, 30)
+from thewall.datasets import DISTRIBUTIONS, SIZES, generate_plan, write_csv
 
-print('Generating large CSV file...')
+parser = argparse.ArgumentParser(description='Generate a seeded wall plan as a CSV upload file.')
+parser.add_argument('--size', choices=list(SIZES), default='small')
+parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='uniform')
+parser.add_argument('--seed', type=int, default=1)
+parser.add_argument('--output', default='test_data/test_valid_big.csv')
+args = parser.parse_args()
 
-with open('test_data/test_valid_big.csv', 'w', newline='') as csvfile:
-    writer = csv.writer(csvfile)
+profiles, sections = SIZES[args.size]
+print(f'Generating {profiles} x {sections} plan ({args.distribution}, seed {args.seed})...')
 
-    for line_num in range(1, lines + 1):
-        num_values = random.randint(1, max_values_per_line)
-
-        row = [random.randint(value_range[0], value_range[1]) for _ in range(num_values)]
-
-        writer.writerow(row)
-
-        if line_num % 50 == 0:
-            print(f'Generated {line_num}/{lines} lines...')
+write_csv(generate_plan(args.size, args.distribution, args.seed), args.output)
 
 print('CSV file generated successfully!')
-print(f'File: test_data/test_valid_big.csv')
-print(f'Lines: {lines}')
-print(f'Max values per line: {max_values_per_line}')
-print(f'Value range: {value_range[0]}-{value_range[1]}')
+print(f'File: {args.output}')
+print(f'Lines: {profiles}')
+print(f'Values per line: {sections}')
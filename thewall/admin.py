@@ -1,6 +1,28 @@
 from django.contrib import admin
-from .models import Profile, Section, DailyProgress
+from .models import Plan, Profile, Section, DailyProgress, SimulationJob, ProgressSegment, SimulationResult, DatasetState
 
+admin.site.register(Plan)
 admin.site.register(Profile)
-admin.site.register(Section)
 admin.site.register(DailyProgress)
+admin.site.register(SimulationJob)
+admin.site.register(ProgressSegment)
+admin.site.register(SimulationResult)
+admin.site.register(DatasetState)
+
+
+@admin.register(Section)
+class SectionAdmin(admin.ModelAdmin):
+    """
+    Read-only: sections are unpacked from Profile.heights by the sections view.
+    """
+    list_display = ('id', 'profile', 'height')
+    list_select_related = ('profile',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class ThewallConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'thewall'
+
+    def ready(self):
+        from thewall.db import configure_connection
+        from thewall.metrics import install_query_counter
+
+        connection_created.connect(configure_connection, dispatch_uid='thewall.configure_connection')
+        connection_created.connect(install_query_counter, dispatch_uid='thewall.install_query_counter')
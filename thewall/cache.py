@@ -0,0 +1,273 @@
+"""
+Response cache for the read endpoints.
+
+The data behind the GET endpoints only changes when the daily progress is
+recalculated, which bumps DatasetState.generation. Cached responses are keyed
+on that generation, so an upload invalidates everything at once without
+deleting any entry. Lookups go to a bounded in-process LRU first and to
+Django's cache framework second; the ETag lets clients revalidate with
+If-None-Match and get a 304.
+"""
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import threading
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotModified
+
+from thewall.models import DatasetState
+
+CACHE_KEY_PREFIX = 'thewall:response'
+
+
+def current_generation():
+    """
+    Generation of the stored dataset, 0 before the first calculation.
+    """
+    return DatasetState.objects.filter(pk=1).values_list('generation', flat=True).first() or 0
+
+
+async def acurrent_generation():
+    """
+    Async version of current_generation().
+    """
+    return await DatasetState.objects.filter(pk=1).values_list('generation', flat=True).afirst() or 0
+
+
+def bump_generation(**fields):
+    """
+    Mark the stored dataset as changed, in the same UPDATE as the other
+    DatasetState fields given. Call inside the transaction that changes it.
+    """
+    if not DatasetState.objects.filter(pk=1).update(generation=F('generation') + 1, **fields):
+        DatasetState.objects.create(pk=1, generation=1, **fields)
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded mapping that evicts the least recently used entry.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CacheStats:
+    """
+    Hit and miss counters of this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.memory_hits = 0
+            self.shared_hits = 0
+            self.not_modified = 0
+            self.misses = 0
+
+    def record(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    @property
+    def hit_ratio(self):
+        hits = self.memory_hits + self.shared_hits + self.not_modified
+        total = hits + self.misses
+        return hits / total if total else 0.0
+
+    def as_dict(self):
+        return {
+            'memory_hits': self.memory_hits,
+            'shared_hits': self.shared_hits,
+            'not_modified': self.not_modified,
+            'misses': self.misses,
+            'hit_ratio': round(self.hit_ratio, 4),
+        }
+
+
+memory_cache = LRUCache(settings.WALL_CONSTRUCTION.get('RESPONSE_CACHE_SIZE', 1024))
+stats = CacheStats()
+
+
+def clear():
+    """
+    Drop every cached response of this process and of the shared cache.
+    """
+    memory_cache.clear()
+    shared = _shared_cache()
+    if shared is not None:
+        shared.clear()
+
+
+def _shared_cache():
+    alias = settings.WALL_CONSTRUCTION.get('RESPONSE_CACHE_ALIAS', 'default')
+    return caches[alias] if alias else None
+
+
+OUTCOME_HEADERS = {
+    'memory_hits': 'HIT',
+    'shared_hits': 'HIT-SHARED',
+    'not_modified': 'REVALIDATED',
+    'misses': 'MISS',
+}
+
+
+def _finish(response, etag, outcome):
+    stats.record(outcome)
+    response['ETag'] = etag
+    response['X-Cache'] = OUTCOME_HEADERS[outcome]
+    response['X-Cache-Hit-Ratio'] = f"{stats.hit_ratio:.4f}"
+    return response
+
+
+def _cached(entry):
+    content, content_type = entry
+    return HttpResponse(content, content_type=content_type)
+
+
+def _request_key(request, generation):
+    """
+    Cache key and ETag of a request for a dataset generation.
+    """
+    digest = hashlib.sha1(
+        f"{request.get_full_path()}|{request.headers.get('Accept', '')}".encode('utf-8')
+    ).hexdigest()[:20]
+    return f"{CACHE_KEY_PREFIX}:{generation}:{digest}", f'"{generation}-{digest}"'
+
+
+def _answer_locally(request, key, etag):
+    """
+    The response to a request the client or this process already has, or None.
+    """
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return _finish(HttpResponseNotModified(), etag, 'not_modified')
+
+    entry = memory_cache.get(key)
+    if entry is not None:
+        return _finish(_cached(entry), etag, 'memory_hits')
+    return None
+
+
+def _shared_hit(entry, key, etag):
+    memory_cache.set(key, entry)
+    return _finish(_cached(entry), etag, 'shared_hits')
+
+
+def _cache_entry(response):
+    """
+    Render a fresh response and return its (content, content_type) entry, or
+    None when it is not worth caching.
+    """
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+
+    content_type = response.get('Content-Type', '')
+    if response.status_code == 200 and content_type.startswith('application/json'):
+        entry = (response.content, content_type)
+        return entry
+    return None
+
+
+def _timeout():
+    return settings.WALL_CONSTRUCTION.get('RESPONSE_CACHE_TIMEOUT', 3600)
+
+
+def cached_response(view):
+    """
+    Cache successful JSON responses of a GET view per dataset generation.
+
+    Wraps the view returned by @api_view, so it sees the final rendered
+    response. The key covers the full path and the Accept header; only
+    200 responses rendered as JSON are stored. Async views are wrapped in
+    an async wrapper that reads the generation and the shared cache with
+    the async APIs.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view(request, *args, **kwargs)
+
+            key, etag = _request_key(request, await acurrent_generation())
+            response = _answer_locally(request, key, etag)
+            if response is not None:
+                return response
+
+            shared = _shared_cache()
+            if shared is not None:
+                entry = await shared.aget(key)
+                if entry is not None:
+                    return _shared_hit(entry, key, etag)
+
+            response = await view(request, *args, **kwargs)
+            entry = _cache_entry(response)
+            if entry is None:
+                stats.record('misses')
+                return response
+            memory_cache.set(key, entry)
+            if shared is not None:
+                await shared.aset(key, entry, _timeout())
+            return _finish(response, etag, 'misses')
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+
+        key, etag = _request_key(request, current_generation())
+        response = _answer_locally(request, key, etag)
+        if response is not None:
+            return response
+
+        shared = _shared_cache()
+        if shared is not None:
+            entry = shared.get(key)
+            if entry is not None:
+                return _shared_hit(entry, key, etag)
+
+        response = view(request, *args, **kwargs)
+        entry = _cache_entry(response)
+        if entry is None:
+            stats.record('misses')
+            return response
+        memory_cache.set(key, entry)
+        if shared is not None:
+            shared.set(key, entry, _timeout())
+        return _finish(response, etag, 'misses')
+
+    return wrapper
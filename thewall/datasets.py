@@ -0,0 +1,65 @@
+"""
+Seeded wall plans for benchmarks and tests.
+
+A plan is built from a named size and height distribution. The same seed,
+size and distribution always give the same plan, whatever else was
+generated before, so benchmark runs are comparable across machines and
+commits. Nothing here needs Django, random_data_generator.py uses it as a
+plain script.
+"""
+from array import array
+import csv
+import random
+
+from thewall.parsing import MAX_HEIGHT, MAX_LINES, MAX_VALUES_PER_LINE
+
+# (profiles, sections per profile), from a few sections up to the upload limit
+SIZES = {
+    'tiny': (5, 20),
+    'small': (50, 500),
+    'medium': (150, 1000),
+    'full': (MAX_LINES, MAX_VALUES_PER_LINE),
+}
+
+DISTRIBUTIONS = ('uniform', 'skewed', 'zero', 'near_complete')
+
+
+def _heights(rng, distribution, max_height):
+    if distribution == 'uniform':
+        return lambda: rng.randint(0, max_height)
+    if distribution == 'skewed':
+        # Most sections start low, a few are almost done: long tails of work on few profiles
+        return lambda: int(max_height * rng.random() ** 3)
+    if distribution == 'zero':
+        return lambda: 0
+    if distribution == 'near_complete':
+        return lambda: rng.randint(max(0, max_height - 2), max_height)
+    raise ValueError(f"Unknown distribution '{distribution}'. Use one of: {', '.join(DISTRIBUTIONS)}")
+
+
+def generate_plan(size, distribution='uniform', seed=1, max_height=MAX_HEIGHT):
+    """
+    Section heights of a generated plan.
+
+    Args:
+        size (str or tuple): One of SIZES, or a (profiles, sections) pair.
+        distribution (str): One of DISTRIBUTIONS.
+        seed (int): Seed of the plan; each size and distribution gets its own stream.
+        max_height (int): Height at which a section is complete.
+
+    Returns:
+        list: One array('B') of section heights per profile, like
+            thewall.parsing.parse_plan_chunks() returns them.
+    """
+    profiles, sections = SIZES[size] if isinstance(size, str) else size
+    rng = random.Random(f"{seed}:{profiles}x{sections}:{distribution}")
+    height = _heights(rng, distribution, max_height)
+    return [array('B', [height() for _ in range(sections)]) for _ in range(profiles)]
+
+
+def write_csv(plan, path):
+    """
+    Write a plan as an upload file, one line of heights per profile.
+    """
+    with open(path, 'w', newline='') as csv_file:
+        csv.writer(csv_file).writerows(plan)
@@ -0,0 +1,131 @@
+"""
+SQLite connection setup and read/write routing.
+
+Every new SQLite connection gets the pragmas of
+settings.WALL_CONSTRUCTION['SQLITE_PRAGMAS']; with WAL journaling readers
+no longer wait for a writer to commit. The read endpoints run their
+queries on the READ_DATABASE alias, a second connection to the same file
+that refuses writes, while uploads keep the default connection to
+themselves. bulk_load() relaxes durability while a plan version is written.
+"""
+from contextlib import contextmanager
+import contextvars
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_reading = contextvars.ContextVar('thewall_reading', default=False)
+
+
+def get_read_alias():
+    """
+    Database alias of the read endpoints, settings.WALL_CONSTRUCTION['READ_DATABASE'].
+    Falls back to the default alias when it is unset or not configured.
+    """
+    alias = settings.WALL_CONSTRUCTION.get('READ_DATABASE')
+    return alias if alias in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+def configure_connection(sender, connection, **kwargs):
+    """
+    connection_created receiver applying the configured pragmas to SQLite connections.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.WALL_CONSTRUCTION.get('SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        if connection.alias != DEFAULT_DB_ALIAS and connection.alias == get_read_alias():
+            cursor.execute("PRAGMA query_only = ON")
+
+
+@contextmanager
+def reading():
+    """
+    Route the reads made inside the block to the read alias.
+    """
+    token = _reading.set(True)
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+def read_database(view):
+    """
+    Run a read-only view, sync or async, with its queries routed to the read alias.
+
+    The flag is a context variable, so the async ORM calls of an async view,
+    which run in a worker thread, carry it along.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            with reading():
+                return await view(*args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with reading():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class ReadWriteRouter:
+    """
+    Send reads made inside reading() to the read alias, everything else to default.
+
+    A read stays on the default connection while that connection has a
+    transaction open in the same thread, so it sees the writes of that
+    transaction.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _reading.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return get_read_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def bulk_load(using=DEFAULT_DB_ALIAS):
+    """
+    Apply settings.WALL_CONSTRUCTION['BULK_LOAD_PRAGMAS'] to a connection for
+    the duration of the block, restoring the previous values afterwards.
+
+    Meant for writing a plan version that nothing reads yet: with
+    synchronous = OFF a power loss can lose the last commits, so the switch
+    over to the version should happen after the block, at the normal level.
+    SQLite does not change the safety level inside a transaction, so within
+    one the block runs with the caller's settings.
+    """
+    connection = connections[using]
+    pragmas = settings.WALL_CONSTRUCTION.get('BULK_LOAD_PRAGMAS', {})
+    if connection.vendor != 'sqlite' or not pragmas or connection.in_atomic_block:
+        yield
+        return
+
+    with connection.cursor() as cursor:
+        previous = {}
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}")
+            previous[name] = cursor.fetchone()[0]
+            cursor.execute(f"PRAGMA {name} = {value}")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for name, value in previous.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
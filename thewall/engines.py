@@ -0,0 +1,298 @@
+"""
+Simulation engines for the wall construction.
+
+The functions in this module are pure: they work on plain section heights
+and return per-day tallies, without touching the database. The views are
+responsible for loading the plan and persisting the results.
+"""
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+
+
+def height_histogram(heights, max_height):
+    """
+    Count the unfinished sections of a profile by height.
+
+    Args:
+        heights (iterable of int): Initial section heights of one profile,
+            as a list, tuple, bytes or array for the fastest counting.
+        max_height (int): Height at which a section is complete.
+
+    Returns:
+        list: counts[h] is the number of sections starting at height h,
+        for h in 0..max_height-1. Finished sections are ignored.
+    """
+    if not isinstance(heights, (list, tuple, bytes, array)):
+        heights = list(heights)
+    # One C-level scan per bucket is much faster than a Python loop per section
+    return [heights.count(height) for height in range(max_height)]
+
+
+def unlimited_crew_series(histogram):
+    """
+    Active crews per day for one profile when every section has its own crew.
+
+    A section starting at height h is worked on days 1..(max_height - h), so
+    on day d the active crews are the sections with h <= max_height - d.
+
+    Args:
+        histogram (list): Output of height_histogram().
+
+    Returns:
+        list: series[d - 1] is the number of active crews on day d. Only
+        working days are included, so the list is empty for a finished
+        profile.
+    """
+    max_height = len(histogram)
+    series = []
+
+    # prefix[h] = number of sections starting at height h or lower
+    prefix = []
+    active = 0
+    for count in histogram:
+        active += count
+        prefix.append(active)
+
+    for day in range(1, max_height + 1):
+        crews = prefix[max_height - day]
+        if crews == 0:
+            break
+        series.append(crews)
+    return series
+
+
+def daily_progress_rows(profile_series, config):
+    """
+    Expand per-profile crew series into DailyProgress field tuples.
+
+    Args:
+        profile_series (iterable): (profile_id, series) pairs, where series[d - 1]
+            is the number of active crews on day d.
+        config (dict): settings.WALL_CONSTRUCTION
+
+    Yields:
+        tuple: (profile_id, day, active_crews, ice_amount, cost) for every
+        day with at least one active crew.
+    """
+    yards_per_crew = config['CUBIC_YARDS_PER_CREW_PER_DAY']
+    cost_per_yard = config['COST_PER_CUBIC_YARD']
+
+    for profile_id, series in profile_series:
+        for day, crews in enumerate(series, 1):
+            if crews > 0:
+                ice_amount = crews * yards_per_crew
+                yield (profile_id, day, crews, ice_amount, ice_amount * cost_per_yard)
+
+
+def expected_daily_rows(plan, max_height, num_teams=None):
+    """
+    Estimate of the DailyProgress rows a plan produces, to report progress
+    while they are written.
+
+    With a crew per section (num_teams None) it is exact: a profile has a
+    row on every day until its lowest section is complete. With num_teams
+    teams on the first unfinished sections in plan order, the plan takes
+    about work / num_teams days, each with a row for every profile that
+    num_teams consecutive unfinished sections span.
+
+    Args:
+        plan (iterable): Section heights per profile.
+        max_height (int): Height at which a section is complete.
+        num_teams (int): Number of available teams, None for one per section.
+
+    Returns:
+        int: Expected number of rows.
+    """
+    profiles = [heights for heights in plan if len(heights) and min(heights) < max_height]
+    if not profiles:
+        return 0
+    longest = max(max_height - min(heights) for heights in profiles)
+    if num_teams is None:
+        return sum(max_height - min(heights) for heights in profiles)
+
+    histograms = [height_histogram(heights, max_height) for heights in profiles]
+    pending = sum(map(sum, histograms))
+    work = sum(count * (max_height - height) for histogram in histograms for height, count in enumerate(histogram))
+    num_teams = max(1, num_teams)
+    days = max(-(-work // num_teams), longest)
+    # A window of num_teams sections starts in one profile and crosses a boundary every pending / profiles sections
+    window = min(num_teams, pending)
+    return min(days * len(profiles), days * (pending + (window - 1) * len(profiles)) // pending)
+
+
+def plan_sections(heights_by_profile):
+    """
+    Number the sections of a plan in plan order.
+
+    Args:
+        heights_by_profile (dict): profile_id -> section heights in plan order,
+            e.g. the arrays of thewall.ingestion.load_plan_heights().
+
+    Yields:
+        tuple: (profile_id, section_id, height), section ids counting from 1
+        across the whole plan like the rows of the sections view.
+    """
+    section_id = 0
+    for profile_id, heights in heights_by_profile.items():
+        for height in heights:
+            section_id += 1
+            yield (profile_id, section_id, height)
+
+
+def team_limited_runs(sections, num_teams, max_height, on_event=None):
+    """
+    Team-limited schedule, computed by jumping between section completion events.
+
+    On every day the teams work on the first num_teams unfinished sections in
+    plan order, adding one foot each. A team therefore stays on its section
+    until it is complete and then takes the next unstarted one. Between two
+    completion events the set of active sections does not change, so each
+    stretch of identical days is handled in a single step and the cost
+    depends on the number of sections and teams, not on the number of days.
+
+    Args:
+        sections (iterable): (profile_id, section_id, height) in plan order.
+        num_teams (int): Number of available teams. If None, one team per
+            unfinished section.
+        max_height (int): Height at which a section is complete.
+        on_event (callable): Optional callback, called as
+            on_event(event_type, day, team, profile_id, section_id) with
+            event_type 'completed' or 'relieved'.
+
+    Yields:
+        tuple: (profile_id, start_day, end_day, active_crews) for every maximal
+        run of days on which the profile has the same non-zero number of crews.
+    """
+    pending = [section for section in sections if section[2] < max_height]
+    if num_teams is None:
+        num_teams = len(pending)
+    num_teams = max(1, num_teams)
+    pending = iter(pending)
+
+    heap = []  # (finish_day, team, profile_id, section_id)
+    crews = {}  # profile_id -> active crews
+    run_start = {}  # profile_id -> first day of the current run
+
+    def assign(team, day):
+        section = next(pending, None)
+        if section is None:
+            if on_event is not None:
+                on_event('relieved', day, team, None, None)
+            return None
+        profile_id, section_id, height = section
+        heapq.heappush(heap, (day + max_height - height - 1, team, profile_id, section_id))
+        return profile_id
+
+    day = 1
+    started = [assign(team, day) for team in range(1, num_teams + 1)]
+    for profile_id in started:
+        if profile_id is not None:
+            crews[profile_id] = crews.get(profile_id, 0) + 1
+            run_start.setdefault(profile_id, day)
+
+    while heap:
+        finish_day = heap[0][0]
+        before = {}
+        freed = []
+        while heap and heap[0][0] == finish_day:
+            _, team, profile_id, section_id = heapq.heappop(heap)
+            if on_event is not None:
+                on_event('completed', finish_day, team, profile_id, section_id)
+            before.setdefault(profile_id, crews[profile_id])
+            crews[profile_id] -= 1
+            freed.append(team)
+
+        day = finish_day + 1
+        for team in sorted(freed):
+            profile_id = assign(team, day)
+            if profile_id is not None:
+                before.setdefault(profile_id, crews.get(profile_id, 0))
+                crews[profile_id] = crews.get(profile_id, 0) + 1
+
+        # Close the runs of the profiles whose crew count changed
+        for profile_id, previous in before.items():
+            current = crews[profile_id]
+            if current == previous:
+                continue
+            if previous > 0:
+                yield (profile_id, run_start[profile_id], finish_day, previous)
+            if current > 0:
+                run_start[profile_id] = day
+            else:
+                del crews[profile_id]
+                del run_start[profile_id]
+
+
+def run_rows(runs, config):
+    """
+    Expand (profile_id, start_day, end_day, active_crews) runs into DailyProgress field tuples.
+
+    Args:
+        runs (iterable): Output of team_limited_runs().
+        config (dict): settings.WALL_CONSTRUCTION
+
+    Yields:
+        tuple: (profile_id, day, active_crews, ice_amount, cost)
+    """
+    yards_per_crew = config['CUBIC_YARDS_PER_CREW_PER_DAY']
+    cost_per_yard = config['COST_PER_CUBIC_YARD']
+
+    for profile_id, start_day, end_day, crews in runs:
+        ice_amount = crews * yards_per_crew
+        cost = ice_amount * cost_per_yard
+        for day in range(start_day, end_day + 1):
+            yield (profile_id, day, crews, ice_amount, cost)
+
+
+def _profile_series_shard(shard, max_height):
+    """
+    Worker entry point for parallel_profile_series().
+
+    Args:
+        shard (list): (profile_id, heights) pairs, heights packed as bytes.
+        max_height (int): Height at which a section is complete.
+
+    Returns:
+        list: (profile_id, array('I')) pairs with the active crews per day.
+    """
+    return [
+        (profile_id, array('I', unlimited_crew_series(height_histogram(heights, max_height))))
+        for profile_id, heights in shard
+    ]
+
+
+def parallel_profile_series(heights_by_profile, max_height, workers):
+    """
+    Unlimited-crew series for many profiles, sharded across a process pool.
+
+    Profiles are independent when every section has its own crew, so each
+    worker gets a contiguous shard of profiles with their heights packed one
+    byte per section, and returns the series as compact arrays.
+
+    Args:
+        heights_by_profile (dict): profile_id -> list of section heights.
+        max_height (int): Height at which a section is complete.
+        workers (int): Number of worker processes. With 1 the series are
+            computed in the calling process.
+
+    Returns:
+        list: (profile_id, array('I')) pairs in the order of heights_by_profile.
+    """
+    # Plan heights are 0..30, so one byte per section is enough
+    packed = [
+        (profile_id, bytes(heights))
+        for profile_id, heights in heights_by_profile.items()
+    ]
+    workers = max(1, min(workers, len(packed)))
+    if workers == 1:
+        return _profile_series_shard(packed, max_height)
+
+    shard_size = -(-len(packed) // workers)
+    shards = [packed[start:start + shard_size] for start in range(0, len(packed), shard_size)]
+
+    series = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(_profile_series_shard, shards, [max_height] * len(shards)):
+            series.extend(result)
+    return series
@@ -0,0 +1,435 @@
+"""
+Bulk ingestion helpers for the wall construction plan.
+
+Everything here works in set-based statements or batched inserts, so an
+upload costs a handful of SQL round-trips per table instead of one per row.
+Progress is inserted by a writer thread while the simulation that produces
+it keeps running.
+"""
+from array import array
+import contextvars
+from itertools import islice
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+from thewall.models import Plan, Profile, DailyProgress, ProgressSegment, DatasetState
+from thewall.plans import plan_profiles
+
+
+def get_batch_size(batch_size=None):
+    """
+    Rows per INSERT statement, from settings.WALL_CONSTRUCTION['BULK_BATCH_SIZE'] by default.
+    """
+    if batch_size is None:
+        batch_size = settings.WALL_CONSTRUCTION.get('BULK_BATCH_SIZE', 2000)
+    return max(1, int(batch_size))
+
+
+def get_store_daily_progress(store_daily=None):
+    """
+    Whether to store one DailyProgress row per profile and day next to the
+    segments, from settings.WALL_CONSTRUCTION['STORE_DAILY_PROGRESS'] by default.
+    """
+    if store_daily is None:
+        store_daily = settings.WALL_CONSTRUCTION.get('STORE_DAILY_PROGRESS', True)
+    return bool(store_daily)
+
+
+def batched(iterable, size):
+    """
+    Yield lists of up to size items without materializing the whole iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class IngestionStats:
+    """
+    Row counts and time spent inserting, per table.
+
+    on_record, when given, is called as on_record(table, rows so far) after
+    every insert, from the thread that made it.
+    """
+
+    def __init__(self, on_record=None):
+        self.rows = {}
+        self.seconds = 0.0
+        self.on_record = on_record
+
+    def record(self, table, rows, seconds):
+        self.rows[table] = self.rows.get(table, 0) + rows
+        self.seconds += seconds
+        if self.on_record is not None:
+            self.on_record(table, self.rows[table])
+
+    def as_dict(self):
+        total_rows = sum(self.rows.values())
+        return {
+            'rows': dict(self.rows),
+            'total_rows': total_rows,
+            'insert_time_ms': round(self.seconds * 1000, 2),
+            'rows_per_second': round(total_rows / self.seconds) if self.seconds else None,
+        }
+
+
+def _delete_tables(models):
+    tables = [model._meta.db_table for model in models]
+    with connection.cursor() as cursor:
+        for table in tables:
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(table)}")
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f"DELETE FROM sqlite_sequence WHERE name IN ({', '.join(['%s'] * len(tables))})",
+                tables,
+            )
+
+
+def reset_tables():
+    """
+    Remove every plan version, its profiles and its progress with plain DELETE statements.
+
+    QuerySet.delete() loads rows to emulate the cascade in Python; here the
+    child tables are cleared first, so no cascade is needed. Auto-increment
+    counters are reset so IDs start from 1 again. Uploads do not use this,
+    they build a new version next to the active one (see thewall.plans).
+    """
+    DatasetState.objects.filter(pk=1).update(active_plan=None)
+    _delete_tables([ProgressSegment, DailyProgress, Profile, Plan])
+
+
+def insert_plan(rows, plan_id, batch_size=None, stats=None):
+    """
+    Create profiles from parsed CSV rows with batched bulk_create calls.
+
+    The section heights of a profile are packed into its heights column,
+    one byte per section, so a 300 x 2000 plan is 300 rows instead of
+    600,000. The sections view unpacks them again for the admin.
+
+    Args:
+        rows (list): One list of section heights per CSV line. Empty lines are
+            skipped but still count towards the profile name.
+        plan_id (int): Plan version the profiles belong to. They are numbered
+            from 1 within it, which is the profile id used by the API.
+        batch_size (int): Rows per INSERT, defaults to get_batch_size().
+        stats (IngestionStats): Optional collector for row counts and timings.
+
+    Returns:
+        tuple: (profiles_created, sections_created)
+    """
+    batch_size = get_batch_size(batch_size)
+
+    plan = [(profile_idx, heights) for profile_idx, heights in enumerate(rows, 1) if heights]
+
+    started = time.perf_counter()
+    profiles = Profile.objects.bulk_create(
+        [
+            Profile(plan_id=plan_id, number=number, name=f"Profile {profile_idx}", heights=bytes(heights))
+            for number, (profile_idx, heights) in enumerate(plan, 1)
+        ],
+        batch_size=batch_size,
+    )
+    if stats is not None:
+        stats.record('profiles', len(profiles), time.perf_counter() - started)
+
+    return len(profiles), sum(len(heights) for _, heights in plan)
+
+
+def load_plan_heights(plan_id=None):
+    """
+    Stored initial heights of every profile of a plan version (the active one
+    by default), without building model instances.
+
+    Returns:
+        dict: profile_id -> array('B') of section heights, in plan order.
+    """
+    heights_by_profile = {}
+    for profile_id, packed in plan_profiles(plan_id).order_by('number').values_list('id', 'heights'):
+        heights = array('B')
+        heights.frombytes(packed)
+        heights_by_profile[profile_id] = heights
+    return heights_by_profile
+
+
+class SegmentBuilder:
+    """
+    Merge daily rows into ProgressSegment runs while they stream past.
+
+    The days of each profile must arrive in increasing order, but profiles may
+    be interleaved, e.g. day by day across all profiles. Only the open segment
+    of every profile is kept.
+    """
+
+    def __init__(self):
+        self._open = {}  # profile_id -> [start_day, end_day, crews, ice_amount, cost, cumulative_cost]
+
+    def add(self, profile_id, day, active_crews, ice_amount, cost):
+        """
+        Add one daily row.
+
+        Returns:
+            tuple: The segment this row closed, or None.
+        """
+        segment = self._open.get(profile_id)
+        if segment is not None and segment[1] == day - 1 and segment[2:5] == [active_crews, ice_amount, cost]:
+            segment[1] = day
+            segment[5] += cost
+            return None
+
+        closed = None
+        cumulative = 0
+        if segment is not None:
+            closed = (profile_id, *segment)
+            cumulative = segment[5]
+        self._open[profile_id] = [day, day, active_crews, ice_amount, cost, cumulative + cost]
+        return closed
+
+    def close(self):
+        """
+        Return the segments that are still open and forget them.
+        """
+        segments = [(profile_id, *segment) for profile_id, segment in self._open.items()]
+        self._open.clear()
+        return segments
+
+
+def _insert_rows(model, columns, batch, stats):
+    """
+    Insert plain tuples with executemany(). Unlike bulk_create() no model
+    instance is built per row, so the writer thread spends most of its time
+    inside SQLite, which releases the GIL for the simulating thread.
+    """
+    started = time.perf_counter()
+    table = model._meta.db_table
+    sql = (
+        f"INSERT INTO {connection.ops.quote_name(table)} "
+        f"({', '.join(connection.ops.quote_name(column) for column in columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))})"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, batch)
+    if stats is not None:
+        stats.record(table, len(batch), time.perf_counter() - started)
+
+
+def _insert_segments(batch, stats):
+    _insert_rows(
+        ProgressSegment,
+        ['profile_id', 'start_day', 'end_day', 'active_crews', 'ice_amount', 'cost', 'cumulative_cost'],
+        batch, stats,
+    )
+
+
+def _insert_daily_rows(batch, stats):
+    _insert_rows(DailyProgress, ['profile_id', 'day', 'active_crews', 'ice_amount', 'cost'], batch, stats)
+
+
+_INSERTERS = {
+    'daily_progress': _insert_daily_rows,
+    'progress_segments': _insert_segments,
+}
+
+
+def write_batches(batches, batch_size=None, stats=None, queue_size=None, transaction_rows=None):
+    """
+    Store (table, rows) batches on a writer thread while the caller keeps producing them.
+
+    The batches iterable is consumed in the calling thread, so a simulation
+    generator keeps computing while the previous batches are inserted. The
+    queue between the two is bounded: when the writer falls behind, the
+    producer blocks, so memory stays at queue_size batches however many days
+    the plan has. The writer borrows the caller's database connection, which
+    keeps its rows inside the caller's transaction, and commits every
+    transaction_rows rows (a savepoint when the caller already has a
+    transaction open).
+
+    The connection and its transaction state belong to the writer until
+    every batch is written, so producing the batches must not touch the
+    database: load what the simulation reads before calling this. A query
+    sent from another thread meanwhile raises RuntimeError instead of
+    interleaving with the writer's savepoints.
+
+    Args:
+        batches (iterable): ('daily_progress' or 'progress_segments', list of row tuples) pairs.
+        batch_size (int): Rows per INSERT, defaults to get_batch_size().
+        stats (IngestionStats): Optional collector for row counts and timings.
+        queue_size (int): Batches buffered between producer and writer, from
+            settings.WALL_CONSTRUCTION['WRITE_QUEUE_SIZE'] by default. With 0
+            the batches are written in the calling thread.
+        transaction_rows (int): Rows per writer transaction, from
+            settings.WALL_CONSTRUCTION['WRITE_TRANSACTION_ROWS'] by default.
+    """
+    config = settings.WALL_CONSTRUCTION
+    batch_size = get_batch_size(batch_size)
+    if queue_size is None:
+        queue_size = config.get('WRITE_QUEUE_SIZE', 8)
+    if transaction_rows is None:
+        transaction_rows = config.get('WRITE_TRANSACTION_ROWS', 20000)
+    transaction_rows = max(1, int(transaction_rows))
+
+    if queue_size <= 0:
+        with transaction.atomic():
+            for table, batch in batches:
+                _INSERTERS[table](batch, stats)
+        return
+
+    pending = queue.Queue(maxsize=queue_size)
+    errors = []
+    shared_connection = connections[DEFAULT_DB_ALIAS]
+
+    def writer():
+        # Same override as Django's LiveServerThread: use the caller's connection
+        connections[DEFAULT_DB_ALIAS] = shared_connection
+        try:
+            finished = False
+            while not finished:
+                with transaction.atomic():
+                    rows = 0
+                    while rows < transaction_rows:
+                        item = pending.get()
+                        if item is None:
+                            finished = True
+                            break
+                        table, batch = item
+                        _INSERTERS[table](batch, stats)
+                        rows += len(batch)
+        except BaseException as e:
+            errors.append(e)
+            # Keep draining, so the producer never blocks on a full queue
+            while pending.get() is not None:
+                pass
+
+    # With the caller's context, so its queries count towards the caller's request
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(writer,), name='thewall-writer')
+
+    def writer_only(execute, sql, params, many, context):
+        if threading.current_thread() is not thread:
+            raise RuntimeError("The database connection belongs to the progress writer until write_batches() returns")
+        return execute(sql, params, many, context)
+
+    shared_connection.inc_thread_sharing()
+    try:
+        with shared_connection.execute_wrapper(writer_only):
+            thread.start()
+            try:
+                for item in batches:
+                    if errors:
+                        break
+                    pending.put(item)
+            finally:
+                pending.put(None)
+                thread.join()
+    finally:
+        shared_connection.dec_thread_sharing()
+
+    if errors:
+        raise errors[0]
+
+
+def _progress_batches(rows, batch_size, store_daily, counter):
+    builder = SegmentBuilder()
+    segments = []
+
+    for batch in batched(rows, batch_size):
+        if store_daily:
+            yield 'daily_progress', batch
+        counter[0] += len(batch)
+
+        for row in batch:
+            closed = builder.add(*row)
+            if closed is not None:
+                segments.append(closed)
+        if len(segments) >= batch_size:
+            yield 'progress_segments', segments
+            segments = []
+
+    segments.extend(builder.close())
+    for batch in batched(segments, batch_size):
+        yield 'progress_segments', batch
+
+
+def write_progress(rows, batch_size=None, stats=None, store_daily=None):
+    """
+    Stream daily rows into the database in batches, as segments and optionally as DailyProgress rows.
+
+    Rows are merged into segments in the calling thread and inserted by
+    write_batches() on its writer thread.
+
+    Args:
+        rows (iterable): (profile_id, day, active_crews, ice_amount, cost) tuples,
+            each profile's days in increasing order. Consumed lazily, so only
+            the batches waiting in the writer queue are held in memory.
+        batch_size (int): Rows per INSERT, defaults to get_batch_size().
+        stats (IngestionStats): Optional collector for row counts and timings.
+        store_daily (bool): Also store DailyProgress rows, defaults to get_store_daily_progress().
+
+    Returns:
+        int: Number of daily rows calculated.
+    """
+    batch_size = get_batch_size(batch_size)
+    counter = [0]
+    write_batches(
+        _progress_batches(rows, batch_size, get_store_daily_progress(store_daily), counter),
+        batch_size, stats,
+    )
+    return counter[0]
+
+
+def _run_batches(runs, config, batch_size, store_daily, counter):
+    yards_per_crew = config['CUBIC_YARDS_PER_CREW_PER_DAY']
+    cost_per_yard = config['COST_PER_CUBIC_YARD']
+    cumulative = {}  # profile_id -> running cost
+
+    def segments():
+        for profile_id, start_day, end_day, crews in runs:
+            ice_amount = crews * yards_per_crew
+            cost = ice_amount * cost_per_yard
+            length = end_day - start_day + 1
+            counter[0] += length
+            cumulative[profile_id] = cumulative.get(profile_id, 0) + cost * length
+            yield (profile_id, start_day, end_day, crews, ice_amount, cost, cumulative[profile_id])
+
+    for batch in batched(segments(), batch_size):
+        yield 'progress_segments', batch
+        if store_daily:
+            daily_rows = (
+                (profile_id, day, crews, ice_amount, cost)
+                for profile_id, start_day, end_day, crews, ice_amount, cost, _ in batch
+                for day in range(start_day, end_day + 1)
+            )
+            for daily_batch in batched(daily_rows, batch_size):
+                yield 'daily_progress', daily_batch
+
+
+def write_runs(runs, config, batch_size=None, stats=None, store_daily=None):
+    """
+    Store maximal (profile_id, start_day, end_day, active_crews) runs, one segment each.
+
+    Daily rows are only expanded from the runs when they are stored, so the
+    cost of a team-limited plan does not grow with its number of days.
+
+    Args:
+        runs (iterable): Output of thewall.engines.team_limited_runs(), each
+            profile's runs in increasing day order.
+        config (dict): settings.WALL_CONSTRUCTION
+        batch_size (int): Rows per INSERT, defaults to get_batch_size().
+        stats (IngestionStats): Optional collector for row counts and timings.
+        store_daily (bool): Also store DailyProgress rows, defaults to get_store_daily_progress().
+
+    Returns:
+        int: Number of daily rows calculated.
+    """
+    batch_size = get_batch_size(batch_size)
+    counter = [0]
+    write_batches(
+        _run_batches(runs, config, batch_size, get_store_daily_progress(store_daily), counter),
+        batch_size, stats,
+    )
+    return counter[0]
@@ -0,0 +1,163 @@
+"""
+Background processing of plan uploads (?async=true).
+
+Jobs run on a local thread pool with a single worker: every job builds a
+new plan version and the database takes one writer at a time anyway. No
+external broker is involved; the SimulationJob row is what other
+processes read to report the status. A job whose process died before it
+finished would stay queued or running forever, so it is marked failed when
+its status is read after settings.WALL_CONSTRUCTION['JOB_TIMEOUT'] seconds
+with no process reporting on it.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from thewall.models import SimulationJob
+from thewall.parsing import pack_plan, unpack_plan
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='thewall-job')
+
+# Least time between two progress updates of the stored job within a phase
+PROGRESS_SAVE_SECONDS = 1.0
+
+# Phase and progress of the jobs queued or running in this process, which
+# job_detail() reads before the stored row
+_live_status = {}
+_live_status_lock = threading.Lock()
+
+
+def submit(plan, engine, num_teams=None, workers=None):
+    """
+    Store an uploaded plan as a queued job and schedule it once committed.
+
+    Args:
+        plan (list): Parsed plan, see thewall.parsing.parse_plan_chunks().
+        engine (str): Simulation engine, see thewall.views.parse_engine_params().
+        num_teams (int): Teams for a team-limited engine.
+        workers (int): Worker processes for the 'processes' engine.
+
+    Returns:
+        SimulationJob: The queued job.
+    """
+    job = SimulationJob.objects.create(plan=pack_plan(plan), engine=engine, num_teams=num_teams, workers=workers)
+    transaction.on_commit(lambda: _schedule(job.id))
+    return job
+
+
+def get_job_timeout():
+    """
+    Seconds after which a queued or running job that no process in reach
+    reports on is taken for lost, from settings.WALL_CONSTRUCTION['JOB_TIMEOUT'].
+    """
+    return max(0.0, float(settings.WALL_CONSTRUCTION.get('JOB_TIMEOUT', 3600)))
+
+
+def fail_if_stale(job):
+    """
+    Mark a job failed when it is still queued or running, this process does
+    not know it and it was queued or started more than get_job_timeout() ago:
+    the process that had it was stopped or restarted.
+
+    A job running in another process for longer than the timeout is marked
+    failed too. It still records its outcome when it finishes.
+
+    Returns:
+        bool: Whether the job was marked failed; job is updated in place.
+    """
+    if job.state not in (SimulationJob.QUEUED, SimulationJob.RUNNING) or live_status(job.id) is not None:
+        return False
+    now = timezone.now()
+    if now - (job.started_at or job.created_at) < timedelta(seconds=get_job_timeout()):
+        return False
+    error = f"Job lost: no progress reported for {get_job_timeout():g} seconds, its worker process was probably stopped"
+    if not SimulationJob.objects.filter(id=job.id, state=job.state).update(
+        state=SimulationJob.FAILED, error=error, finished_at=now,
+    ):
+        return False
+    job.state, job.error, job.finished_at = SimulationJob.FAILED, error, now
+    return True
+
+
+def live_status(job_id):
+    """
+    (phase, progress) of a job running in this process, or None.
+    """
+    with _live_status_lock:
+        return _live_status.get(job_id)
+
+
+def run_job(job_id):
+    """
+    Parse, ingest and simulate the plan of a queued job, recording its progress.
+    """
+    from thewall.views import process_plan
+
+    timings = {}
+    phase_started = {}
+    started = time.perf_counter()
+    saved = [0.0]
+
+    def on_phase(phase, progress):
+        now = time.perf_counter()
+        with _live_status_lock:
+            _live_status[job_id] = (phase, progress)
+        if phase in phase_started:
+            # Progress within the phase, reported by the progress writer on every batch
+            if now - saved[0] < PROGRESS_SAVE_SECONDS:
+                return
+        else:
+            for previous, previous_started in phase_started.items():
+                timings.setdefault(f'{previous}_ms', round((now - previous_started) * 1000, 2))
+            phase_started[phase] = now
+        saved[0] = now
+        SimulationJob.objects.filter(id=job_id).update(phase=phase, progress=progress, timings=timings)
+
+    try:
+        job = SimulationJob.objects.get(id=job_id)
+        SimulationJob.objects.filter(id=job_id).update(state=SimulationJob.RUNNING, started_at=timezone.now())
+        on_phase('loading', 0)
+
+        plan = unpack_plan(job.plan)
+        result = process_plan(plan, job.engine, num_teams=job.num_teams, workers=job.workers, on_phase=on_phase)
+
+        on_phase('done', 100)
+        timings['total_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        SimulationJob.objects.filter(id=job_id).update(
+            state=SimulationJob.SUCCEEDED,
+            phase='done',
+            progress=100,
+            result=result,
+            timings=timings,
+            finished_at=timezone.now(),
+        )
+    except Exception as e:
+        timings['total_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        SimulationJob.objects.filter(id=job_id).update(
+            state=SimulationJob.FAILED,
+            error=f'Error processing file: {str(e)}',
+            timings=timings,
+            finished_at=timezone.now(),
+        )
+    finally:
+        with _live_status_lock:
+            _live_status.pop(job_id, None)
+
+
+def _schedule(job_id):
+    with _live_status_lock:
+        _live_status[job_id] = ('queued', 0)
+    _executor.submit(_run_in_background, job_id)
+
+
+def _run_in_background(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # Executor threads are reused, do not keep their connection open between jobs
+        connection.close()
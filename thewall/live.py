@@ -0,0 +1,319 @@
+"""
+Live progress of the simulations of this process, as Server-Sent Events.
+
+The engines never wait on a client. ProgressLog and IngestionStats hand
+their events to the process-wide broker one batch at a time: publish()
+appends the batch to a ring of recent batches under a short lock and wakes
+the subscribers waiting for it, with one call per event loop. Every
+subscriber reads the ring from its own cursor, so a batch is stored once
+and encoded once however many clients follow it. The batches of
+ProgressLog are the ones it queues for the log writer, which reuses the
+lines formatted for the subscribers and the other way around.
+
+A client that falls more than settings.WALL_CONSTRUCTION['LIVE_BUFFER_EVENTS']
+events behind, because it reads slower than the engine writes, skips to the
+newest batch. It gets a 'lagged' event with the number of events it missed
+and a 'state' event with the coalesced progress instead: current day, rows
+persisted per table, start and finish of the run and the plan version last
+activated. Memory therefore stays bounded whatever the number of clients.
+
+The broker lives in the process memory, so a client only sees the runs of
+the server process it is connected to.
+"""
+import asyncio
+from collections import deque
+import json
+import threading
+import time
+
+from django.conf import settings
+
+# Events that start and end a run, or stand for a whole restored run, published even when nobody
+# listens so the state stays right
+RUN_EVENTS = ('started', 'finished', 'restored')
+# Batches sent to a client in one write
+MAX_BATCHES_PER_WRITE = 64
+# Reconnection delay suggested to the browsers, in milliseconds
+RETRY_MS = 2000
+
+
+def get_buffer_events(buffer_events=None):
+    """
+    Events kept for the subscribers that are behind, from
+    settings.WALL_CONSTRUCTION['LIVE_BUFFER_EVENTS'] by default.
+    """
+    if buffer_events is None:
+        buffer_events = settings.WALL_CONSTRUCTION.get('LIVE_BUFFER_EVENTS', 20000)
+    return max(1, int(buffer_events))
+
+
+def get_heartbeat_seconds(heartbeat_seconds=None):
+    """
+    Idle time after which a comment line is sent to keep the connection
+    open, from settings.WALL_CONSTRUCTION['LIVE_HEARTBEAT_SECONDS'] by default.
+    """
+    if heartbeat_seconds is None:
+        heartbeat_seconds = settings.WALL_CONSTRUCTION.get('LIVE_HEARTBEAT_SECONDS', 15)
+    return max(0.01, float(heartbeat_seconds))
+
+
+def format_event(event_type, data, event_id=None):
+    """
+    One Server-Sent Event, data being encoded as JSON.
+    """
+    prefix = f"id: {event_id}\n" if event_id is not None else ''
+    return f"{prefix}event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventBatch(list):
+    """
+    (created, event_type, fields) events handed over together. Their lines
+    of the construction log are kept once formatted, so the log writer and
+    the subscribers format them once between them.
+    """
+
+    __slots__ = ('_lines',)
+
+    def lines(self, format_event):
+        try:
+            return self._lines
+        except AttributeError:
+            self._lines = [format_event(*event) for event in self]
+            return self._lines
+
+
+class Batch:
+    """
+    Events published together, with their sequence number in the broker.
+    """
+
+    __slots__ = ('seq', 'events', 'day', 'total', '_data')
+
+    def __init__(self, seq, events, day, total):
+        self.seq = seq
+        self.events = events
+        self.day = day  # day reached before this batch
+        self.total = total  # events published up to and including this batch
+        self._data = None
+
+    @property
+    def data(self):
+        """
+        The events as Server-Sent Events, encoded on first use by whichever
+        subscriber gets there first. The data of an event is its line of the
+        construction log. A 'day' event is inserted whenever the day of the
+        events moves on.
+        """
+        if self._data is None:
+            day = self.day
+            parts = []
+            for (_, event_type, fields), line in zip(self.events, self.events.lines(_formatter().format_event)):
+                event_day = fields.get('day')
+                if event_day is not None and event_day > day:
+                    day = event_day
+                    parts.append(f'event: day\ndata: {{"day": {day}}}\n\n')
+                parts.append(f"event: {event_type}\ndata: {line}\n\n")
+            # The id of the last event is the one a reconnecting browser sends back
+            parts[-1] = f"id: {self.seq}\n{parts[-1]}"
+            self._data = ''.join(parts).encode()
+        return self._data
+
+
+class Broker:
+    """
+    In-process fan-out of simulation events to any number of subscribers.
+
+    publish() is called from the simulation and writer threads, stream()
+    runs in the event loop of the ASGI server.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.subscribers = 0
+        self.clear()
+
+    def clear(self):
+        """
+        Forget the buffered batches and the state. Subscribers stay connected.
+        """
+        with self._lock:
+            self._batches = deque()
+            self._buffered = 0
+            self._next_seq = 1
+            self._total = 0
+            self._waiters = {}  # event loop -> futures of the subscribers waiting in it
+            self._state = {
+                'running': False, 'started': None, 'finished': None, 'day': 0, 'persisted': {}, 'plan_id': None,
+            }
+
+    def state(self):
+        """
+        Coalesced progress of the current or last run.
+        """
+        with self._lock:
+            return {**self._state, 'persisted': dict(self._state['persisted'])}
+
+    def publish(self, events):
+        """
+        Add a batch of (created, event_type, fields) events. Never blocks on a subscriber.
+        """
+        if not events:
+            return
+        if not isinstance(events, EventBatch):
+            events = EventBatch(events)
+        buffer_events = get_buffer_events()
+        with self._lock:
+            state = self._state
+            first_type, first_fields = events[0][1], events[0][2]
+            if first_type == 'started':
+                state.update(running=True, started=first_fields, finished=None, day=0)
+            batch = Batch(self._next_seq, events, state['day'], self._total + len(events))
+            self._next_seq += 1
+            self._total = batch.total
+
+            # Only the ends of the batch are looked at, its events come in day order
+            last_type, last_fields = events[-1][1], events[-1][2]
+            if last_type == 'finished':
+                state.update(running=False, finished=last_fields)
+            elif last_type == 'restored':
+                state.update(running=False, started=None, finished=last_fields, day=0)
+            elif last_type == 'persisted':
+                state['persisted'][last_fields['table']] = last_fields['rows']
+            elif last_type == 'activated':
+                state['plan_id'] = last_fields['plan_id']
+            day = last_fields.get('day')
+            if day is not None and day > state['day']:
+                state['day'] = day
+
+            self._batches.append(batch)
+            self._buffered += len(events)
+            while self._buffered > buffer_events and len(self._batches) > 1:
+                self._buffered -= len(self._batches.popleft().events)
+            waiters, self._waiters = self._waiters, {}
+
+        for loop, futures in waiters.items():
+            try:
+                loop.call_soon_threadsafe(_wake, futures)
+            except RuntimeError:
+                # The loop is closed, its subscribers are gone
+                pass
+
+    def publish_event(self, event_type, **fields):
+        """
+        Publish a single event.
+        """
+        self.publish([(time.time(), event_type, fields)])
+
+    def _read(self, cursor, consumed):
+        """
+        Batches from sequence number cursor on. Call with self._lock held.
+
+        Returns:
+            tuple: (batches, missed events, next cursor, events consumed)
+        """
+        batches = self._batches
+        if not batches or cursor >= self._next_seq:
+            return [], 0, cursor, consumed
+        first = batches[0].seq
+        if cursor < first:
+            # Too far behind: skip to the newest batch, the state stands for the rest
+            return [], self._total - consumed, self._next_seq, self._total
+        start = cursor - first
+        selected = [batches[i] for i in range(start, min(len(batches), start + MAX_BATCHES_PER_WRITE))]
+        return selected, 0, selected[-1].seq + 1, selected[-1].total
+
+    def _resume(self, last_event_id):
+        """
+        Cursor and events consumed of a subscriber starting after last_event_id,
+        or at the next batch. Call with self._lock held.
+        """
+        batches = self._batches
+        if last_event_id is not None and batches and batches[0].seq - 1 <= last_event_id < self._next_seq:
+            cursor = last_event_id + 1
+            if cursor < self._next_seq:
+                batch = batches[cursor - batches[0].seq]
+                return cursor, batch.total - len(batch.events)
+        return self._next_seq, self._total
+
+    async def _wait(self, cursor, timeout):
+        """
+        Wait for the batch at cursor. Returns False when timeout expired first.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if cursor < self._next_seq:
+                return True
+            self._waiters.setdefault(loop, []).append(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if not future.done() or future.cancelled():
+                # Timed out or the client went away: publish() never swapped this future out
+                with self._lock:
+                    waiters = self._waiters.get(loop)
+                    if waiters is not None and future in waiters:
+                        waiters.remove(future)
+                        if not waiters:
+                            del self._waiters[loop]
+        return True
+
+    async def stream(self, last_event_id=None, heartbeat_seconds=None):
+        """
+        Server-Sent Events of one subscriber, starting with the current state.
+
+        Args:
+            last_event_id (int): Resume after this batch, as sent back by a
+                reconnecting browser in the Last-Event-ID header. When it is
+                no longer buffered, the stream starts at the next batch.
+            heartbeat_seconds (float): See get_heartbeat_seconds().
+
+        Yields:
+            str or bytes: Text to send, one or more events at a time.
+        """
+        heartbeat_seconds = get_heartbeat_seconds(heartbeat_seconds)
+        with self._lock:
+            self.subscribers += 1
+            cursor, consumed = self._resume(last_event_id)
+        try:
+            yield f"retry: {RETRY_MS}\n" + format_event('state', self.state())
+            while True:
+                with self._lock:
+                    batches, missed, cursor, consumed = self._read(cursor, consumed)
+                if missed:
+                    yield format_event('lagged', {'dropped': missed}) + format_event('state', self.state())
+                elif batches:
+                    yield b''.join(batch.data for batch in batches)
+                elif not await self._wait(cursor, heartbeat_seconds):
+                    yield ": keepalive\n\n"
+        finally:
+            with self._lock:
+                self.subscribers -= 1
+
+
+def _formatter():
+    global _json_formatter
+    if _json_formatter is None:
+        # Imported here, thewall.progress_log itself publishes to the broker
+        from thewall.progress_log import JsonLinesFormatter
+        _json_formatter = JsonLinesFormatter()
+    return _json_formatter
+
+
+def _wake(futures):
+    for future in futures:
+        if not future.done():
+            future.set_result(None)
+
+
+broker = Broker()
+_json_formatter = None
+
+
+def persisted(table, rows):
+    """
+    IngestionStats callback publishing the rows stored so far in a table.
+    """
+    broker.publish_event('persisted', table=table, rows=rows)
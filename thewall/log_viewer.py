@@ -0,0 +1,259 @@
+"""
+Paged reading of the construction log, for the dashboard and /thewall/log/.
+
+Nothing here reads the whole of wall_progress.log per request. A LineIndex
+keeps the byte offset of every line start and is refreshed only when the
+file's size or mtime changes: a log that grew is indexed from where the
+previous refresh stopped, a rewritten one from the start. A page is then
+one seek and one read, and the rendered HTML of a page is cached for the
+state of the file it was rendered from, so a page load costs a stat() and
+a cache lookup however long the log is.
+"""
+from array import array
+from bisect import bisect_left
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.utils.html import escape
+
+from thewall.cache import LRUCache
+from thewall.progress_log import describe_event, get_log_path, parse_log_line
+
+READ_CHUNK_BYTES = 1024 * 1024
+# Leading bytes compared to tell a log that grew from a rewritten one
+HEAD_BYTES = 256
+# Most lines returned by one call of /thewall/log/
+MAX_LINES = 1000
+
+_indexes = LRUCache(8)
+_fragments = LRUCache(64)
+
+
+def get_page_lines(page_lines=None):
+    """
+    Lines per page of the log viewer, from settings.WALL_CONSTRUCTION['LOG_PAGE_LINES'] by default.
+    """
+    if page_lines is None:
+        page_lines = settings.WALL_CONSTRUCTION.get('LOG_PAGE_LINES', 200)
+    return max(1, int(page_lines))
+
+
+class LineIndex:
+    """
+    Start offsets of the lines of a file that is appended to or rewritten.
+
+    offsets[i] is where line i starts and offsets[-1] where the incomplete
+    line being written starts, so a line that has no newline yet is not
+    served until it is complete.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.stamp = None
+        self.head = b''
+        self.offsets = array('Q', [0])
+
+    @property
+    def line_count(self):
+        return len(self.offsets) - 1
+
+    @property
+    def log_id(self):
+        """
+        Identifies one run's log, so pollers notice when it is rewritten.
+        """
+        return hashlib.sha1(self.head).hexdigest()[:12] if self.head else None
+
+    def refresh(self):
+        """
+        Bring the index up to date with the file. Call with self.lock held.
+
+        Returns:
+            bool: Whether the file exists.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset()
+            return False
+
+        stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if stamp == self.stamp:
+            return True
+
+        with open(self.path, 'rb') as log_file:
+            head = log_file.read(HEAD_BYTES)
+            indexed = self.offsets[-1]
+            if (self.stamp is None or stamp[0] != self.stamp[0] or stat.st_size < indexed
+                    or head[:len(self.head)] != self.head):
+                self._reset()
+                indexed = 0
+            self.head = head
+            self._scan(log_file, indexed)
+        self.stamp = stamp
+        return True
+
+    def _scan(self, log_file, position):
+        log_file.seek(position)
+        offsets = self.offsets
+        while True:
+            chunk = log_file.read(READ_CHUNK_BYTES)
+            if not chunk:
+                return
+            newline = chunk.find(b'\n')
+            while newline != -1:
+                offsets.append(position + newline + 1)
+                newline = chunk.find(b'\n', newline + 1)
+            position += len(chunk)
+
+    def read_lines(self, first, last):
+        """
+        Lines first to last (excluded) with their offsets. Call with self.lock held.
+
+        Returns:
+            list: (offset, line) tuples.
+        """
+        first, last = max(0, first), min(last, self.line_count)
+        if first >= last:
+            return []
+        with open(self.path, 'rb') as log_file:
+            log_file.seek(self.offsets[first])
+            data = log_file.read(self.offsets[last] - self.offsets[first])
+        return [
+            (self.offsets[first + number], line.decode('utf-8', 'replace'))
+            for number, line in enumerate(data.split(b'\n')[:last - first])
+        ]
+
+
+def get_index(path=None):
+    """
+    The LineIndex of a log file, shared by the requests of this process.
+    """
+    path = path or get_log_path()
+    index = _indexes.get(path)
+    if index is None:
+        index = LineIndex(path)
+        _indexes.set(path, index)
+    return index
+
+
+def clear():
+    """
+    Forget every index and rendered page.
+    """
+    _indexes.clear()
+    _fragments.clear()
+
+
+def page_bounds(line_count, page, page_lines):
+    """
+    First and last (excluded) line of a page, counted from 1. Page None is
+    the tail: the last page_lines lines, whatever page they start in.
+    """
+    if page is None:
+        return max(0, line_count - page_lines), line_count
+    first = (page - 1) * page_lines
+    return first, min(first + page_lines, line_count)
+
+
+def render_page(page=None, path=None, page_lines=None):
+    """
+    HTML of one page of the log with its navigation links, see page_bounds().
+    Cached until the file changes.
+    """
+    page_lines = get_page_lines(page_lines)
+    index = get_index(path)
+    with index.lock:
+        if not index.refresh() or index.line_count == 0:
+            return '<div class="log-viewer">No construction log available.</div>'
+        key = (index.path, index.stamp, page, page_lines)
+        html = _fragments.get(key)
+        if html is None:
+            first, last = page_bounds(index.line_count, page, page_lines)
+            html = _render(index.read_lines(first, last), first, last, index.line_count, page, page_lines)
+            _fragments.set(key, html)
+    return html
+
+
+def _render(lines, first, last, line_count, page, page_lines):
+    if page is None:
+        # The page holding the line just before the tail
+        previous = -(-first // page_lines) if first > 0 else None
+        following = None
+    else:
+        previous = min(page, -(-line_count // page_lines) + 1) - 1 or None
+        following = page + 1 if page * page_lines < line_count else None
+    links = []
+    if previous is not None:
+        links.append('<a href="?log_page=1">First</a>')
+        links.append(f'<a href="?log_page={previous}">Previous</a>')
+    if following is not None:
+        links.append(f'<a href="?log_page={following}">Next</a>')
+    if page is not None:
+        links.append('<a href="?">Latest</a>')
+    nav = (
+        f'<div class="log-nav">Lines {first + 1 if last > first else 0}-{last} of {line_count} '
+        f'{" ".join(links)}</div>'
+    )
+
+    rows = []
+    for _, line in lines:
+        record = parse_log_line(line)
+        event = record['event'] if record is not None else None
+        text = escape(describe_event(record) if record is not None else line)
+        if event in ('started', 'finished', 'restored'):
+            rows.append(f'<div class="header-line">{text}</div>')
+        elif event == 'completed':
+            rows.append(f'<div class="team-line highlight">{text}</div>')
+        else:
+            rows.append(f'<div class="team-line">{text}</div>')
+    return f'{nav}<div class="log-viewer">{"".join(rows) or "No lines on this page."}</div>'
+
+
+def read_after(offset=None, limit=None, log_id=None, path=None):
+    """
+    Lines written after a byte offset, for incremental polling.
+
+    Without an offset the last limit lines are returned. A poller passes the
+    'next' offset and 'log_id' of its previous call; when the log has been
+    rewritten since, it starts again from the beginning and 'reset' is true.
+
+    Returns:
+        dict: log_id, size, next, reset and lines ({'offset', 'text', 'record'}).
+    """
+    limit = min(MAX_LINES, get_page_lines(limit))
+    index = get_index(path)
+    with index.lock:
+        if not index.refresh():
+            return {'log_id': None, 'size': 0, 'next': 0, 'reset': offset not in (None, 0), 'lines': []}
+
+        reset = offset is not None and (
+            (log_id is not None and log_id != index.log_id) or offset > index.offsets[-1]
+        )
+        if offset is None:
+            first = max(0, index.line_count - limit)
+        else:
+            first = bisect_left(index.offsets, 0 if reset else offset)
+        lines = index.read_lines(first, first + limit)
+        next_offset = index.offsets[min(first + len(lines), index.line_count)]
+        size = index.stamp[1]
+        current_id = index.log_id
+
+    return {
+        'log_id': current_id,
+        'size': size,
+        'next': next_offset,
+        'reset': reset,
+        'lines': [{'offset': line_offset, **_describe(line)} for line_offset, line in lines],
+    }
+
+
+def _describe(line):
+    record = parse_log_line(line)
+    return {'text': describe_event(record) if record is not None else line, 'record': record}
@@ -0,0 +1,132 @@
+import asyncio
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Share of each read endpoint in the requests sent, as measured in the README
+MIX = (
+    (0.7, 'day'),
+    (0.2, 'profile_overview'),
+    (0.09, 'day_overview'),
+    (0.01, 'overview'),
+)
+
+
+def request_path(rng, profiles, days):
+    """
+    A read endpoint drawn from MIX, with a random profile number and day.
+    """
+    kind = rng.random()
+    for share, name in MIX:
+        if kind < share:
+            break
+        kind -= share
+    if name == 'day':
+        return f'/thewall/profiles/{rng.randint(1, profiles)}/days/{rng.randint(1, days)}/'
+    if name == 'profile_overview':
+        return f'/thewall/profiles/{rng.randint(1, profiles)}/overview/{rng.randint(1, days)}/'
+    if name == 'day_overview':
+        return f'/thewall/profiles/overview/{rng.randint(1, days)}/'
+    return '/thewall/profiles/overview/'
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a running server with keep-alive clients sending the day and overview reads back to back, "
+        "70% day, 20% profile overview, 9% day overview and 1% full overview requests. Reports requests "
+        "per second, p50 and p99 latency and errors for each number of clients. Start the server first, "
+        "for example uvicorn frozendjango.asgi:application with ASYNC_READ_VIEWS on or off, on a plan "
+        "of --profiles profiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8000)
+        parser.add_argument('--clients', type=int, nargs='+', default=[100, 300, 1000],
+                            help='Concurrent connections, one run per value')
+        parser.add_argument('--seconds', type=float, default=10, help='Measured time of each run')
+        parser.add_argument('--warmup', type=float, default=2,
+                            help='Seconds before the measurement starts, while the connections open')
+        parser.add_argument('--profiles', type=int, default=300, help='Profile numbers requested, from 1')
+        parser.add_argument('--days', type=int, default=30, help='Days requested, from 1')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['seconds'] <= 0 or min(options['clients']) < 1:
+            raise CommandError("--seconds and --clients must be positive")
+
+        self.stdout.write(f"Server: http://{options['host']}:{options['port']}, {options['seconds']:g} s per run")
+        self.stdout.write(f"{'Clients':>7} {'Requests/s':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'Errors':>7}")
+        for clients in options['clients']:
+            latencies, errors = asyncio.run(self.run(clients, options))
+            if not latencies:
+                raise CommandError(f"No request answered with {clients} clients, is the server running?")
+            latencies.sort()
+
+            def percentile(fraction):
+                return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+            self.stdout.write(
+                f"{clients:>7} {len(latencies) / options['seconds']:>10.0f} "
+                f"{percentile(0.5):>9.1f} {percentile(0.99):>9.1f} {errors[0]:>7}"
+            )
+
+    async def run(self, clients, options):
+        """
+        One run: every client opens its connection during the warmup, and the
+        latencies of the requests answered after it are kept.
+
+        Returns:
+            tuple: (latencies in seconds, [errors])
+        """
+        rng = random.Random(options['seed'])
+        latencies = []
+        errors = [0]
+        measure_from = time.perf_counter() + options['warmup']
+        stop_at = measure_from + options['seconds']
+        await asyncio.gather(*(
+            self.client(rng, measure_from, stop_at, latencies, errors, options) for _ in range(clients)
+        ))
+        return latencies, errors
+
+    async def client(self, rng, measure_from, stop_at, latencies, errors, options):
+        """
+        Send requests back to back on one keep-alive connection until stop_at,
+        reconnecting when the server closes it.
+        """
+        host, port = options['host'], options['port']
+        reader = writer = None
+        while time.perf_counter() < stop_at:
+            if writer is None:
+                try:
+                    reader, writer = await asyncio.open_connection(host, port)
+                except OSError:
+                    errors[0] += 1
+                    await asyncio.sleep(0.05)
+                    continue
+
+            path = request_path(rng, options['profiles'], options['days'])
+            started = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n'.encode())
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+                status = int(head.split(b' ', 2)[1])
+                length = 0
+                for line in head.split(b'\r\n'):
+                    if line.lower().startswith(b'content-length:'):
+                        length = int(line.split(b':', 1)[1])
+                await reader.readexactly(length)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                errors[0] += 1
+                writer.close()
+                reader = writer = None
+                continue
+
+            finished = time.perf_counter()
+            if status != 200:
+                errors[0] += 1
+            elif finished >= measure_from:
+                latencies.append(finished - started)
+        if writer is not None:
+            writer.close()
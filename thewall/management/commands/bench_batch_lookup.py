@@ -0,0 +1,59 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+
+from thewall import cache as response_cache
+from thewall import plans
+from thewall.ingestion import insert_plan
+from thewall.views import run_engine
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-call /profiles/<id>/days/<day>/ lookups with one batch request. "
+        "The generated plan is written inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=50, help='Number of profiles (CSV lines)')
+        parser.add_argument('--sections', type=int, default=500, help='Sections per profile')
+        parser.add_argument('--lookups', type=int, default=2000, help='Random (profile, day) pairs to resolve')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        plan = [[rng.randint(0, 30) for _ in range(options['sections'])] for _ in range(options['profiles'])]
+        pairs = [[rng.randint(1, options['profiles']), rng.randint(1, 30)] for _ in range(options['lookups'])]
+
+        client = Client()
+        with override_settings(ALLOWED_HOSTS=['testserver']), transaction.atomic():
+            version = plans.start_version()
+            insert_plan(plan, version.id)
+            run_engine('analytic', plan_id=version.id)
+            plans.activate(version)
+            response_cache.memory_cache.clear()
+
+            started = time.perf_counter()
+            single = [
+                int(client.get(f'/thewall/profiles/{profile_id}/days/{day}/').json()['ice_amount'])
+                for profile_id, day in pairs
+            ]
+            single_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            response = client.post('/thewall/profiles/days/batch/', {'pairs': pairs}, content_type='application/json')
+            batch = [row[2] for row in response.json()['results']]
+            batch_time = time.perf_counter() - started
+
+            transaction.set_rollback(True)
+
+        if single != batch:
+            self.stderr.write("Batch results differ from the per-call lookups")
+
+        self.stdout.write(f"Lookups: {len(pairs)} on {options['profiles']} x {options['sections']} plan")
+        self.stdout.write(f"Per-call: {single_time * 1000:10.2f} ms ({single_time / len(pairs) * 1e6:.1f} us/lookup)")
+        self.stdout.write(f"Batch:    {batch_time * 1000:10.2f} ms ({batch_time / len(pairs) * 1e6:.1f} us/lookup)")
+        self.stdout.write(f"Speed-up: {single_time / batch_time:.1f}x")
@@ -0,0 +1,127 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+
+from thewall import plans
+from thewall.views import process_plan
+
+MODES = ('baseline', 'tuned')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure read latency while a plan is uploaded, with SQLite's default configuration "
+        "('baseline': rollback journal, one connection, no bulk-load profile) and with the one "
+        "in settings ('tuned'). Every mode runs on a new temporary database file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=300, help='Number of profiles (CSV lines)')
+        parser.add_argument('--sections', type=int, default=2000, help='Sections per profile')
+        parser.add_argument('--engine', default='events', help='Engine of the measured upload')
+        parser.add_argument('--teams', type=int, default=100, help='Teams of the measured upload')
+        parser.add_argument('--readers', type=int, default=2, help='Threads polling the read endpoints')
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        max_height = settings.WALL_CONSTRUCTION['MAX_HEIGHT']
+        first, second = (
+            [array('B', [rng.randint(0, max_height - 1) for _ in range(options['sections'])])
+             for _ in range(options['profiles'])]
+            for _ in range(2)
+        )
+
+        self.stdout.write(
+            f"Plan: {options['profiles']} x {options['sections']}, upload with {options['engine']} "
+            f"({options['teams']} teams), {options['readers']} readers"
+        )
+        self.stdout.write(
+            f"{'Mode':<10} {'Upload (s)':>10} {'Reads':>7} {'Errors':>7} "
+            f"{'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'Max (ms)':>9}"
+        )
+        for mode in options['modes']:
+            upload_time, latencies, errors = self.measure(mode, first, second, options)
+            latencies.sort()
+
+            def percentile(fraction):
+                return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000 if latencies else 0
+
+            self.stdout.write(
+                f"{mode:<10} {upload_time:>10.2f} {len(latencies):>7} {errors:>7} "
+                f"{percentile(0.5):>9.1f} {percentile(0.95):>9.1f} {percentile(0.99):>9.1f} {percentile(1):>9.1f}"
+            )
+
+    def measure(self, mode, first, second, options):
+        config = {**settings.WALL_CONSTRUCTION, 'RESULT_STORE_MAX_ROWS': 0, 'PLAN_GC_DELAY': 0}
+        if mode == 'baseline':
+            config.update({'SQLITE_PRAGMAS': {}, 'READ_DATABASE': None, 'BULK_LOAD_PRAGMAS': {}})
+
+        names = {alias: connections[alias].settings_dict['NAME'] for alias in connections}
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(ALLOWED_HOSTS=['testserver'], WALL_CONSTRUCTION=config, BASE_DIR=directory):
+            connections.close_all()
+            for alias in connections:
+                connections[alias].settings_dict['NAME'] = os.path.join(directory, 'bench.sqlite3')
+            try:
+                call_command('migrate', verbosity=0)
+                process_plan(first, 'analytic')
+                return self.upload_while_reading(second, options)
+            finally:
+                # Let the background collection of the replaced version finish first
+                plans.wait_for_gc()
+                connections.close_all()
+                for alias, name in names.items():
+                    connections[alias].settings_dict['NAME'] = name
+
+    def upload_while_reading(self, plan, options):
+        stop = threading.Event()
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+
+        def reader(seed):
+            rng = random.Random(seed)
+            client = Client()
+            try:
+                while not stop.is_set():
+                    profile_id, day = rng.randint(1, options['profiles']), rng.randint(1, 60)
+                    path = rng.choice([
+                        f'/thewall/profiles/{profile_id}/days/{day}/',
+                        f'/thewall/profiles/{profile_id}/overview/{day}/',
+                        f'/thewall/profiles/overview/{day}/',
+                    ])
+                    started = time.perf_counter()
+                    try:
+                        failed = client.get(path).status_code != 200
+                    except Exception:
+                        failed = True
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        errors[0] += failed
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        started = time.perf_counter()
+        try:
+            process_plan(plan, options['engine'], num_teams=options['teams'])
+        finally:
+            upload_time = time.perf_counter() - started
+            stop.set()
+            for thread in threads:
+                thread.join()
+        return upload_time, latencies, errors[0]
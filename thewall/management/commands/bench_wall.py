@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import override_settings
+
+from thewall.datasets import DISTRIBUTIONS, SIZES, generate_plan
+from thewall.metrics import counting_queries
+from thewall.models import DailyProgress, Profile, ProgressSegment
+from thewall.views import SEQUENTIAL_ENGINES, TEAM_LIMITED_ENGINES, process_plan
+
+ENGINES = SEQUENTIAL_ENGINES + TEAM_LIMITED_ENGINES
+METRICS = ('wall_seconds', 'peak_rss_mb', 'queries', 'rows_written')
+# Differences below these are noise whatever the threshold, mostly on the tiny plans
+NOISE_FLOOR = {'wall_seconds': 0.2, 'peak_rss_mb': 5.0, 'queries': 0, 'rows_written': 0}
+
+
+def case_id(case):
+    """
+    Key of a case in the JSON report and the baseline, like 'small/uniform/events/10'.
+    """
+    parts = [case['size'], case['distribution'], case['engine']]
+    if case['teams'] is not None:
+        parts.append(str(case['teams']))
+    return '/'.join(parts)
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process and of its waited-for children
+    (the workers of the 'processes' engine), in MiB.
+    """
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return round(peak * unit / (1024 * 1024), 1)
+
+
+def compare(results, baseline, threshold):
+    """
+    Regressions of results against a baseline report.
+
+    A metric regresses when it grew by more than threshold percent and by
+    more than its NOISE_FLOOR. A case that ran in the baseline and now
+    fails or times out is a regression too. Cases missing from either side
+    are not compared.
+
+    Returns:
+        list: (case id, metric, baseline value, new value) tuples.
+    """
+    previous = {result['case']: result for result in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        before = previous.get(result['case'])
+        if before is None or before['status'] != 'ok':
+            continue
+        if result['status'] != 'ok':
+            regressions.append((result['case'], 'status', before['status'], result['status']))
+            continue
+        for metric in METRICS:
+            old, new = before.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + threshold / 100) and new - old > NOISE_FLOOR[metric]:
+                regressions.append((result['case'], metric, old, new))
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Run every engine and team count on seeded plans of every size and height distribution. "
+        "Each case runs in its own process on a new temporary database and reports wall time, "
+        "peak RSS, SQL queries and rows written. With --baseline, fail when a metric regressed "
+        "by more than --threshold percent."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES))
+        parser.add_argument('--distributions', nargs='+', choices=DISTRIBUTIONS, default=list(DISTRIBUTIONS))
+        parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES))
+        parser.add_argument('--teams', type=int, nargs='+', default=[10, 100],
+                            help='Team counts of the team-limited engines')
+        parser.add_argument('--workers', type=int, default=None, help="Workers of the 'processes' engine")
+        parser.add_argument('--repeat', type=int, default=1, help='Runs per case, the fastest one is reported')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Seconds before a run is stopped; larger sizes of a case that timed out are skipped')
+        parser.add_argument('--output', help="Write the JSON report to this file, '-' for standard output")
+        parser.add_argument('--baseline', help='JSON report to compare with')
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help='Growth of a metric over the baseline, in percent, counted as a regression')
+        # One case, run by the parent command in a child process
+        parser.add_argument('--case', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['case']:
+            self.stdout.write(json.dumps(self.run_case(json.loads(options['case']))))
+            return
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        # With the report on standard output, the table goes to standard error
+        table = self.stderr if options['output'] == '-' else self.stdout
+        table.write(f"{'Case':<36} {'Time (s)':>9} {'RSS (MB)':>9} {'Queries':>8} {'Rows':>9}")
+        results = []
+        timed_out = set()
+        for case in self.cases(options):
+            family = (case['distribution'], case['engine'], case['teams'])
+            if family in timed_out:
+                result = {'case': case_id(case), **case, 'status': 'skipped'}
+            else:
+                result = self.measure(case, options)
+                if result['status'] == 'timeout':
+                    timed_out.add(family)
+            results.append(result)
+            if result['status'] == 'ok':
+                table.write(
+                    f"{result['case']:<36} {result['wall_seconds']:>9.3f} {result['peak_rss_mb']:>9.1f} "
+                    f"{result['queries']:>8} {result['rows_written']:>9}"
+                )
+            else:
+                table.write(f"{result['case']:<36} {result['status']:>9}")
+
+        report = {
+            'seed': options['seed'],
+            'repeat': options['repeat'],
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+            },
+            'results': results,
+        }
+        if options['output'] == '-':
+            self.stdout.write(json.dumps(report, indent=2))
+        elif options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump(report, output_file, indent=2)
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['threshold'])
+            for case, metric, old, new in regressions:
+                self.stderr.write(f"Regression: {case} {metric} {old} -> {new}")
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} regressions beyond {options['threshold']:g}% of {options['baseline']}"
+                )
+            table.write(f"No regression beyond {options['threshold']:g}% of {options['baseline']}")
+
+    def cases(self, options):
+        """
+        Every (size, distribution, engine, teams) combination, smallest plans first.
+        """
+        for size in sorted(options['sizes'], key=lambda name: SIZES[name][0] * SIZES[name][1]):
+            for distribution in options['distributions']:
+                for engine in options['engines']:
+                    for teams in options['teams'] if engine in TEAM_LIMITED_ENGINES else [None]:
+                        yield {
+                            'size': size,
+                            'profiles': SIZES[size][0],
+                            'sections': SIZES[size][1],
+                            'distribution': distribution,
+                            'engine': engine,
+                            'teams': teams,
+                            'workers': options['workers'] if engine == 'processes' else None,
+                            'seed': options['seed'],
+                        }
+
+    def measure(self, case, options):
+        """
+        Run a case options['repeat'] times, each in a new process, and keep the fastest run.
+        """
+        command = [sys.executable, '-m', 'django', 'bench_wall', '--case', json.dumps(case)]
+        environment = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'frozendjango.settings'),
+            'PYTHONPATH': os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])),
+        }
+        best = None
+        for _ in range(max(1, options['repeat'])):
+            try:
+                completed = subprocess.run(
+                    command, env=environment, capture_output=True, text=True, timeout=options['timeout'],
+                )
+            except subprocess.TimeoutExpired:
+                return {'case': case_id(case), **case, 'status': 'timeout'}
+            if completed.returncode != 0:
+                error = completed.stderr.strip().splitlines()
+                return {'case': case_id(case), **case, 'status': 'error', 'error': error[-1] if error else ''}
+            # The engines print progress notes, the result is the last line
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            if best is None or result['wall_seconds'] < best['wall_seconds']:
+                best = result
+        return {'case': case_id(case), **case, 'status': 'ok', **best}
+
+    def run_case(self, case):
+        """
+        Upload the generated plan of a case with its engine into a new
+        temporary database, as the upload endpoint would.
+
+        The stored results are off, so the engine always runs. The queries
+        of the progress writer thread are counted too. Rows written are those of the new plan version.
+        """
+        config = {**settings.WALL_CONSTRUCTION, 'RESULT_STORE_MAX_ROWS': 0, 'PLAN_GC_DELAY': 0}
+        plan = generate_plan((case['profiles'], case['sections']), case['distribution'], case['seed'],
+                             config['MAX_HEIGHT'])
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(WALL_CONSTRUCTION=config, BASE_DIR=directory):
+            for alias in connections:
+                connections[alias].settings_dict['NAME'] = os.path.join(directory, 'bench.sqlite3')
+            call_command('migrate', verbosity=0)
+
+            with counting_queries() as counter:
+                started = time.perf_counter()
+                result = process_plan(plan, case['engine'], num_teams=case['teams'], workers=case['workers'])
+                elapsed = time.perf_counter() - started
+
+            # Counted in the database, not every engine reports its inserts
+            rows = {
+                model._meta.db_table: model.objects.filter(
+                    **{'plan_id' if model is Profile else 'profile__plan_id': result['plan_id']}
+                ).count()
+                for model in (Profile, ProgressSegment, DailyProgress)
+            }
+            connections.close_all()
+
+        return {
+            'wall_seconds': round(elapsed, 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'queries': counter.queries,
+            'rows_written': sum(rows.values()),
+            'rows': rows,
+        }
@@ -0,0 +1,40 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from thewall.engines import parallel_profile_series
+
+
+class Command(BaseCommand):
+    help = "Benchmark the 'processes' engine on a generated plan with 1/2/4/8 workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=300, help='Number of profiles (CSV lines)')
+        parser.add_argument('--sections', type=int, default=2000, help='Sections per profile')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='Worker counts to measure')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per worker count, the best one is reported')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        max_height = settings.WALL_CONSTRUCTION['MAX_HEIGHT']
+        rng = random.Random(options['seed'])
+        heights_by_profile = {
+            profile_id: [rng.randint(0, max_height) for _ in range(options['sections'])]
+            for profile_id in range(1, options['profiles'] + 1)
+        }
+        self.stdout.write(f"Plan: {options['profiles']} profiles x {options['sections']} sections")
+
+        baseline = None
+        self.stdout.write(f"{'Workers':>8} {'Time (ms)':>12} {'Speed-up':>9}")
+        for workers in options['workers']:
+            best = None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                parallel_profile_series(heights_by_profile, max_height, workers)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            if baseline is None:
+                baseline = best
+            self.stdout.write(f"{workers:>8} {best * 1000:>12.2f} {baseline / best:>8.2f}x")
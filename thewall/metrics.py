@@ -0,0 +1,305 @@
+"""
+Request latency and SQL metrics per URL name, in Prometheus text format.
+
+MetricsMiddleware times every request and counts the SQL queries it runs,
+then adds them to in-process series
+keyed by the resolved view name and the method. The number of series is
+bounded by the URL configuration: unresolved paths share one label and
+unusual methods another, so no request can add a series of its own. The
+time spent on this bookkeeping is itself reported, as
+thewall_metrics_overhead_seconds_total.
+
+Queries are counted by count_queries(), an execute wrapper installed once
+on every connection as it is created. It adds to the QueryCounter of the
+current context, so a request also counts the queries its views run in
+sync_to_async threads under ASGI, and concurrent requests never touch each
+other's counters.
+
+Set settings.WALL_CONSTRUCTION['METRICS_ENABLED'] to False to remove the
+middleware altogether.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import contextvars
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+# Prometheus' default latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Queries per request; a steady climb to the upper buckets is the sign of an N+1 pattern
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+UNMATCHED = '<unmatched>'
+
+_counter = contextvars.ContextVar('thewall_query_counter', default=None)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram: per-bucket counts, a sum and a count.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        (upper bound, cumulative count) pairs, ending with '+Inf'.
+        """
+        total = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            yield bound, total
+
+
+class RequestSeries:
+    """
+    Everything recorded for one (view, method) pair.
+    """
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.query_seconds = 0.0
+        self.responses = {}  # status class -> count
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of the request series of this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self.overhead_seconds = 0.0
+
+    def record(self, view, method, status_code, seconds, queries, query_seconds):
+        with self._lock:
+            series = self._series.get((view, method))
+            if series is None:
+                series = self._series[(view, method)] = RequestSeries()
+            series.latency.observe(seconds)
+            series.queries.observe(queries)
+            series.query_seconds += query_seconds
+            status_class = f"{status_code // 100}xx"
+            series.responses[status_class] = series.responses.get(status_class, 0) + 1
+
+    def add_overhead(self, seconds):
+        with self._lock:
+            self.overhead_seconds += seconds
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self.overhead_seconds = 0.0
+
+    def render(self):
+        """
+        All series in the Prometheus text exposition format (version 0.0.4).
+        """
+        with self._lock:
+            series = sorted(self._series.items())
+            lines = []
+
+            def header(name, kind, text):
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+            def histogram(name, attribute):
+                for (view, method), values in series:
+                    labels = f'view="{_escape(view)}",method="{method}"'
+                    histogram = getattr(values, attribute)
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+            header('thewall_http_request_duration_seconds', 'histogram', "Request latency by URL name.")
+            histogram('thewall_http_request_duration_seconds', 'latency')
+
+            header('thewall_http_responses_total', 'counter', "Responses by URL name and status class.")
+            for (view, method), values in series:
+                for status_class, count in sorted(values.responses.items()):
+                    lines.append(
+                        f'thewall_http_responses_total{{view="{_escape(view)}",method="{method}",'
+                        f'status="{status_class}"}} {count}'
+                    )
+
+            header('thewall_db_queries_per_request', 'histogram', "SQL queries run by one request, by URL name.")
+            histogram('thewall_db_queries_per_request', 'queries')
+
+            header('thewall_db_query_duration_seconds_total', 'counter', "Time spent in SQL queries, by URL name.")
+            for (view, method), values in series:
+                lines.append(
+                    f'thewall_db_query_duration_seconds_total{{view="{_escape(view)}",method="{method}"}} '
+                    f'{values.query_seconds}'
+                )
+
+            header('thewall_metrics_overhead_seconds_total', 'counter', "Time spent recording these metrics.")
+            lines.append(f"thewall_metrics_overhead_seconds_total {self.overhead_seconds}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+class QueryCounter:
+    """
+    Queries of one request and the time they take, see count_queries().
+
+    The upload writer thread counts its queries in the counter of the
+    request that started it, so the counters are updated under a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.queries += 1
+                self.seconds += elapsed
+
+
+def count_queries(execute, sql, params, many, context):
+    """
+    Execute wrapper adding the query to the QueryCounter of the current context, if any.
+    """
+    counter = _counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    return counter(execute, sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """
+    connection_created receiver installing count_queries() on the connection.
+    """
+    # First in the list, execute_wrapper() blocks pop their own wrapper from the end
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_queries)
+
+
+@contextmanager
+def counting_queries(counter=None):
+    """
+    Count the queries of the block, and of the threads it starts with its context, in counter.
+
+    Yields:
+        QueryCounter: counter, or a new one.
+    """
+    counter = counter or QueryCounter()
+    token = _counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _counter.reset(token)
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status and SQL usage of every request in the registry.
+
+    Streaming responses are recorded once their body has been sent, so the
+    queries that produce the body are included. The middleware runs in the
+    mode of the handler, so an async view under ASGI is not moved to a
+    thread on its account.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.WALL_CONSTRUCTION.get('METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started, counter, token, overhead = self._start()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            _counter.reset(token)
+            raise
+        return self._finish(request, response, started, counter, token, overhead)
+
+    async def __acall__(self, request):
+        # The context of the request's task goes away with it, nothing to reset
+        started, counter, _, overhead = self._start()
+        response = await self.get_response(request)
+        return self._finish(request, response, started, counter, None, overhead)
+
+    def _start(self):
+        started = time.perf_counter()
+        counter = QueryCounter()
+        token = _counter.set(counter)
+        return started, counter, token, time.perf_counter() - started
+
+    def _finish(self, request, response, started, counter, token, overhead):
+        def finish():
+            finish_started = time.perf_counter()
+            if token is not None:
+                # A sync response, finished in the thread that set the counter
+                _counter.reset(token)
+            match = request.resolver_match
+            registry.record(
+                match.view_name if match is not None else UNMATCHED,
+                request.method if request.method in METHODS else 'OTHER',
+                response.status_code,
+                finish_started - started,
+                counter.queries,
+                counter.seconds,
+            )
+            registry.add_overhead(overhead + time.perf_counter() - finish_started)
+
+        if not response.streaming:
+            finish()
+        elif response.is_async:
+            response.streaming_content = _afinish_after(response.streaming_content, finish)
+        else:
+            response.streaming_content = _finish_after(response.streaming_content, finish)
+        return response
+
+
+def _finish_after(content, finish):
+    try:
+        yield from content
+    finally:
+        finish()
+
+
+async def _afinish_after(content, finish):
+    try:
+        async for part in content:
+            yield part
+    finally:
+        finish()
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:28
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thewall', '0002_alter_dailyprogress_active_crews_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimulationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('phase', models.CharField(blank=True, help_text='Current processing phase', max_length=32)),
+                ('progress', models.IntegerField(default=0, help_text='Completion percentage', validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('plan', models.BinaryField(help_text='Uploaded CSV file contents')),
+                ('engine', models.CharField(max_length=16)),
+                ('num_teams', models.IntegerField(blank=True, null=True)),
+                ('workers', models.IntegerField(blank=True, null=True)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('timings', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'simulation_jobs',
+            },
+        ),
+    ]
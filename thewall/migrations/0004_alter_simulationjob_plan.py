@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thewall', '0003_simulationjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='simulationjob',
+            name='plan',
+            field=models.BinaryField(help_text='Parsed plan, see thewall.parsing.pack_plan()'),
+        ),
+    ]
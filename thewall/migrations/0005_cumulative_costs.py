@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:32
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thewall', '0004_alter_simulationjob_plan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCumulativeCost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.IntegerField(help_text='Day number of the construction project', unique=True, validators=[django.core.validators.MinValueValidator(1)])),
+                ('total_cost', models.BigIntegerField(help_text='Cost of all profiles from day 1 up to and including this day', validators=[django.core.validators.MinValueValidator(0)])),
+            ],
+            options={
+                'db_table': 'daily_cumulative_cost',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProfileCumulativeCost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.IntegerField(help_text='Day number of the construction project', validators=[django.core.validators.MinValueValidator(1)])),
+                ('total_cost', models.BigIntegerField(help_text='Cost of this profile from day 1 up to and including this day', validators=[django.core.validators.MinValueValidator(0)])),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cumulative_costs', to='thewall.profile')),
+            ],
+            options={
+                'db_table': 'profile_cumulative_cost',
+                'unique_together': {('profile', 'day')},
+            },
+        ),
+    ]
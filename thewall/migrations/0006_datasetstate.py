@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thewall', '0005_cumulative_costs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'dataset_state',
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-16 22:41
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thewall', '0006_datasetstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_day', models.IntegerField(help_text='First day of the segment', validators=[django.core.validators.MinValueValidator(1)])),
+                ('end_day', models.IntegerField(help_text='Last day of the segment, inclusive', validators=[django.core.validators.MinValueValidator(1)])),
+                ('active_crews', models.IntegerField(help_text='Number of active crews on each day of the segment', validators=[django.core.validators.MinValueValidator(1)])),
+                ('ice_amount', models.IntegerField(help_text='Ice completed on each day of the segment in cubic yards', validators=[django.core.validators.MinValueValidator(0)])),
+                ('cost', models.IntegerField(help_text='Cost of each day of the segment', validators=[django.core.validators.MinValueValidator(0)])),
+                ('cumulative_cost', models.BigIntegerField(help_text='Cost of this profile from day 1 up to and including end_day', validators=[django.core.validators.MinValueValidator(0)])),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='thewall.profile')),
+            ],
+            options={
+                'db_table': 'progress_segments',
+            },
+        ),
+        migrations.DeleteModel(
+            name='DailyCumulativeCost',
+        ),
+        migrations.DeleteModel(
+            name='ProfileCumulativeCost',
+        ),
+        migrations.AddIndex(
+            model_name='progresssegment',
+            index=models.Index(fields=['profile', 'end_day'], name='progress_se_profile_7dc0f0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='progresssegment',
+            index=models.Index(fields=['start_day'], name='progress_se_start_d_ad79b5_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='progresssegment',
+            unique_together={('profile', 'start_day')},
+        ),
+    ]
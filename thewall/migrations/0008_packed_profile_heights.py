@@ -0,0 +1,73 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:05
+
+from django.db import migrations, models
+
+
+SECTIONS_VIEW = """
+CREATE VIEW sections AS
+WITH RECURSIVE positions(profile_id, heights, position) AS (
+    SELECT id, heights, 1 FROM profiles WHERE length(heights) > 0
+    UNION ALL
+    SELECT profile_id, heights, position + 1 FROM positions WHERE position < length(heights)
+)
+SELECT
+    ROW_NUMBER() OVER (ORDER BY profile_id, position) AS id,
+    profile_id,
+    (instr('0123456789ABCDEF', substr(hex(substr(heights, position, 1)), 1, 1)) - 1) * 16
+        + instr('0123456789ABCDEF', substr(hex(substr(heights, position, 1)), 2, 1)) - 1 AS height
+FROM positions
+"""
+
+SECTIONS_TABLE = """
+CREATE TABLE sections (
+    id integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+    height integer NOT NULL,
+    profile_id bigint NOT NULL REFERENCES profiles (id) DEFERRABLE INITIALLY DEFERRED
+)
+"""
+
+
+def pack_sections(apps, schema_editor):
+    Profile = apps.get_model('thewall', 'Profile')
+    Section = apps.get_model('thewall', 'Section')
+
+    heights = {}
+    for profile_id, height in Section.objects.order_by('profile_id', 'id').values_list('profile_id', 'height'):
+        heights.setdefault(profile_id, bytearray()).append(height)
+    for profile_id, packed in heights.items():
+        Profile.objects.filter(id=profile_id).update(heights=bytes(packed))
+
+
+def unpack_sections(apps, schema_editor):
+    Profile = apps.get_model('thewall', 'Profile')
+    Section = apps.get_model('thewall', 'Section')
+
+    Section.objects.bulk_create(
+        Section(profile_id=profile_id, height=height)
+        for profile_id, packed in Profile.objects.order_by('id').values_list('id', 'heights')
+        for height in bytes(packed)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thewall', '0007_progress_segments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='heights',
+            field=models.BinaryField(default=b'', help_text='Initial section heights in plan order, one byte per section'),
+        ),
+        migrations.RunPython(pack_sections, unpack_sections),
+        migrations.AlterModelOptions(
+            name='section',
+            options={'managed': False},
+        ),
+        migrations.RunSQL(
+            ["DROP TABLE sections", SECTIONS_VIEW],
+            ["DROP VIEW sections", SECTIONS_TABLE],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thewall', '0008_packed_profile_heights'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimulationResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='SHA-256 of the normalized plan, settings, engine and team count', max_length=64, unique=True)),
+                ('engine', models.CharField(max_length=20)),
+                ('num_teams', models.IntegerField(blank=True, null=True)),
+                ('runs', models.BinaryField()),
+                ('rows', models.IntegerField(help_text='Number of progress segments in runs')),
+                ('daily_rows', models.IntegerField(help_text='Number of daily rows the segments expand to')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'simulation_results',
+            },
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.6 on 2026-10-16 23:13
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Rebuilding the profiles table below would break the view that reads it
+SECTIONS_VIEW = """
+CREATE VIEW sections AS
+WITH RECURSIVE positions(profile_id, heights, position) AS (
+    SELECT id, heights, 1 FROM profiles WHERE length(heights) > 0
+    UNION ALL
+    SELECT profile_id, heights, position + 1 FROM positions WHERE position < length(heights)
+)
+SELECT
+    ROW_NUMBER() OVER (ORDER BY profile_id, position) AS id,
+    profile_id,
+    (instr('0123456789ABCDEF', substr(hex(substr(heights, position, 1)), 1, 1)) - 1) * 16
+        + instr('0123456789ABCDEF', substr(hex(substr(heights, position, 1)), 2, 1)) - 1 AS height
+FROM positions
+"""
+
+
+def create_active_plan(apps, schema_editor):
+    Plan = apps.get_model('thewall', 'Plan')
+    Profile = apps.get_model('thewall', 'Profile')
+    DatasetState = apps.get_model('thewall', 'DatasetState')
+
+    profile_ids = list(Profile.objects.order_by('id').values_list('id', flat=True))
+    if not profile_ids:
+        return
+
+    plan = Plan.objects.create(state='active', activated_at=timezone.now())
+    for number, profile_id in enumerate(profile_ids, 1):
+        Profile.objects.filter(id=profile_id).update(plan=plan, number=number)
+    if not DatasetState.objects.filter(pk=1).update(active_plan=plan):
+        DatasetState.objects.create(pk=1, active_plan=plan)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thewall', '0009_simulation_results'),
+    ]
+
+    operations = [
+        migrations.RunSQL("DROP VIEW sections", SECTIONS_VIEW),
+        migrations.CreateModel(
+            name='Plan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('building', 'Building'), ('active', 'Active'), ('retired', 'Retired'), ('failed', 'Failed')], db_index=True, default='building', max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('activated_at', models.DateTimeField(blank=True, null=True)),
+                ('retired_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'plans',
+            },
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='number',
+            field=models.IntegerField(null=True, help_text='Profile id in the API, counting the non-empty plan rows from 1', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='plan',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='profiles', to='thewall.plan'),
+        ),
+        migrations.AddField(
+            model_name='datasetstate',
+            name='active_plan',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='thewall.plan'),
+        ),
+        migrations.RunPython(create_active_plan, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='profile',
+            name='number',
+            field=models.IntegerField(help_text='Profile id in the API, counting the non-empty plan rows from 1', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='plan',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='profiles', to='thewall.plan'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='profile',
+            unique_together={('plan', 'number')},
+        ),
+        migrations.RunSQL(SECTIONS_VIEW, "DROP VIEW sections"),
+    ]
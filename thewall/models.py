@@ -1,21 +1,90 @@
+from array import array
+
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
+class Plan(models.Model):
+    """
+    One version of the uploaded plan and its calculated progress.
+
+    Uploads and re-simulations build a new version next to the active one,
+    which keeps serving reads until DatasetState.active_plan is switched over
+    to the new version. Retired and failed versions are deleted in the
+    background, see thewall.plans.
+    """
+    BUILDING = 'building'
+    ACTIVE = 'active'
+    RETIRED = 'retired'
+    FAILED = 'failed'
+    STATES = [
+        (BUILDING, 'Building'),
+        (ACTIVE, 'Active'),
+        (RETIRED, 'Retired'),
+        (FAILED, 'Failed'),
+    ]
+
+    state = models.CharField(max_length=16, choices=STATES, default=BUILDING, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    activated_at = models.DateTimeField(null=True, blank=True)
+    retired_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Plan {self.id} - {self.state}"
+
+    class Meta:
+        db_table = 'plans'
+
+
 class Profile(models.Model):
+    plan = models.ForeignKey(
+        Plan,
+        on_delete=models.CASCADE,
+        related_name='profiles'
+    )
+    number = models.IntegerField(
+        validators=[MinValueValidator(1)],
+        help_text="Profile id in the API, counting the non-empty plan rows from 1"
+    )
     name = models.TextField()
+    heights = models.BinaryField(
+        default=b'',
+        help_text="Initial section heights in plan order, one byte per section"
+    )
     
     def __str__(self):
         return self.name
+
+    def heights_view(self):
+        """
+        Initial section heights as a read-only memoryview of unsigned bytes.
+        """
+        return memoryview(self.heights).toreadonly()
+
+    def height_array(self):
+        """
+        Initial section heights as an array('B').
+        """
+        heights = array('B')
+        heights.frombytes(self.heights)
+        return heights
     
     class Meta:
         db_table = 'profiles'
+        unique_together = [['plan', 'number']]
 
 
 class Section(models.Model):
+    """
+    One section of a profile, unpacked from Profile.heights.
+
+    Read-only compatibility model over the 'sections' database view, kept for
+    the admin and for ad-hoc queries. Section ids number the sections of all
+    stored plan versions from 1 in plan order.
+    """
     profile = models.ForeignKey(
         Profile,
-        on_delete=models.CASCADE,
+        on_delete=models.DO_NOTHING,
         related_name='sections'
     )
     height = models.IntegerField(
@@ -27,6 +96,7 @@ class Section(models.Model):
     
     class Meta:
         db_table = 'sections'
+        managed = False
 
 
 class DailyProgress(models.Model):
@@ -58,3 +128,153 @@ class DailyProgress(models.Model):
     class Meta:
         db_table = 'daily_progress'
         unique_together = [['profile', 'day']]  # One record per profile per day
+
+
+class SimulationJob(models.Model):
+    """
+    A plan upload processed in the background (?async=true).
+
+    The record lives in the database so that any worker process can report
+    its status, not only the one running it.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    state = models.CharField(max_length=16, choices=STATES, default=QUEUED)
+    phase = models.CharField(max_length=32, blank=True, help_text="Current processing phase")
+    progress = models.IntegerField(
+        default=0,
+        validators=[MinValueValidator(0), MaxValueValidator(100)],
+        help_text="Completion percentage"
+    )
+    plan = models.BinaryField(help_text="Parsed plan, see thewall.parsing.pack_plan()")
+    engine = models.CharField(max_length=16)
+    num_teams = models.IntegerField(null=True, blank=True)
+    workers = models.IntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    timings = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job {self.id} - {self.state} ({self.progress}%)"
+
+    class Meta:
+        db_table = 'simulation_jobs'
+
+
+class ProgressSegment(models.Model):
+    """
+    Run of consecutive days on which a profile has the same number of active crews.
+
+    Daily values are those of every day in start_day..end_day, so a
+    team-limited plan that runs for hundreds of thousands of days needs one
+    row per change in crew count instead of one row per day. cumulative_cost
+    is the profile's running total at end_day; the total at any day inside
+    the segment is cumulative_cost - cost * (end_day - day).
+    """
+    profile = models.ForeignKey(
+        Profile,
+        on_delete=models.CASCADE,
+        related_name='segments'
+    )
+    start_day = models.IntegerField(
+        validators=[MinValueValidator(1)],
+        help_text="First day of the segment"
+    )
+    end_day = models.IntegerField(
+        validators=[MinValueValidator(1)],
+        help_text="Last day of the segment, inclusive"
+    )
+    active_crews = models.IntegerField(
+        validators=[MinValueValidator(1)],
+        help_text="Number of active crews on each day of the segment"
+    )
+    ice_amount = models.IntegerField(
+        validators=[MinValueValidator(0)],
+        help_text="Ice completed on each day of the segment in cubic yards"
+    )
+    cost = models.IntegerField(
+        validators=[MinValueValidator(0)],
+        help_text="Cost of each day of the segment"
+    )
+    cumulative_cost = models.BigIntegerField(
+        validators=[MinValueValidator(0)],
+        help_text="Cost of this profile from day 1 up to and including end_day"
+    )
+
+    def __str__(self):
+        return f"Days {self.start_day}-{self.end_day} - {self.profile.name}: {self.active_crews} crews"
+
+    class Meta:
+        db_table = 'progress_segments'
+        unique_together = [['profile', 'start_day']]
+        indexes = [
+            # Point lookups: the first segment of the profile ending on or after the day
+            models.Index(fields=['profile', 'end_day']),
+            models.Index(fields=['start_day']),
+        ]
+
+
+class SimulationResult(models.Model):
+    """
+    Progress of one simulation, kept to be restored instead of recalculated.
+
+    runs holds (profile position, start_day, end_day, active_crews) as packed
+    little-endian unsigned 32-bit integers, one group of four per progress
+    segment. Profile positions count from 0 in plan order, so a result
+    applies to any upload of the same plan.
+    """
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text="SHA-256 of the normalized plan, settings, engine and team count"
+    )
+    engine = models.CharField(max_length=20)
+    num_teams = models.IntegerField(null=True, blank=True)
+    runs = models.BinaryField()
+    rows = models.IntegerField(help_text="Number of progress segments in runs")
+    daily_rows = models.IntegerField(help_text="Number of daily rows the segments expand to")
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Result {self.key[:12]} - {self.engine} ({self.rows} segments)"
+
+    class Meta:
+        db_table = 'simulation_results'
+
+
+class DatasetState(models.Model):
+    """
+    Single-row table describing the stored dataset.
+
+    active_plan is the plan version the read endpoints serve. generation is
+    bumped whenever it changes, so anything derived from the data (e.g.
+    cached responses) can be keyed on it.
+    """
+    generation = models.BigIntegerField(default=0)
+    active_plan = models.ForeignKey(
+        Plan,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Dataset generation {self.generation}"
+
+    class Meta:
+        db_table = 'dataset_state'
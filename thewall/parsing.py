@@ -0,0 +1,151 @@
+"""
+Single-pass streaming parser for wall construction plans.
+
+The uploaded file is decoded chunk by chunk and every line is validated and
+converted as soon as it is complete, so the file is read once and only the
+compact per-profile height arrays are kept in memory.
+"""
+from array import array
+import codecs
+import csv
+import struct
+
+MAX_LINES = 300
+MAX_VALUES_PER_LINE = 2000
+MIN_HEIGHT = 0
+MAX_HEIGHT = 30
+
+
+class PlanError(ValueError):
+    """
+    A plan that breaks one of the upload rules. The message carries the line
+    and column of the offending value.
+    """
+
+
+def _lines(chunks, decoder, sink):
+    """
+    Decode chunks and yield complete lines, split on '\\n' like io.StringIO.
+
+    Only the newly decoded text is searched for the end of the line and for
+    separators. A line still waiting for its end is refused as soon as it
+    has more than MAX_VALUES_PER_LINE + 1 values, before the CSV reader
+    splits it into cells; complete lines are counted exactly by _parse_row().
+    """
+    pending = ''
+    separators = 0
+    line_num = 1
+    for chunk in chunks:
+        if sink is not None:
+            sink.write(chunk)
+        text = decoder.decode(chunk)
+        if '\n' not in text:
+            pending += text
+            separators += text.count(',')
+            if separators > MAX_VALUES_PER_LINE:
+                raise PlanError(
+                    f"Line {line_num}: Too many values. Maximum {MAX_VALUES_PER_LINE} values per line allowed, "
+                    f"found at least {separators + 1} values."
+                )
+            continue
+        lines = (pending + text).split('\n')
+        pending = lines.pop()
+        separators = pending.count(',')
+        for line in lines:
+            line_num += 1
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def _parse_row(row, row_num):
+    """
+    Convert one CSV row to an array of heights, skipping blank cells.
+    """
+    if len(row) > MAX_VALUES_PER_LINE:
+        raise PlanError(f"Line {row_num}: Too many values. Maximum {MAX_VALUES_PER_LINE} values per line allowed, found {len(row)} values.")
+
+    # Fast path: int() ignores surrounding whitespace, so a clean row converts in one go
+    try:
+        values = list(map(int, row))
+    except ValueError:
+        values = None
+    if values is not None and MIN_HEIGHT <= min(values) and max(values) <= MAX_HEIGHT:
+        return array('B', values)
+
+    heights = array('B')
+    for col_num, cell in enumerate(row, 1):
+        if cell.strip() == '':
+            continue
+        try:
+            height = int(cell.strip())
+        except ValueError:
+            raise PlanError(f"Line {row_num}, Column {col_num}: Invalid number '{cell}'. All values must be numeric.")
+        if not (MIN_HEIGHT <= height <= MAX_HEIGHT):
+            raise PlanError(f"Line {row_num}, Column {col_num}: Value '{cell}' must be between {MIN_HEIGHT} and {MAX_HEIGHT}.")
+        heights.append(height)
+    return heights
+
+
+def parse_plan_chunks(chunks, sink=None):
+    """
+    Validate and parse an uploaded plan in a single pass.
+
+    Rules:
+    - Max 300 lines - The Wall Westeros is 300 miles long
+    - Max 2000 values per line
+    - Each value between 0 and 30
+
+    Args:
+        chunks (iterable of bytes): UTF-8 encoded CSV, e.g. UploadedFile.chunks().
+        sink (file): Optional binary file that receives a copy of every chunk.
+
+    Returns:
+        list: One array('B') of section heights per line. Empty lines give an
+        empty array, so profile numbers match CSV line numbers.
+
+    Raises:
+        PlanError: A line or value breaks the rules.
+        UnicodeDecodeError: The file is not UTF-8.
+        csv.Error: The file is not valid CSV.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    plan = []
+    line_count = 0
+
+    for row_num, row in enumerate(csv.reader(_lines(chunks, decoder, sink)), 1):
+        line_count = row_num
+        if line_count > MAX_LINES:
+            # Keep counting so the error reports the real number of lines
+            continue
+        plan.append(_parse_row(row, row_num) if row else array('B'))
+
+    if line_count > MAX_LINES:
+        raise PlanError(f"Too many lines. Maximum {MAX_LINES} lines allowed, found {line_count} lines.")
+
+    return plan
+
+
+def pack_plan(plan):
+    """
+    Serialize a parsed plan: per line, a 2-byte little-endian count followed by one byte per section.
+    """
+    return b''.join(struct.pack('<H', len(heights)) + bytes(heights) for heights in plan)
+
+
+def unpack_plan(data):
+    """
+    Inverse of pack_plan().
+    """
+    data = memoryview(data)
+    plan = []
+    offset = 0
+    while offset < len(data):
+        (count,) = struct.unpack_from('<H', data, offset)
+        offset += 2
+        heights = array('B')
+        heights.frombytes(data[offset:offset + count])
+        plan.append(heights)
+        offset += count
+    return plan
@@ -0,0 +1,225 @@
+"""
+Plan versions and the switch-over between them.
+
+An upload or re-simulation never rewrites the data that is being served.
+It builds a new Plan next to the active one, in short transactions of its
+own, and then moves the single-row DatasetState.active_plan pointer in one
+small transaction. Until then the read endpoints keep answering from the
+previous version. Retired versions are deleted afterwards on a background
+thread, one profile at a time, so no long write lock is taken either.
+Activations in quick succession share one pending collection, which
+re-arms itself while retired versions are left.
+Versions whose build was abandoned, because the process building them was
+killed, are deleted by the first collection after the build timeout.
+"""
+from datetime import timedelta
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, Subquery
+from django.utils import timezone
+
+from thewall.cache import bump_generation
+from thewall.models import Plan, Profile, DailyProgress, ProgressSegment, DatasetState
+
+# The pending collection, a daemon timer shared by every activation until it fires
+_gc_lock = threading.Lock()
+_gc_timer = None
+
+
+def get_gc_delay():
+    """
+    Seconds a retired version is kept for reads that already resolved it,
+    from settings.WALL_CONSTRUCTION['PLAN_GC_DELAY'].
+    """
+    return max(0.0, float(settings.WALL_CONSTRUCTION.get('PLAN_GC_DELAY', 5)))
+
+
+def get_build_timeout():
+    """
+    Seconds after which a version still being built is taken for abandoned,
+    from settings.WALL_CONSTRUCTION['PLAN_BUILD_TIMEOUT'].
+    """
+    return max(0.0, float(settings.WALL_CONSTRUCTION.get('PLAN_BUILD_TIMEOUT', 3600)))
+
+
+def active_plan_id():
+    """
+    Id of the plan version served by the read endpoints, or None before the first upload.
+    """
+    return DatasetState.objects.filter(pk=1).values_list('active_plan_id', flat=True).first()
+
+
+def active_profiles():
+    """
+    Profiles of the active plan version.
+
+    The pointer is read in a subquery, so a query built on this sees either
+    the old or the new version, never a mix of both.
+    """
+    return Profile.objects.filter(
+        plan_id=Subquery(DatasetState.objects.filter(pk=1).values('active_plan_id')[:1])
+    )
+
+
+def plan_profiles(plan_id=None):
+    """
+    Profiles of plan_id, or of the active version when plan_id is None.
+    """
+    if plan_id is None:
+        return active_profiles()
+    return Profile.objects.filter(plan_id=plan_id)
+
+
+def start_version():
+    """
+    Create an empty plan version to build into.
+    """
+    return Plan.objects.create(state=Plan.BUILDING)
+
+
+def copy_version(plan_id):
+    """
+    Start a new version holding the profiles of plan_id, without their progress.
+
+    Returns:
+        Plan: The new version.
+    """
+    plan = start_version()
+    Profile.objects.bulk_create(
+        Profile(plan=plan, number=number, name=name, heights=heights)
+        for number, name, heights in (
+            Profile.objects.filter(plan_id=plan_id).order_by('number').values_list('number', 'name', 'heights')
+        )
+    )
+    return plan
+
+
+def activate(plan):
+    """
+    Make plan the version served by the read endpoints.
+
+    The pointer moves and the dataset generation is bumped in the same
+    transaction, so cached responses of the previous version are never
+    served for the new one. The previous version is retired and collected
+    once the transaction has committed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        Plan.objects.filter(state=Plan.ACTIVE).exclude(id=plan.id).update(state=Plan.RETIRED, retired_at=now)
+        Plan.objects.filter(id=plan.id).update(state=Plan.ACTIVE, activated_at=now)
+        bump_generation(active_plan=plan)
+        schedule_gc()
+    plan.state = Plan.ACTIVE
+    plan.activated_at = now
+
+
+def discard(plan):
+    """
+    Mark a version that failed to build for collection. The active version is not affected.
+    """
+    Plan.objects.filter(id=plan.id, state=Plan.BUILDING).update(state=Plan.FAILED, retired_at=timezone.now())
+    schedule_gc()
+
+
+def delete_version(plan_id):
+    """
+    Remove a plan version with plain DELETE statements, one profile at a time.
+
+    Outside a transaction every statement commits on its own, so readers of
+    the active version are only ever blocked for one profile's rows. The
+    plan row goes last: if collection is interrupted, the version is still
+    there to be collected by the next run.
+    """
+    profile_ids = list(Profile.objects.filter(plan_id=plan_id).values_list('id', flat=True))
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for profile_id in profile_ids:
+            for model in (ProgressSegment, DailyProgress):
+                cursor.execute(f"DELETE FROM {quote(model._meta.db_table)} WHERE profile_id = %s", [profile_id])
+        cursor.execute(f"DELETE FROM {quote(Profile._meta.db_table)} WHERE plan_id = %s", [plan_id])
+        cursor.execute(f"DELETE FROM {quote(Plan._meta.db_table)} WHERE id = %s", [plan_id])
+
+
+def collect_garbage(delay=None, build_timeout=None):
+    """
+    Delete failed versions, retired ones retired more than delay seconds ago
+    and abandoned ones, still building build_timeout seconds after they were started.
+
+    Returns:
+        list: Ids of the deleted versions.
+    """
+    if delay is None:
+        delay = get_gc_delay()
+    if build_timeout is None:
+        build_timeout = get_build_timeout()
+    now = timezone.now()
+    plan_ids = list(
+        Plan.objects.filter(
+            Q(state=Plan.FAILED)
+            | Q(state=Plan.RETIRED, retired_at__lte=now - timedelta(seconds=delay))
+            | Q(state=Plan.BUILDING, created_at__lte=now - timedelta(seconds=build_timeout))
+        ).order_by('id').values_list('id', flat=True)
+    )
+    for plan_id in plan_ids:
+        delete_version(plan_id)
+    return plan_ids
+
+
+def schedule_gc():
+    """
+    Collect old versions on a background thread PLAN_GC_DELAY seconds after
+    the current transaction commits, unless a collection is already pending.
+    """
+    transaction.on_commit(_arm_gc)
+
+
+def wait_for_gc():
+    """
+    Wait until no collection is pending.
+    """
+    global _gc_timer
+    while True:
+        with _gc_lock:
+            timer = _gc_timer
+        if timer is None:
+            return
+        timer.join()
+        with _gc_lock:
+            if _gc_timer is timer:
+                # Cancelled before it fired
+                _gc_timer = None
+
+
+def _arm_gc():
+    with _gc_lock:
+        if _gc_timer is None:
+            _start_gc_timer()
+
+
+def _start_gc_timer():
+    # Called with _gc_lock held. A daemon thread, so a pending collection never delays interpreter exit
+    global _gc_timer
+    _gc_timer = threading.Timer(get_gc_delay(), _collect_in_background)
+    _gc_timer.name = 'thewall-gc'
+    _gc_timer.daemon = True
+    _gc_timer.start()
+
+
+def _collect_in_background():
+    global _gc_timer
+    try:
+        collect_garbage()
+        with _gc_lock:
+            _gc_timer = None
+            # Checked under the lock: a version retired meanwhile either finds no timer
+            # pending and arms one, or was committed before this query and is seen here
+            if Plan.objects.filter(state=Plan.RETIRED).exists():
+                _start_gc_timer()
+    finally:
+        with _gc_lock:
+            if _gc_timer is threading.current_thread():
+                # Collection failed, the next activation arms a new timer
+                _gc_timer = None
+        connection.close()
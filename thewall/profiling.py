@@ -0,0 +1,123 @@
+"""
+Timing breakdown and profiler capture of plan uploads.
+
+PhaseTimer adds up the wall-clock time of the named phases of an upload
+(validation, insert, simulation, ...) for the timings object of the
+response. capture() runs a block under cProfile and stores the pstats
+dump in settings.WALL_CONSTRUCTION['PROFILE_DIR'], where the admin can
+download it with /thewall/uploads/profiles/<id>/.
+"""
+from contextlib import contextmanager
+import cProfile
+import os
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.utils import timezone
+
+PROFILERS = ('cprofile',)
+PROFILE_ID = re.compile(r'[0-9]{8}-[0-9]{12}-[0-9a-f]{8}')
+
+
+class PhaseTimer:
+    """
+    Wall-clock seconds per phase; a phase entered twice adds up.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+
+    def add(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def as_dict(self):
+        return {f'{name}_ms': round(seconds * 1000, 2) for name, seconds in self.seconds.items()}
+
+
+class TimedWriter:
+    """
+    File wrapper adding the time spent in write() to a phase of a PhaseTimer.
+    """
+
+    def __init__(self, file, timer, name):
+        self.file = file
+        self.timer = timer
+        self.name = name
+
+    def write(self, data):
+        started = time.perf_counter()
+        try:
+            return self.file.write(data)
+        finally:
+            self.timer.add(self.name, time.perf_counter() - started)
+
+
+def get_profile_dir():
+    """
+    Directory of the stored pstats dumps, settings.WALL_CONSTRUCTION['PROFILE_DIR']
+    or BASE_DIR/upload_profiles.
+    """
+    return settings.WALL_CONSTRUCTION.get('PROFILE_DIR') or os.path.join(settings.BASE_DIR, 'upload_profiles')
+
+
+def get_profile_keep():
+    """
+    Number of pstats dumps kept, from settings.WALL_CONSTRUCTION['PROFILE_KEEP'].
+    """
+    return max(1, int(settings.WALL_CONSTRUCTION.get('PROFILE_KEEP', 20)))
+
+
+def profile_path(profile_id):
+    """
+    Path of a stored dump, or None when profile_id is not a valid id.
+    """
+    if not PROFILE_ID.fullmatch(profile_id):
+        return None
+    return os.path.join(get_profile_dir(), f'{profile_id}.pstats')
+
+
+@contextmanager
+def capture():
+    """
+    Profile the block with cProfile and store the dump, the oldest ones
+    beyond get_profile_keep() are removed.
+
+    Only the calling thread is profiled: time spent in the progress writer
+    thread or in the worker processes of the 'processes' engine shows up as
+    waiting. The dump is stored even when the block raises.
+
+    Yields:
+        dict: Filled with the 'id' of the stored dump once the block exits.
+    """
+    info = {}
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield info
+    finally:
+        profiler.disable()
+        info['id'] = f"{timezone.now():%Y%m%d-%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        directory = get_profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(profile_path(info['id']))
+        _prune(directory, get_profile_keep(), keep_id=info['id'])
+
+
+def _prune(directory, keep, keep_id):
+    # Ids start with their timestamp, so sorting the names sorts them by age
+    dumps = sorted(name for name in os.listdir(directory) if name.endswith('.pstats') and name != f'{keep_id}.pstats')
+    for name in dumps[:max(0, len(dumps) - keep + 1)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,374 @@
+"""
+Construction log of the team-limited engines, written as JSON lines.
+
+The simulation threads only append events to a batch in memory. Full
+batches go through a QueueHandler onto a bounded queue, and a
+QueueListener thread formats them and writes wall_progress.log, so disk
+I/O is off the simulation's critical path. When the queue is full,
+settings.WALL_CONSTRUCTION['PROGRESS_LOG_OVERFLOW'] decides: 'block'
+waits for room, at most PROGRESS_LOG_BLOCK_SECONDS before dropping the new
+batch, 'drop_oldest' discards the oldest queued batch and 'drop_newest'
+the new one. Dropped events are counted in the closing 'finished' event.
+Every batch is also handed to thewall.live.broker for the clients
+following the run, which never makes the simulation wait.
+
+The writer runs in the same process, so formatting still takes CPU time
+from the simulation. Only an engine producing events faster than they can
+be written fills the queue, and dropping them does not make the writer
+any cheaper.
+
+Every line is one JSON object with the time, the event type and its fields:
+
+    {"time": "2026-01-01T12:00:00.000", "event": "completed", "day": 12, "team": 3,
+     "profile": "Profile 1", "section": 42, "height": 30}
+
+See MESSAGES for the event types.
+"""
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+from thewall.live import RUN_EVENTS, EventBatch, broker
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+# Readable text of every event type, filled in from the fields of the event
+MESSAGES = {
+    'started': "Started with {teams} teams - Max height: {max_height}ft",
+    'completed': "Day {day} - Completed section on {profile}, Section {section} - Final height {height}",
+    'relieved': "Day {day} - Relieved (all sections completed)",
+    'finished': "Construction completed in {days} days with {teams} teams",
+    'restored': "Restored the stored result of {method} - {rows} daily rows",
+}
+
+# Held by the run writing the log file, never waited for, see ProgressLog
+_run_lock = threading.Lock()
+
+# Events per queued record, and the longest time an event waits for its batch to fill
+BATCH_EVENTS = 256
+BATCH_SECONDS = 0.5
+
+
+def get_log_path():
+    """
+    Path of the construction log, BASE_DIR/wall_progress.log.
+    """
+    return os.path.join(settings.BASE_DIR, 'wall_progress.log')
+
+
+def get_enabled(enabled=None):
+    """
+    Whether the engines write the construction log, from
+    settings.WALL_CONSTRUCTION['PROGRESS_LOG_ENABLED'] by default.
+    """
+    if enabled is None:
+        enabled = settings.WALL_CONSTRUCTION.get('PROGRESS_LOG_ENABLED', True)
+    return bool(enabled)
+
+
+def get_queue_size(queue_size=None):
+    """
+    Events buffered between the simulation and the log writer, from
+    settings.WALL_CONSTRUCTION['PROGRESS_LOG_QUEUE_SIZE'] by default.
+    """
+    if queue_size is None:
+        queue_size = settings.WALL_CONSTRUCTION.get('PROGRESS_LOG_QUEUE_SIZE', 10000)
+    return max(1, int(queue_size))
+
+
+def get_block_seconds(block_seconds=None):
+    """
+    Longest wait for room in the queue under the 'block' policy before the
+    batch is dropped, from settings.WALL_CONSTRUCTION['PROGRESS_LOG_BLOCK_SECONDS']
+    by default. None waits as long as it takes.
+    """
+    if block_seconds is None:
+        block_seconds = settings.WALL_CONSTRUCTION.get('PROGRESS_LOG_BLOCK_SECONDS', 1.0)
+    return None if block_seconds is None else max(0.0, float(block_seconds))
+
+
+def get_overflow(overflow=None):
+    """
+    Policy for a full queue, one of OVERFLOW_POLICIES, from
+    settings.WALL_CONSTRUCTION['PROGRESS_LOG_OVERFLOW'] by default.
+    """
+    if overflow is None:
+        overflow = settings.WALL_CONSTRUCTION.get('PROGRESS_LOG_OVERFLOW', 'block')
+    if overflow not in OVERFLOW_POLICIES:
+        raise ValueError(f"Unknown progress log overflow policy '{overflow}'. Use one of: {', '.join(OVERFLOW_POLICIES)}")
+    return overflow
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler applying an overflow policy instead of failing on a full queue.
+    Every record carries a batch of events in record.events. Under 'block',
+    a batch that found no room within block_seconds is dropped.
+    """
+
+    def __init__(self, queue, overflow, block_seconds=None):
+        super().__init__(queue)
+        self.overflow = overflow
+        self.block_seconds = block_seconds
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The events are plain values and the listener formats them, nothing to copy here
+        return record
+
+    def enqueue(self, record):
+        if self.overflow == 'block':
+            try:
+                self.queue.put(record, timeout=self.block_seconds)
+            except queue.Full:
+                self.dropped += len(record.events)
+            return
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+
+        if self.overflow == 'drop_oldest':
+            try:
+                self.dropped += len(self.queue.get_nowait().events)
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                pass
+        self.dropped += len(record.events)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One JSON object per event of the record's batch.
+
+    The events of a type always have the same fields, so each line is
+    filled into a template built once per event type and field names; only
+    values other than integers go through the JSON encoder.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._encoder = json.JSONEncoder(check_circular=False)
+        self._templates = {}
+        self._second = None
+        self._second_text = ''
+
+    def format_time(self, created):
+        # strftime() once per second instead of once per event
+        second = int(created)
+        if second != self._second:
+            self._second = second
+            self._second_text = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(second))
+        return f"{self._second_text}.{int((created - second) * 1000):03d}"
+
+    def format_event(self, created, event_type, fields):
+        encode = self._encoder.encode
+        key = (event_type, tuple(fields))
+        template = self._templates.get(key)
+        if template is None:
+            # '%' in a field name would be read as a placeholder
+            names = ''.join(f", {encode(name).replace('%', '%%')}: %s" for name in fields)
+            template = self._templates[key] = f'{{"time": "%s", "event": {encode(event_type).replace("%", "%%")}{names}}}'
+        return template % (
+            self.format_time(created),
+            *[value if type(value) is int else encode(value) for value in fields.values()],
+        )
+
+    def format(self, record):
+        # The live subscribers may have formatted the batch already
+        return '\n'.join(record.events.lines(self.format_event))
+
+
+class JsonLinesFileHandler(logging.FileHandler):
+    """
+    FileHandler that leaves flushing to the listener, which flushes once the queue is drained.
+    """
+
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + '\n')
+        except Exception:
+            self.handleError(record)
+
+
+class BufferedQueueListener(QueueListener):
+    """
+    QueueListener that flushes its handlers whenever it has caught up with the queue.
+    """
+
+    def handle(self, record):
+        super().handle(record)
+        if self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+
+    def enqueue_sentinel(self):
+        # Wait for room instead of failing when the queue is full
+        self.queue.put(self._sentinel)
+
+
+class ProgressLog:
+    """
+    Construction log of one simulation run, used as a context manager:
+
+        with ProgressLog() as progress_log:
+            progress_log.event('completed', day=1, team=1, profile='Profile 1', section=1, height=30)
+            progress_log.finish(days=1, teams=1)
+
+    event() costs an append under a lock; the queue sees one record per
+    BATCH_EVENTS events. Each run has its own logger, queue and listener, so
+    nothing is added to the logging configuration of the process. One run at
+    a time writes the log file: a run that starts while another one writes
+    it does not wait and leaves the file alone, as if the log were disabled.
+    When the log is disabled, the previous log file is left as it is and
+    event() only passes the events on to the live subscribers, if there are
+    any.
+    """
+
+    def __init__(self, path=None, enabled=None, queue_size=None, overflow=None, block_seconds=None):
+        self.path = path or get_log_path()
+        self.enabled = get_enabled(enabled)
+        self.queue_size = get_queue_size(queue_size)
+        self.overflow = get_overflow(overflow)
+        self.block_seconds = get_block_seconds(block_seconds)
+        self.logger = None
+        self.handler = None
+        self.listener = None
+        self._pending = EventBatch()
+        self._pending_lock = threading.Lock()
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+
+        if not _run_lock.acquire(blocking=False):
+            # Another run writes the file, this one only reaches the live subscribers
+            self.enabled = False
+            return self
+        try:
+            file_handler = JsonLinesFileHandler(self.path, mode='w', encoding='utf-8')
+        except BaseException:
+            _run_lock.release()
+            raise
+        file_handler.setFormatter(JsonLinesFormatter())
+        batches = queue.Queue(max(1, self.queue_size // BATCH_EVENTS))
+        self.handler = BoundedQueueHandler(batches, self.overflow, self.block_seconds)
+        # Not registered with logging.getLogger(), so it has no parent to propagate to
+        self.logger = logging.Logger('thewall.progress', logging.INFO)
+        self.logger.addHandler(self.handler)
+        self.listener = BufferedQueueListener(batches, file_handler)
+        self.listener.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        if self.listener is None:
+            return
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        self.listener = None
+        self.logger = None
+        _run_lock.release()
+
+    @property
+    def dropped(self):
+        """
+        Events lost to the overflow policy so far.
+        """
+        return self.handler.dropped if self.handler is not None else 0
+
+    def event(self, event_type, **fields):
+        """
+        Add one event to the log, see MESSAGES for the event types and their fields.
+        Never waits on the log writer for longer than block_seconds, and only under 'block'.
+        """
+        if self.logger is None and not broker.subscribers and event_type not in RUN_EVENTS:
+            return
+        created = time.time()
+        with self._pending_lock:
+            pending = self._pending
+            pending.append((created, event_type, fields))
+            if len(pending) < BATCH_EVENTS and created - pending[0][0] < BATCH_SECONDS:
+                return
+            self._pending = EventBatch()
+        self._emit(pending)
+
+    def flush(self):
+        """
+        Queue the events that wait for their batch to fill.
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, EventBatch()
+        if pending:
+            self._emit(pending)
+
+    def finish(self, days, teams):
+        """
+        Log the closing 'finished' event with the number of dropped events.
+        """
+        if self.handler is not None:
+            # The simulation is over, so the rest of the log may wait for room in the queue
+            self.handler.overflow = 'block'
+            self.handler.block_seconds = None
+        self.flush()
+        self.event('finished', days=days, teams=teams, dropped=self.dropped)
+        self.flush()
+
+    def _emit(self, events):
+        broker.publish(events)
+        if self.logger is None:
+            return
+        # makeRecord() skips the caller lookup of Logger.info(), which walks the stack
+        self.logger.handle(self.logger.makeRecord(
+            self.logger.name, logging.INFO, '', 0, 'progress', (), None, extra={'events': events},
+        ))
+
+
+def parse_log_line(line):
+    """
+    The event of one line of the log, or None for lines that are not events,
+    like those of logs written before the JSON format.
+    """
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) and record.get('event') in MESSAGES else None
+
+
+def describe_event(record):
+    """
+    Readable text of an event: its time, its team if any and its message.
+    """
+    try:
+        message = MESSAGES[record['event']].format(**record)
+    except KeyError:
+        message = record['event']
+    team = f" - Team {record['team']}" if 'team' in record else ''
+    return f"{record.get('time', '')}{team} - {message}"
+
+
+def describe_log_line(line):
+    """
+    Event type and readable text of one line of the log. Lines that are not
+    events are returned as they are.
+
+    Returns:
+        tuple: (event type or None, text)
+    """
+    record = parse_log_line(line)
+    if record is None:
+        return None, line
+    return record['event'], describe_event(record)
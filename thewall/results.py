@@ -0,0 +1,163 @@
+"""
+Store of simulation results, keyed by what determines them.
+
+A result depends only on the non-empty plan rows, the construction
+settings, the engine and the team count. Uploading the same plan again, or
+re-simulating a team count that was already tried, restores the stored
+progress segments instead of simulating. Results are evicted least recently
+used first once the stored segments exceed
+settings.WALL_CONSTRUCTION['RESULT_STORE_MAX_ROWS'].
+"""
+from array import array
+import hashlib
+import json
+import sys
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from thewall.ingestion import write_runs
+from thewall.models import Profile, ProgressSegment, SimulationResult
+from thewall.parsing import pack_plan
+
+# Settings that change the simulated values; the others only tune performance
+RESULT_SETTINGS = ('CUBIC_YARDS_PER_CREW_PER_DAY', 'COST_PER_CUBIC_YARD', 'MAX_HEIGHT')
+# Version of the engines' output, bump it whenever an engine change alters the simulated values
+RESULT_VERSION = 1
+
+
+def get_max_rows():
+    """
+    Segments kept in the store, from settings.WALL_CONSTRUCTION['RESULT_STORE_MAX_ROWS']. 0 disables it.
+    """
+    return max(0, int(settings.WALL_CONSTRUCTION.get('RESULT_STORE_MAX_ROWS', 1000000)))
+
+
+def result_key(plan, engine, num_teams=None):
+    """
+    SHA-256 of the normalized plan, the construction settings, the engine,
+    the team count and RESULT_VERSION.
+
+    The plan is normalized by packing its non-empty rows, so formatting,
+    blank cells and empty lines do not change the key.
+    """
+    config = settings.WALL_CONSTRUCTION
+    digest = hashlib.sha256(pack_plan([heights for heights in plan if heights]))
+    digest.update(json.dumps(
+        {
+            'settings': {name: config[name] for name in RESULT_SETTINGS},
+            'engine': engine,
+            'teams': num_teams,
+            'version': RESULT_VERSION,
+        },
+        sort_keys=True,
+    ).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _pack_runs(runs):
+    packed = array('I', (value for run in runs for value in run))
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack_runs(data):
+    packed = array('I')
+    packed.frombytes(data)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    for offset in range(0, len(packed), 4):
+        yield tuple(packed[offset:offset + 4])
+
+
+def lookup(key):
+    """
+    The stored result for key, marked as used, or None.
+    """
+    if not get_max_rows():
+        return None
+    result = SimulationResult.objects.filter(key=key).first()
+    if result is not None:
+        result.last_used_at = timezone.now()
+        result.save(update_fields=['last_used_at'])
+    return result
+
+
+def restore(result, plan_id, stats=None):
+    """
+    Write the progress of a stored result for a plan version.
+
+    Stored runs refer to profiles by their position in the plan, so they
+    apply to any version of the same plan.
+
+    Returns:
+        int: Number of daily rows restored.
+    """
+    profile_ids = list(Profile.objects.filter(plan_id=plan_id).order_by('number').values_list('id', flat=True))
+    runs = (
+        (profile_ids[position], start_day, end_day, crews)
+        for position, start_day, end_day, crews in _unpack_runs(result.runs)
+    )
+    return write_runs(runs, settings.WALL_CONSTRUCTION, stats=stats)
+
+
+def save(key, engine, num_teams, daily_rows, plan_id):
+    """
+    Store the progress segments just calculated for a plan version, then evict.
+    """
+    max_rows = get_max_rows()
+    if not max_rows:
+        return None
+
+    positions = {
+        profile_id: position
+        for position, profile_id in enumerate(
+            Profile.objects.filter(plan_id=plan_id).order_by('number').values_list('id', flat=True)
+        )
+    }
+    segments = list(
+        ProgressSegment.objects.filter(profile__plan_id=plan_id).order_by('profile_id', 'start_day')
+        .values_list('profile_id', 'start_day', 'end_day', 'active_crews')
+    )
+    if len(segments) > max_rows:
+        return None
+
+    result, _ = SimulationResult.objects.update_or_create(
+        key=key,
+        defaults={
+            'engine': engine,
+            'num_teams': num_teams,
+            'runs': _pack_runs((positions[profile_id], start_day, end_day, crews)
+                               for profile_id, start_day, end_day, crews in segments),
+            'rows': len(segments),
+            'daily_rows': daily_rows,
+            'last_used_at': timezone.now(),
+        },
+    )
+    evict(max_rows)
+    return result
+
+
+def evict(max_rows=None):
+    """
+    Delete the least recently used results until at most max_rows segments are stored.
+
+    Returns:
+        int: Number of results deleted.
+    """
+    if max_rows is None:
+        max_rows = get_max_rows()
+    total = SimulationResult.objects.aggregate(total=Sum('rows'))['total'] or 0
+    if total <= max_rows:
+        return 0
+
+    evicted = []
+    for result_id, rows in SimulationResult.objects.order_by('last_used_at', 'id').values_list('id', 'rows'):
+        if total <= max_rows:
+            break
+        evicted.append(result_id)
+        total -= rows
+    SimulationResult.objects.filter(id__in=evicted).delete()
+    return len(evicted)
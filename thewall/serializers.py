@@ -1,7 +1,18 @@
+from django.conf import settings
 from django.contrib.auth.models import Group, User
 from rest_framework import serializers
 import csv
-import io
+import os
+
+from thewall.parsing import PlanError, parse_plan_chunks
+from thewall.profiling import TimedWriter
+
+
+def get_batch_lookup_limit():
+    """
+    Most days looked up by one batch request, from settings.WALL_CONSTRUCTION['BATCH_LOOKUP_LIMIT'].
+    """
+    return settings.WALL_CONSTRUCTION.get('BATCH_LOOKUP_LIMIT', 10000)
 
 
 class UserSerializer(serializers.HyperlinkedModelSerializer):
@@ -17,6 +28,15 @@ class GroupSerializer(serializers.HyperlinkedModelSerializer):
 
 
 class CSVUploadSerializer(serializers.Serializer):
+    """
+    Validates an uploaded plan and parses it in the same pass.
+
+    validated_data['plan'] holds one array('B') of section heights per CSV
+    line. If context['copy_to'] is a path, the raw file is copied there while
+    it is parsed, and only kept when the plan is valid. The time spent
+    writing the copy is added to the 'copy' phase of context['timer'], a
+    thewall.profiling.PhaseTimer, when there is one.
+    """
     file = serializers.FileField()
 
     def validate_file(self, value):
@@ -30,45 +50,101 @@ class CSVUploadSerializer(serializers.Serializer):
         if value.size > 50 * 1024 * 1024:
             raise serializers.ValidationError("File size too large. Maximum 50MB allowed.")
 
+        return value
+
+    def validate(self, attrs):
         # Validate config file based on requirements:
         # - Max 300 lines - The Wall Westeros is 300 miles long
         # - Max 2000 values per line
         # - Each value between 0 and 30
-        try:
-            value.seek(0)
-
-            file_content = value.read().decode('utf-8')
-            value.seek(0)
-
-            csv_reader = csv.reader(io.StringIO(file_content))
-            rows = list(csv_reader)
-
-            if len(rows) > 300:
-                raise serializers.ValidationError(f"Too many lines. Maximum 300 lines allowed, found {len(rows)} lines.")
-
-            for row_num, row in enumerate(rows, 1):
-                if not row or all(cell.strip() == '' for cell in row):
-                    continue
-
-                if len(row) > 2000:
-                    raise serializers.ValidationError(f"Line {row_num}: Too many values. Maximum 2000 values per line allowed, found {len(row)} values.")
-
-                for col_num, cell in enumerate(row, 1):
-                    if cell.strip() == '':
-                        continue
-
-                    try:
-                        value_int = int(cell.strip())
-                        if not (0 <= value_int <= 30):
-                            raise serializers.ValidationError(f"Line {row_num}, Column {col_num}: Value '{cell}' must be between 0 and 30.")
-                    except ValueError:
-                        raise serializers.ValidationError(f"Line {row_num}, Column {col_num}: Invalid number '{cell}'. All values must be numeric.")
-
-            return value
+        uploaded_file = attrs['file']
+        copy_to = self.context.get('copy_to')
+        timer = self.context.get('timer')
+        partial_copy = f"{copy_to}.part" if copy_to else None
 
+        try:
+            uploaded_file.seek(0)
+            if partial_copy:
+                with open(partial_copy, 'wb') as sink:
+                    if timer is not None:
+                        sink = TimedWriter(sink, timer, 'copy')
+                    attrs['plan'] = parse_plan_chunks(uploaded_file.chunks(), sink=sink)
+                os.replace(partial_copy, copy_to)
+            else:
+                attrs['plan'] = parse_plan_chunks(uploaded_file.chunks())
+            return attrs
+
+        except PlanError as e:
+            error = str(e)
         except UnicodeDecodeError:
-            raise serializers.ValidationError("Invalid file encoding. Please use UTF-8 encoded CSV file.")
+            error = "Invalid file encoding. Please use UTF-8 encoded CSV file."
         except csv.Error as e:
-            raise serializers.ValidationError(f"Invalid CSV format: {e}")
+            error = f"Invalid CSV format: {e}"
         except Exception as e:
-            raise serializers.ValidationError(f"Error processing file: {str(e)}")
+            error = f"Error processing file: {str(e)}"
+        finally:
+            if partial_copy and os.path.exists(partial_copy):
+                os.remove(partial_copy)
+
+        raise serializers.ValidationError({'file': [error]})
+
+
+class DayRangeSerializer(serializers.Serializer):
+    """
+    {"profile_id": 1, "from": 1, "to": 30}, both days inclusive.
+    """
+
+    def get_fields(self):
+        # 'from' is a Python keyword, so the fields cannot be declared as attributes
+        return {
+            'profile_id': serializers.IntegerField(min_value=1),
+            'from': serializers.IntegerField(min_value=1),
+            'to': serializers.IntegerField(min_value=1),
+        }
+
+    def validate(self, attrs):
+        if attrs['to'] < attrs['from']:
+            raise serializers.ValidationError("'to' must not be before 'from'.")
+        return attrs
+
+
+class BoundedListField(serializers.ListField):
+    """
+    ListField rejecting a list longer than max_length before validating its items.
+    """
+
+    def to_internal_value(self, data):
+        if self.max_length is not None and isinstance(data, list) and len(data) > self.max_length:
+            self.fail('max_length', max_length=self.max_length)
+        return super().to_internal_value(data)
+
+
+class BatchLookupSerializer(serializers.Serializer):
+    """
+    Many (profile_id, day) lookups in one request.
+
+    pairs is a list of [profile_id, day]; ranges a list of DayRangeSerializer.
+    The total number of looked-up days is capped by
+    settings.WALL_CONSTRUCTION['BATCH_LOOKUP_LIMIT'].
+    """
+    pairs = BoundedListField(
+        child=serializers.ListField(child=serializers.IntegerField(min_value=1), min_length=2, max_length=2),
+        required=False,
+        default=list,
+    )
+    ranges = DayRangeSerializer(many=True, required=False, default=list)
+
+    def get_fields(self):
+        # Neither list can be longer than the limit, so longer ones are refused before their items are validated
+        fields = super().get_fields()
+        fields['pairs'].max_length = fields['ranges'].max_length = get_batch_lookup_limit()
+        return fields
+
+    def validate(self, attrs):
+        limit = get_batch_lookup_limit()
+        total = len(attrs['pairs']) + sum(day_range['to'] - day_range['from'] + 1 for day_range in attrs['ranges'])
+        if total == 0:
+            raise serializers.ValidationError("Provide at least one pair or range.")
+        if total > limit:
+            raise serializers.ValidationError(f"Too many lookups. Maximum {limit} days per request allowed, found {total}.")
+        return attrs
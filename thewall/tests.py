@@ -1,3 +1,1649 @@
-from django.test import TestCase
+from array import array
+import asyncio
+from datetime import timedelta
+import io
+import json
+import logging
+import os
+import pstats
+import queue
+import random
+import tempfile
+import threading
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, OperationalError, connection, connections
+from django.db.models import Max, Sum
+from django.test import AsyncClient, AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from thewall.engines import (
+    height_histogram, unlimited_crew_series, plan_sections, team_limited_runs, run_rows, parallel_profile_series,
+    expected_daily_rows,
+)
+from thewall.ingestion import (
+    IngestionStats, SegmentBuilder, reset_tables, insert_plan, load_plan_heights, write_batches, write_progress,
+)
+from thewall import jobs
+from thewall import views
+from thewall import live
+from thewall import plans
+from thewall import results
+from thewall import cache as response_cache
+from thewall import log_viewer
+from thewall.datasets import DISTRIBUTIONS, generate_plan
+from thewall.db import bulk_load
+from thewall.management.commands import bench_async_reads, bench_wall
+from thewall.metrics import registry as metrics_registry
+from thewall.models import (
+    Plan, Profile, Section, DailyProgress, SimulationJob, ProgressSegment, SimulationResult, DatasetState,
+)
+from thewall.parsing import PlanError, parse_plan_chunks, pack_plan, unpack_plan
+from thewall.progress_log import BoundedQueueHandler, ProgressLog, describe_log_line
+from thewall.views import calculate_daily_progress, cumulative_cost, process_plan, run_engine
+
+
+def create_plan(rows):
+    """
+    Create an active plan version from a list of height lists.
+    """
+    plan = plans.start_version()
+    for profile_idx, heights in enumerate(rows, 1):
+        Profile.objects.create(plan=plan, number=profile_idx, name=f"Profile {profile_idx}", heights=bytes(heights))
+    plans.activate(plan)
+    return plan
+
+
+def progress_snapshot():
+    """
+    DailyProgress rows of the active plan keyed by profile name, so that
+    plans created with different primary keys can be compared.
+    """
+    return list(
+        DailyProgress.objects.filter(profile__in=plans.active_profiles()).order_by('profile__number', 'day')
+        .values_list('profile__name', 'day', 'active_crews', 'ice_amount', 'cost')
+    )
+
+
+def active_progress():
+    return DailyProgress.objects.filter(profile__in=plans.active_profiles())
+
+
+def active_segments():
+    return ProgressSegment.objects.filter(profile__in=plans.active_profiles())
+
+
+def section_heights():
+    return list(
+        Section.objects.filter(profile__in=plans.active_profiles()).order_by('id').values_list('height', flat=True)
+    )
+
+
+class UnlimitedCrewSeriesTests(TestCase):
+    def test_parallel_series_matches_single_process(self):
+        heights_by_profile = {1: [0, 5, 30], 2: [29, 29], 3: [30], 4: [12]}
+        expected = [
+            (profile_id, unlimited_crew_series(height_histogram(heights, 30)))
+            for profile_id, heights in heights_by_profile.items()
+        ]
+        for workers in (1, 2, 8):
+            series = parallel_profile_series(heights_by_profile, 30, workers)
+            self.assertEqual([(profile_id, list(crews)) for profile_id, crews in series], expected)
+
+    def test_series_from_histogram(self):
+        histogram = height_histogram([21, 25, 28], 30)
+        self.assertEqual(unlimited_crew_series(histogram), [3, 3, 2, 2, 2, 1, 1, 1, 1])
+
+    def test_finished_sections_are_ignored(self):
+        histogram = height_histogram([30, 30, 29], 30)
+        self.assertEqual(unlimited_crew_series(histogram), [1])
+        self.assertEqual(unlimited_crew_series(height_histogram([30], 30)), [])
+        self.assertEqual(unlimited_crew_series(height_histogram([], 30)), [])
+
+
+class SequentialEngineEquivalenceTests(TestCase):
+    """
+    The analytic engine must produce exactly the rows of the day-by-day loop.
+    """
+
+    def assertEnginesAgree(self, rows):
+        create_plan(rows)
+        calculate_daily_progress(engine='loop')
+        expected_rows = progress_snapshot()
+        # The stored plan keeps its initial heights
+        initial_heights = [height for heights in rows for height in heights]
+        self.assertEqual(section_heights(), initial_heights)
+
+        reset_tables()
+        create_plan(rows)
+        calculate_daily_progress()
+
+        self.assertEqual(progress_snapshot(), expected_rows)
+        self.assertEqual(section_heights(), initial_heights)
+
+    def test_sample_plan(self):
+        self.assertEnginesAgree([[21, 25, 28], [17], [17, 22, 17, 19, 17]])
+
+    def test_edge_heights(self):
+        self.assertEnginesAgree([[0, 30, 0], [30, 30], [29], [0]])
+
+    def test_random_plans(self):
+        rng = random.Random(20250927)
+        for _ in range(3):
+            rows = [
+                [rng.randint(0, 30) for _ in range(rng.randint(1, 40))]
+                for _ in range(rng.randint(1, 8))
+            ]
+            with self.subTest(rows=rows):
+                self.assertEnginesAgree(rows)
+                reset_tables()
+
+    @override_settings(WALL_CONSTRUCTION={**settings.WALL_CONSTRUCTION, 'MAX_HEIGHT': 10})
+    def test_custom_max_height(self):
+        self.assertEnginesAgree([[0, 5, 9], [10, 12], [3]])
+
+    def test_process_pool_engine(self):
+        rng = random.Random(4)
+        rows = [[rng.randint(0, 30) for _ in range(50)] for _ in range(9)]
+        create_plan(rows)
+        calculate_daily_progress()
+        expected_rows = progress_snapshot()
+
+        reset_tables()
+        create_plan(rows)
+        calculate_daily_progress(engine='processes', workers=3)
+
+        self.assertEqual(progress_snapshot(), expected_rows)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            calculate_daily_progress(engine='nope')
+
+
+class IngestionTests(TestCase):
+    def test_insert_plan_in_batches(self):
+        stats = IngestionStats()
+        plan = plans.start_version()
+        profiles_created, sections_created = insert_plan([[1, 2, 3], [], [4, 5]], plan.id, batch_size=2, stats=stats)
+
+        self.assertEqual((profiles_created, sections_created), (2, 5))
+        self.assertEqual(
+            list(Profile.objects.filter(plan=plan).order_by('id').values_list('number', 'name')),
+            [(1, 'Profile 1'), (2, 'Profile 3')]
+        )
+        self.assertEqual(stats.as_dict()['rows'], {'profiles': 2})
+        self.assertEqual(list(Section.objects.order_by('id').values_list('id', 'profile_id', 'height')), [
+            (1, 1, 1), (2, 1, 2), (3, 1, 3), (4, 2, 4), (5, 2, 5),
+        ])
+        self.assertEqual(list(Profile.objects.get(name='Profile 3').height_array()), [4, 5])
+
+    def test_reset_tables_restarts_ids(self):
+        create_plan([[1, 2], [3]])
+        calculate_daily_progress()
+        reset_tables()
+
+        self.assertFalse(DailyProgress.objects.exists())
+        self.assertFalse(Section.objects.exists())
+        self.assertFalse(Plan.objects.exists())
+        insert_plan([[7]], plans.start_version().id)
+        self.assertEqual(Profile.objects.get().id, 1)
+
+    def test_write_progress_streams_batches(self):
+        create_plan([[0]])
+        profile_id = Profile.objects.get().id
+        rows = ((profile_id, day, 1, 195, 370500) for day in range(1, 11))
+
+        self.assertEqual(write_progress(rows, batch_size=3), 10)
+        self.assertEqual(DailyProgress.objects.count(), 10)
+        self.assertEqual(
+            list(ProgressSegment.objects.values_list('start_day', 'end_day', 'active_crews', 'cumulative_cost')),
+            [(1, 10, 1, 3705000)]
+        )
+
+    def test_writer_thread_applies_back_pressure(self):
+        create_plan([[0]])
+        profile_id = Profile.objects.get().id
+        stats = IngestionStats()
+        in_flight = []
+
+        def batches():
+            for day in range(1, 51):
+                in_flight.append(day - 1 - stats.rows.get('daily_progress', 0))
+                yield 'daily_progress', [(profile_id, day, 1, 195, 370500)]
+
+        write_batches(batches(), stats=stats, queue_size=2, transaction_rows=3)
+
+        self.assertEqual(DailyProgress.objects.count(), 50)
+        # Two batches queued and one being inserted at most
+        self.assertLessEqual(max(in_flight), 3)
+
+    def test_writer_errors_reach_the_producer(self):
+        create_plan([[0]])
+        profile_id = Profile.objects.get().id
+        produced = []
+
+        def batches():
+            for day in range(1, 101):
+                produced.append(day)
+                # Day 2 again breaks the (profile, day) unique constraint
+                yield 'daily_progress', [(profile_id, day if day != 3 else 2, 1, 195, 370500)]
+
+        with self.assertRaises(IntegrityError):
+            write_batches(batches(), queue_size=1)
+        self.assertLess(len(produced), 100)
+
+    def test_producer_queries_are_refused_while_the_writer_owns_the_connection(self):
+        create_plan([[0]])
+        profile_id = Profile.objects.get().id
+
+        def batches():
+            yield 'daily_progress', [(profile_id, 1, 1, 195, 370500)]
+            Profile.objects.count()
+            yield 'daily_progress', [(profile_id, 2, 1, 195, 370500)]
+
+        with self.assertRaisesMessage(RuntimeError, 'belongs to the progress writer'):
+            write_batches(batches(), queue_size=1)
+        # The connection is usable again once the writer is done
+        self.assertEqual(Profile.objects.count(), 1)
+
+    def test_segment_builder_merges_interleaved_profiles(self):
+        builder = SegmentBuilder()
+        rows = [
+            (1, 1, 2, 390, 10), (2, 1, 1, 195, 5),
+            (1, 2, 2, 390, 10), (2, 2, 1, 195, 5),
+            (1, 3, 1, 195, 5), (2, 4, 1, 195, 5),
+        ]
+        closed = [segment for segment in (builder.add(*row) for row in rows) if segment is not None]
+
+        self.assertEqual(closed, [(1, 1, 2, 2, 390, 10, 20), (2, 1, 2, 1, 195, 5, 10)])
+        self.assertEqual(builder.close(), [(1, 3, 3, 1, 195, 5, 25), (2, 4, 4, 1, 195, 5, 15)])
+
+
+class UploadTestCase(TestCase):
+    """
+    Authenticated admin client; files written next to the project go to a temporary directory.
+    """
+
+    def setUp(self):
+        # Generations restart with every test database transaction
+        response_cache.clear()
+        response_cache.stats.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        self.base_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.base_dir.cleanup)
+        settings_override = override_settings(BASE_DIR=self.base_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, content=b'21,25,28\n17\n17,22,17,19,17\n', query=''):
+        upload = SimpleUploadedFile('plan.csv', content, content_type='text/csv')
+        return self.client.post(f'/thewall/upload-csv/{query}', {'file': upload}, format='multipart')
+
+
+class UploadCSVTests(UploadTestCase):
+    def test_upload_reports_row_counts(self):
+        response = self.upload()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['profiles_created'], 3)
+        self.assertEqual(response.data['sections_created'], 9)
+        self.assertEqual(response.data['daily_progress_rows'], DailyProgress.objects.count())
+        self.assertEqual(response.data['ingestion']['rows']['profiles'], 3)
+        self.assertEqual(Section.objects.count(), 9)
+        self.assertEqual(self.client.get('/thewall/profiles/1/days/1/').data, {'day': '1', 'ice_amount': '585'})
+
+
+def reference_team_schedule(sections, num_teams, max_height):
+    """
+    Day-by-day team-limited simulation: each day the first num_teams
+    unfinished sections gain one foot. Returns {(profile_id, day): crews}.
+    """
+    heights = [[profile_id, height] for profile_id, _, height in sections]
+    schedule = {}
+    day = 1
+    while True:
+        unfinished = [section for section in heights if section[1] < max_height]
+        if not unfinished:
+            return schedule
+        for section in unfinished[:num_teams]:
+            section[1] += 1
+            schedule[(section[0], day)] = schedule.get((section[0], day), 0) + 1
+        day += 1
+
+
+class UploadTimingTests(UploadTestCase):
+    def test_upload_reports_phase_timings(self):
+        response = self.upload()
+        timings = response.data['timings']
+        for phase in ('validation', 'copy', 'version', 'insert', 'lookup', 'simulation', 'result_store',
+                      'progress_write', 'activation', 'total'):
+            self.assertGreaterEqual(timings[f'{phase}_ms'], 0, phase)
+        self.assertLessEqual(timings['copy_ms'], timings['validation_ms'])
+        self.assertLessEqual(timings['insert_ms'] + timings['simulation_ms'], timings['total_ms'])
+
+        # The same plan again is restored from the result store
+        timings = self.upload().data['timings']
+        self.assertIn('restore_ms', timings)
+        self.assertNotIn('simulation_ms', timings)
+
+        timings = self.client.post('/thewall/simulate/?teams=2').data['timings']
+        self.assertIn('load_ms', timings)
+        self.assertIn('simulation_ms', timings)
+
+    def test_profiled_upload_stores_pstats_dump(self):
+        response = self.upload(query='?profile=cprofile')
+        self.assertEqual(response.status_code, 201)
+        profile_id = response.data['profile']['id']
+        self.assertTrue(response.data['profile']['url'].endswith(f'/thewall/uploads/profiles/{profile_id}/'))
+
+        download = self.client.get(f'/thewall/uploads/profiles/{profile_id}/')
+        self.assertEqual(download.status_code, 200)
+        self.assertIn('attachment', download['Content-Disposition'])
+        dump = os.path.join(self.base_dir.name, 'downloaded.pstats')
+        with open(dump, 'wb') as f:
+            f.write(b''.join(download.streaming_content))
+        functions = {function for _, _, function in pstats.Stats(dump).stats}
+        self.assertIn('process_plan', functions)
+
+        self.assertEqual(self.client.get('/thewall/uploads/profiles/20000101-000000000000-00000000/').status_code, 404)
+        self.assertEqual(self.client.get('/thewall/uploads/profiles/not-an-id/').status_code, 404)
+
+    def test_only_the_latest_dumps_are_kept(self):
+        with override_settings(WALL_CONSTRUCTION={**settings.WALL_CONSTRUCTION, 'PROFILE_KEEP': 2}):
+            ids = [self.upload(query='?profile=cprofile').data['profile']['id'] for _ in range(3)]
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.base_dir.name, 'upload_profiles'))), 2
+        )
+        self.assertEqual(self.client.get(f'/thewall/uploads/profiles/{ids[-1]}/').status_code, 200)
+
+    def test_profile_errors(self):
+        self.assertEqual(self.upload(query='?profile=yappi').status_code, 400)
+        self.assertEqual(self.upload(query='?profile=cprofile&async=true').status_code, 400)
+        self.assertFalse(os.path.exists(os.path.join(self.base_dir.name, 'upload_profiles')))
+
+        # Invalid plans are profiled too
+        response = self.upload(content=b'21,x\n', query='?profile=cprofile')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('profile', response.data)
+
+        self.client.force_authenticate(None)
+        self.assertIn(
+            self.client.get(f"/thewall/uploads/profiles/{response.data['profile']['id']}/").status_code, (401, 403)
+        )
+
+
+class TeamLimitedEngineTests(TestCase):
+    config = {'CUBIC_YARDS_PER_CREW_PER_DAY': 195, 'COST_PER_CUBIC_YARD': 1900, 'MAX_HEIGHT': 30}
+
+    def schedule(self, sections, num_teams, max_height=30):
+        runs = team_limited_runs(sections, num_teams, max_height)
+        rows = list(run_rows(runs, {**self.config, 'MAX_HEIGHT': max_height}))
+        self.assertEqual(len(rows), len({(profile_id, day) for profile_id, day, *_ in rows}))
+        return {(profile_id, day): crews for profile_id, day, crews, _, _ in rows}
+
+    def test_matches_day_by_day_simulation(self):
+        rng = random.Random(7)
+        for _ in range(20):
+            sections = [
+                (profile_id, section_id, rng.randint(0, 30))
+                for section_id, profile_id in enumerate(sorted(rng.randint(1, 6) for _ in range(rng.randint(1, 60))), 1)
+            ]
+            num_teams = rng.randint(1, 12)
+            with self.subTest(sections=sections, num_teams=num_teams):
+                self.assertEqual(self.schedule(sections, num_teams), reference_team_schedule(sections, num_teams, 30))
+
+    def test_runs_collapse_identical_days(self):
+        runs = list(team_limited_runs([(1, 1, 0), (1, 2, 0), (2, 3, 10)], 2, 30))
+        self.assertEqual(sorted(runs), [(1, 1, 30, 2), (2, 31, 50, 1)])
+
+    def test_events(self):
+        events = []
+        list(team_limited_runs([(1, 1, 28), (1, 2, 30)], 3, 30, on_event=lambda *event: events.append(event)))
+        self.assertEqual(events, [
+            ('relieved', 1, 2, None, None),
+            ('relieved', 1, 3, None, None),
+            ('completed', 2, 1, 1, 1),
+            ('relieved', 3, 1, None, None),
+        ])
+
+    def test_one_team_per_section_by_default(self):
+        sections = [(1, 1, 21), (1, 2, 25), (2, 3, 28)]
+        self.assertEqual(self.schedule(sections, None), reference_team_schedule(sections, 3, 30))
+
+
+class UploadEngineSelectionTests(UploadTestCase):
+    def test_events_engine(self):
+        response = self.upload(query='?parallel=true&teams=2&engine=events')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['engine'], 'events')
+        expected = reference_team_schedule(
+            [(profile_id, None, height) for profile_id, heights in enumerate([[21, 25, 28], [17], [17, 22, 17, 19, 17]], 1) for height in heights],
+            2, 30,
+        )
+        actual = dict(((profile_id, day), crews) for profile_id, day, crews in DailyProgress.objects.values_list('profile_id', 'day', 'active_crews'))
+        self.assertEqual(actual, expected)
+        self.assertEqual(sum(actual.values()), 87)
+        self.assertEqual(section_heights(), [21, 25, 28, 17, 17, 22, 17, 19, 17])
+
+    def test_unknown_engine_is_rejected_before_upload(self):
+        create_plan([[1]])
+        response = self.upload(query='?engine=gpu')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('engine', response.data['errors'])
+        self.assertEqual(Profile.objects.count(), 1)
+
+    def test_processes_engine(self):
+        response = self.upload(query='?engine=processes&workers=2')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['engine'], 'processes')
+        self.assertEqual(response.data['daily_progress_rows'], 13 + 13 + 9)
+
+    def test_invalid_workers(self):
+        response = self.upload(query='?engine=processes&workers=0')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('workers', response.data['errors'])
+
+    def test_invalid_teams(self):
+        response = self.upload(query='?parallel=true&teams=many')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('teams', response.data['errors'])
+
+
+class AsyncUploadTests(UploadTestCase):
+    def test_async_upload_returns_job(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.upload(query='?async=true&parallel=true&teams=2&engine=events')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(Profile.objects.exists())
+
+        job_id = response.data['job_id']
+        status = self.client.get(f'/thewall/jobs/{job_id}/').data
+        self.assertEqual((status['state'], status['progress']), (SimulationJob.QUEUED, 0))
+
+        jobs.run_job(job_id)
+
+        status = self.client.get(f'/thewall/jobs/{job_id}/').data
+        self.assertEqual((status['state'], status['progress']), (SimulationJob.SUCCEEDED, 100))
+        self.assertEqual(status['result']['profiles_created'], 3)
+        self.assertEqual(status['result']['engine'], 'events')
+        self.assertIn('total_ms', status['timings'])
+        self.assertEqual(DailyProgress.objects.aggregate(total=Sum('active_crews'))['total'], 87)
+
+    def test_progress_moves_while_the_rows_are_stored(self):
+        reported = []
+        plan = generate_plan('tiny', 'uniform')
+        config = {**settings.WALL_CONSTRUCTION, 'BULK_BATCH_SIZE': 10, 'RESULT_STORE_MAX_ROWS': 0}
+        with override_settings(WALL_CONSTRUCTION=config):
+            result = process_plan(plan, 'analytic', on_phase=lambda phase, progress: reported.append((phase, progress)))
+
+        simulating = [progress for phase, progress in reported if phase == 'simulating']
+        self.assertEqual(simulating[0], 30)
+        self.assertEqual(simulating, sorted(simulating))
+        self.assertGreater(len(set(simulating)), 5)
+        self.assertEqual(simulating[-1], 95)
+        # Exact without a team limit
+        self.assertEqual(expected_daily_rows(plan, 30), result['daily_progress_rows'])
+
+    def test_failed_job_reports_error(self):
+        job = jobs.submit([array('B', [1, 2])], 'gpu')
+
+        jobs.run_job(job.id)
+
+        status = self.client.get(f'/thewall/jobs/{job.id}/').data
+        self.assertEqual(status['state'], SimulationJob.FAILED)
+        self.assertIn('Error processing file', status['error'])
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get('/thewall/jobs/999/').status_code, 404)
+
+    def test_job_lost_with_its_process_is_reported_failed(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            lost = jobs.submit([array('B', [1, 2])], 'analytic')
+            running = jobs.submit([array('B', [1, 2])], 'analytic')
+        # Neither is known to this process: the one that queued them was restarted
+        self.assertEqual(self.client.get(f'/thewall/jobs/{lost.id}/').data['state'], SimulationJob.QUEUED)
+
+        SimulationJob.objects.update(created_at=timezone.now() - timedelta(hours=2))
+        # Still running here, however long it takes
+        jobs._live_status[running.id] = ('simulating', 30)
+        try:
+            self.assertEqual(self.client.get(f'/thewall/jobs/{running.id}/').data['state'], SimulationJob.QUEUED)
+        finally:
+            jobs._live_status.pop(running.id)
+
+        status = self.client.get(f'/thewall/jobs/{lost.id}/').data
+        self.assertEqual(status['state'], SimulationJob.FAILED)
+        self.assertIn('Job lost', status['error'])
+        self.assertIsNotNone(status['finished_at'])
+        self.assertEqual(SimulationJob.objects.get(id=lost.id).state, SimulationJob.FAILED)
+
+
+class StreamingParserTests(TestCase):
+    def parse(self, content, chunk_size=3):
+        return parse_plan_chunks(content[i:i + chunk_size] for i in range(0, len(content), chunk_size))
+
+    def test_parses_across_chunk_boundaries(self):
+        plan = self.parse(b'21, 25 ,28\r\n\n17\n1,,2')
+        self.assertEqual([list(heights) for heights in plan], [[21, 25, 28], [], [17], [1, 2]])
+        self.assertTrue(all(isinstance(heights, array) for heights in plan))
+
+    def test_errors_keep_line_and_column(self):
+        with self.assertRaisesMessage(PlanError, "Line 2, Column 3: Value '-5' must be between 0 and 30."):
+            self.parse(b'1,2,3\n4,5,-5\n')
+        with self.assertRaisesMessage(PlanError, "Line 1, Column 2: Invalid number '2.5'. All values must be numeric."):
+            self.parse(b'1,2.5\n')
+        with self.assertRaisesMessage(PlanError, "Line 1: Too many values. Maximum 2000 values per line allowed, found 2001 values."):
+            self.parse(b','.join([b'1'] * 2001), chunk_size=1024)
+        with self.assertRaisesMessage(PlanError, "Too many lines. Maximum 300 lines allowed, found 301 lines."):
+            self.parse(b'1\n' * 301, chunk_size=1024)
+
+    def test_long_line_is_refused_before_it_is_read_whole(self):
+        read = []
+
+        def chunks():
+            yield b'1,2\n'
+            for _ in range(1000):
+                read.append(1)
+                yield b'1,' * 512
+
+        with self.assertRaisesMessage(PlanError, "Line 2: Too many values. Maximum 2000 values per line allowed"):
+            parse_plan_chunks(chunks())
+        self.assertLess(len(read), 10)
+
+    def test_padded_values_are_accepted_on_long_lines(self):
+        line = b','.join([b'  0007 '] * 2000)
+        plan = self.parse(line + b'\n' + line, chunk_size=1024)
+        self.assertEqual([list(heights) for heights in plan], [[7] * 2000] * 2)
+
+    def test_multibyte_character_split_between_chunks(self):
+        with self.assertRaisesMessage(PlanError, "Line 1, Column 1: Invalid number '\u0436'."):
+            self.parse('\u0436,1'.encode('utf-8'), chunk_size=1)
+        with self.assertRaises(UnicodeDecodeError):
+            self.parse(b'1,\xff')
+
+    def test_pack_roundtrip(self):
+        plan = [array('B', [0, 10, 30]), array('B'), array('B', [10])]
+        self.assertEqual(unpack_plan(pack_plan(plan)), plan)
+
+
+class UploadValidationTests(UploadTestCase):
+    def test_invalid_file_reports_position_and_keeps_previous_copy(self):
+        with open(os.path.join(settings.BASE_DIR, 'wall_construction_plan.csv'), 'wb') as previous:
+            previous.write(b'1,2\n')
+        with open(os.path.join(os.path.dirname(__file__), '..', 'test_data', 'test_invalid.csv'), 'rb') as f:
+            response = self.upload(f.read())
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors']['file'], ["Line 2, Column 1: Value '31' must be between 0 and 30."])
+        with open(os.path.join(settings.BASE_DIR, 'wall_construction_plan.csv'), 'rb') as f:
+            self.assertEqual(f.read(), b'1,2\n')
+
+    def test_valid_file_is_copied(self):
+        self.assertEqual(self.upload().status_code, 201)
+        with open(os.path.join(settings.BASE_DIR, 'wall_construction_plan.csv'), 'rb') as f:
+            self.assertEqual(f.read(), b'21,25,28\n17\n17,22,17,19,17\n')
+
+
+class CumulativeCostTests(UploadTestCase):
+    """
+    Cumulative costs computed from the segments must match aggregates over the daily rows.
+    """
+
+    def assertMatchesAggregates(self):
+        last_day = DailyProgress.objects.order_by('-day').values_list('day', flat=True).first()
+        profile_ids = list(Profile.objects.values_list('id', flat=True)) + [999]
+        for day in [0, 1, 2, last_day // 2, last_day - 1, last_day, last_day + 1, last_day + 100]:
+            for profile_id in profile_ids:
+                expected = DailyProgress.objects.filter(profile_id=profile_id, day__lte=day).aggregate(total=Sum('cost'))['total'] or 0
+                self.assertEqual(cumulative_cost(day, profile_id=profile_id), expected, (day, profile_id))
+            expected = DailyProgress.objects.filter(day__lte=day).aggregate(total=Sum('cost'))['total'] or 0
+            self.assertEqual(cumulative_cost(day), expected, day)
+        self.assertEqual(cumulative_cost(None), DailyProgress.objects.aggregate(total=Sum('cost'))['total'])
+
+    def test_unlimited_crews(self):
+        create_plan([[21, 25, 28], [17], [17, 22, 17, 19, 17], [30]])
+        run_engine('analytic')
+        self.assertMatchesAggregates()
+
+    def test_team_limited(self):
+        rng = random.Random(3)
+        create_plan([[rng.randint(0, 30) for _ in range(rng.randint(1, 12))] for _ in range(6)])
+        run_engine('events', num_teams=3)
+        self.assertMatchesAggregates()
+
+    def test_overview_endpoints(self):
+        self.upload(query='?engine=events&teams=2')
+
+        self.assertEqual(self.client.get('/thewall/profiles/1/overview/1/').data, {'day': '1', 'cost': '741,000'})
+        self.assertEqual(self.client.get('/thewall/profiles/3/overview/1000/').data['cost'], f"{(13 + 8 + 13 + 11 + 13) * 370500:,}")
+        self.assertEqual(self.client.get('/thewall/profiles/overview/1/').data, {'day': '1', 'cost': '741,000'})
+        self.assertEqual(self.client.get('/thewall/profiles/overview/').data, {'day': None, 'cost': f"{87 * 370500:,}"})
+
+
+class ResponseCacheTests(UploadTestCase):
+    def test_hits_and_revalidation(self):
+        self.upload()
+
+        first = self.client.get('/thewall/profiles/1/days/1/')
+        second = self.client.get('/thewall/profiles/1/days/1/')
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+        not_modified = self.client.get('/thewall/profiles/1/days/1/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['X-Cache-Hit-Ratio'], '0.6667')
+
+        stats = self.client.get('/thewall/cache/').data
+        self.assertEqual((stats['misses'], stats['memory_hits'], stats['not_modified']), (1, 1, 1))
+
+    def test_upload_invalidates(self):
+        self.upload()
+        first = self.client.get('/thewall/profiles/overview/')
+
+        self.upload(b'0\n')
+        second = self.client.get('/thewall/profiles/overview/')
+
+        self.assertEqual(second['X-Cache'], 'MISS')
+        self.assertNotEqual(first['ETag'], second['ETag'])
+        self.assertEqual(second.json(), {'day': None, 'cost': f"{30 * 370500:,}"})
+        stale = self.client.get('/thewall/profiles/overview/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(stale.status_code, 200)
+
+    def test_shared_tier(self):
+        self.upload()
+        self.client.get('/thewall/profiles/overview/1/')
+        response_cache.memory_cache.clear()
+
+        self.assertEqual(self.client.get('/thewall/profiles/overview/1/')['X-Cache'], 'HIT-SHARED')
+        self.assertEqual(self.client.get('/thewall/profiles/overview/1/')['X-Cache'], 'HIT')
+
+    def test_lru_is_bounded(self):
+        lru = response_cache.LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c'), len(lru)), (1, None, 3, 2))
+
+
+class AsyncReadViewTests(UploadTestCase):
+    def get(self, view, path, *args, **headers):
+        return async_to_sync(view)(AsyncRequestFactory().get(path, headers=headers), *args)
+
+    def test_same_responses_as_the_sync_views(self):
+        self.upload()
+        cases = [
+            (views.aprofile_day_detail, '/thewall/profiles/3/days/2/', 3, 2),
+            (views.aprofile_day_detail, '/thewall/profiles/2/days/40/', 2, 40),
+            (views.aprofile_overview, '/thewall/profiles/1/overview/3/', 1, 3),
+            (views.aprofiles_overview, '/thewall/profiles/overview/2/', 2),
+            (views.aall_profiles_overview, '/thewall/profiles/overview/'),
+        ]
+        for view, path, *args in cases:
+            expected = self.client.get(path)
+            response_cache.clear()
+            response = self.get(view, path, *args)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertEqual(response.content, expected.content, path)
+
+    def test_cached_per_generation(self):
+        self.upload()
+        path = '/thewall/profiles/overview/'
+        first = self.get(views.aall_profiles_overview, path)
+        second = self.get(views.aall_profiles_overview, path)
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        response_cache.memory_cache.clear()
+        self.assertEqual(self.get(views.aall_profiles_overview, path)['X-Cache'], 'HIT-SHARED')
+        self.assertEqual(
+            self.get(views.aall_profiles_overview, path, if_none_match=first['ETag']).status_code, 304
+        )
+
+        self.upload(b'0\n')
+        fresh = self.get(views.aall_profiles_overview, path)
+        self.assertEqual(fresh['X-Cache'], 'MISS')
+        self.assertEqual(json.loads(fresh.content), {'day': None, 'cost': f"{30 * 370500:,}"})
+
+    def test_read_only_methods(self):
+        request = AsyncRequestFactory().post('/thewall/profiles/overview/')
+        self.assertEqual(async_to_sync(views.aall_profiles_overview)(request).status_code, 405)
+
+
+class BatchLookupTests(UploadTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload()
+
+    def batch(self, payload):
+        return self.client.post('/thewall/profiles/days/batch/', payload, format='json')
+
+    def test_matches_single_lookups(self):
+        pairs = [[1, 1], [3, 13], [3, 14], [2, 99], [42, 1], [1, 1]]
+        response = self.batch({'pairs': pairs, 'ranges': [{'profile_id': 1, 'from': 8, 'to': 11}]})
+
+        self.assertEqual(response.status_code, 200)
+        expected = [
+            [profile_id, day, int(self.client.get(f'/thewall/profiles/{profile_id}/days/{day}/').json()['ice_amount'])]
+            for profile_id, day in pairs + [[1, day] for day in range(8, 12)]
+        ]
+        self.assertEqual(response.data['results'], expected)
+        self.assertEqual(response.data['count'], 10)
+
+    def test_uses_a_few_queries(self):
+        pairs = [[profile_id, day] for profile_id in (1, 2, 3) for day in range(1, 200)]
+        with self.assertNumQueries(1):
+            response = self.batch({'pairs': pairs})
+        self.assertEqual(sum(row[2] for row in response.data['results']), 87 * 195)
+
+    @override_settings(WALL_CONSTRUCTION={**settings.WALL_CONSTRUCTION, 'BATCH_LOOKUP_LIMIT': 5})
+    def test_batch_size_is_capped(self):
+        response = self.batch({'pairs': [[1, 1]], 'ranges': [{'profile_id': 1, 'from': 1, 'to': 5}]})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(WALL_CONSTRUCTION={**settings.WALL_CONSTRUCTION, 'BATCH_LOOKUP_LIMIT': 5})
+    def test_long_lists_are_refused_before_their_items(self):
+        # Invalid items past the limit are not reported, the length is checked first
+        response = self.batch({'pairs': [[1, 1]] * 5 + [['x']] * 5})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error']['pairs'], ['Ensure this field has no more than 5 elements.'])
+
+    def test_invalid_payload(self):
+        self.assertEqual(self.batch({'pairs': [[1]]}).status_code, 400)
+        self.assertEqual(self.batch({'ranges': [{'profile_id': 1, 'from': 5, 'to': 1}]}).status_code, 400)
+        self.assertEqual(self.batch({}).status_code, 400)
+
+
+class ProfileSeriesTests(UploadTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload(query='?engine=events&teams=2')
+
+    def series(self, query=''):
+        response = self.client.get(f'/thewall/profiles/3/series/{query}')
+        self.assertTrue(response.streaming)
+        return json.loads(b''.join(response.streaming_content))
+
+    @override_settings(WALL_CONSTRUCTION={**settings.WALL_CONSTRUCTION, 'SERIES_CHUNK_SIZE': 4})
+    def test_full_series(self):
+        data = self.series()
+        rows = list(DailyProgress.objects.filter(profile_id=3).order_by('day').values_list('day', 'active_crews', 'ice_amount', 'cost'))
+
+        self.assertEqual(data['days'], [row[0] for row in rows])
+        self.assertEqual(data['crews'], [row[1] for row in rows])
+        self.assertEqual(data['ice'], [row[2] for row in rows])
+        self.assertEqual(data['cost'], [row[3] for row in rows])
+        running = 0
+        for day, total in zip(data['days'], data['cumulative_cost']):
+            running += DailyProgress.objects.get(profile_id=3, day=day).cost
+            self.assertEqual(total, running)
+
+    def test_range_and_fields(self):
+        first_day = DailyProgress.objects.filter(profile_id=3).order_by('day').values_list('day', flat=True).first()
+        data = self.series(f'?from={first_day + 2}&to={first_day + 4}&fields=days,cumulative_cost')
+
+        self.assertEqual(data['fields'], ['days', 'cumulative_cost'])
+        self.assertEqual(data['days'], [first_day + 2, first_day + 3, first_day + 4])
+        self.assertEqual(data['cumulative_cost'], [cumulative_cost(day, profile_id=3) for day in data['days']])
+        self.assertNotIn('ice', data)
+
+    def test_empty_range(self):
+        self.assertEqual(self.series('?from=100000&fields=days')['days'], [])
+
+    @override_settings(WALL_CONSTRUCTION={**settings.WALL_CONSTRUCTION, 'SERIES_CHUNK_SIZE': 4})
+    def test_columns_stay_aligned_when_the_version_is_collected_while_streaming(self):
+        expected = self.series()
+        response = self.client.get('/thewall/profiles/3/series/')
+        content = iter(response.streaming_content)
+        head = next(content)
+        # An upload replaces the version and its collection runs before the body is sent
+        retired = plans.active_plan_id()
+        plans.activate(plans.copy_version(retired))
+        plans.delete_version(retired)
+        data = json.loads(head + b''.join(content))
+        self.assertEqual(data, expected)
+        self.assertEqual(len(data['days']), len(data['cumulative_cost']))
+        self.assertGreater(len(data['days']), 0)
+
+    def test_errors(self):
+        self.assertEqual(self.client.get('/thewall/profiles/3/series/?fields=weather').status_code, 400)
+        self.assertEqual(self.client.get('/thewall/profiles/3/series/?from=5&to=2').status_code, 400)
+        self.assertEqual(self.client.get('/thewall/profiles/99/series/').status_code, 404)
+
+
+class ThreadsEngineTests(UploadTestCase):
+    plan = [[21, 25, 28], [17], [17, 22, 17, 19, 17]]
+
+    def test_stores_team_limited_schedule(self):
+        sections = [(profile_id, None, height) for profile_id, heights in enumerate(self.plan, 1) for height in heights]
+        previous_days = None
+        for num_teams in (1, 2, 4, 20):
+            with self.subTest(num_teams=num_teams):
+                response = self.upload(query=f'?parallel=true&teams={num_teams}')
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.data['engine'], 'threads')
+
+                expected = reference_team_schedule(sections, num_teams, 30)
+                actual = dict(((profile_id, day), crews) for profile_id, day, crews in active_progress().values_list('profile__number', 'day', 'active_crews'))
+                self.assertEqual(actual, expected)
+
+                # 87 feet of wall take 87 crew-days whatever the team count, spread over fewer days with more teams
+                last_day = active_progress().aggregate(last_day=Max('day'))['last_day']
+                self.assertEqual(last_day, max(day for _, day in expected))
+                if previous_days is None:
+                    self.assertEqual(last_day, 87)
+                else:
+                    self.assertLess(last_day, previous_days)
+                previous_days = last_day
+                self.assertEqual(self.client.get('/thewall/profiles/overview/').json()['cost'], f"{87 * 195 * 1900:,}")
+                self.assertEqual(section_heights(), [21, 25, 28, 17, 17, 22, 17, 19, 17])
+
+    def test_matches_events_engine(self):
+        self.upload(query='?parallel=true&teams=3')
+        threads = progress_snapshot()
+        self.upload(query='?parallel=true&teams=3&engine=events')
+        self.assertEqual(threads, progress_snapshot())
+
+
+class ProgressLogTests(UploadTestCase):
+    def read_log(self):
+        with open(os.path.join(self.base_dir.name, 'wall_progress.log')) as log_file:
+            return [json.loads(line) for line in log_file]
+
+    def test_engines_write_json_lines(self):
+        for engine in ('events', 'threads'):
+            with self.subTest(engine=engine):
+                self.upload(query=f'?engine={engine}&teams=2')
+                events = self.read_log()
+                self.assertEqual(events[0]['event'], 'started')
+                self.assertEqual(events[0]['teams'], 2)
+                self.assertEqual(events[-1]['event'], 'finished')
+                self.assertEqual(events[-1]['dropped'], 0)
+                self.assertEqual(events[-1]['days'], active_progress().aggregate(last_day=Max('day'))['last_day'])
+                completed = [event for event in events if event['event'] == 'completed']
+                self.assertEqual(len(completed), 9)
+                self.assertEqual(
+                    {(event['profile'], event['section']) for event in completed},
+                    {('Profile 1', 1), ('Profile 1', 2), ('Profile 1', 3), ('Profile 2', 4)}
+                    | {('Profile 3', section) for section in range(5, 10)},
+                )
+                self.assertLessEqual({event['team'] for event in events if event['event'] == 'relieved'}, {1, 2})
+
+        self.client.force_login(User.objects.get(username='admin'))
+        self.assertContains(self.client.get('/thewall/'), 'Completed section on Profile 3, Section 9')
+
+    def test_can_be_disabled(self):
+        with override_settings(WALL_CONSTRUCTION={**settings.WALL_CONSTRUCTION, 'PROGRESS_LOG_ENABLED': False}):
+            self.upload(query='?engine=events&teams=2')
+        self.assertFalse(os.path.exists(os.path.join(self.base_dir.name, 'wall_progress.log')))
+
+    def test_overflow_policies(self):
+        def batch(*days):
+            return logging.makeLogRecord({'events': [(0.0, 'relieved', {'day': day, 'team': 1}) for day in days]})
+
+        for overflow, kept in (('drop_newest', [1, 2]), ('drop_oldest', [4, 5])):
+            with self.subTest(overflow=overflow):
+                handler = BoundedQueueHandler(queue.Queue(1), overflow)
+                for days in ((1, 2), (3,), (4, 5)):
+                    handler.emit(batch(*days))
+                self.assertEqual([fields['day'] for _, _, fields in handler.queue.get_nowait().events], kept)
+                self.assertEqual(handler.dropped, 3)
+
+        with self.assertRaises(ValueError):
+            ProgressLog(overflow='drop_all')
+
+    def test_slow_writer_does_not_lose_blocked_events(self):
+        path = os.path.join(self.base_dir.name, 'blocked.log')
+        with ProgressLog(path=path, queue_size=1, overflow='block') as progress_log:
+            for day in range(1, 2001):
+                progress_log.event('relieved', day=day, team=1)
+            progress_log.finish(days=2000, teams=1)
+        with open(path) as log_file:
+            events = [json.loads(line) for line in log_file]
+        self.assertEqual([event['day'] for event in events[:-1]], list(range(1, 2001)))
+        self.assertEqual(events[-1]['dropped'], 0)
+        self.assertEqual(describe_log_line(json.dumps(events[0]))[0], 'relieved')
+        self.assertEqual(describe_log_line('Wall Construction Progress Log'), (None, 'Wall Construction Progress Log'))
+
+
+    def test_block_gives_up_after_block_seconds(self):
+        handler = BoundedQueueHandler(queue.Queue(1), 'block', block_seconds=0.01)
+        for day in (1, 2):
+            handler.emit(logging.makeLogRecord({'events': [(0.0, 'relieved', {'day': day, 'team': 1})]}))
+        self.assertEqual([fields['day'] for _, _, fields in handler.queue.get_nowait().events], [1])
+        self.assertEqual(handler.dropped, 1)
+
+    def test_concurrent_run_leaves_the_log_of_the_running_one_alone(self):
+        path = os.path.join(self.base_dir.name, 'turns.log')
+        second = []
+
+        def second_run():
+            with ProgressLog(path=path) as progress_log:
+                second.append(progress_log.enabled)
+                progress_log.event('restored', method='sequential', rows=1)
+
+        with ProgressLog(path=path) as progress_log:
+            progress_log.event('started', teams=1, max_height=30)
+            thread = threading.Thread(target=second_run)
+            thread.start()
+            # Does not wait for the running one
+            thread.join(5)
+            self.assertEqual(second, [False])
+            progress_log.finish(days=1, teams=1)
+
+        with open(path) as log_file:
+            events = [json.loads(line) for line in log_file]
+        self.assertEqual([event['event'] for event in events], ['started', 'finished'])
+
+
+class LogViewerTests(UploadTestCase):
+    def setUp(self):
+        super().setUp()
+        log_viewer.clear()
+        self.path = os.path.join(self.base_dir.name, 'wall_progress.log')
+        self.write_log(450)
+
+    def write_log(self, days):
+        with ProgressLog() as progress_log:
+            for day in range(1, days + 1):
+                progress_log.event('relieved', day=day, team=1)
+            progress_log.finish(days=days, teams=1)
+
+    def append(self, text):
+        with open(self.path, 'a') as log_file:
+            log_file.write(text)
+
+    def test_dashboard_pages(self):
+        tail = self.client.get('/thewall/').content.decode()
+        self.assertIn('Lines 252-451 of 451', tail)
+        self.assertIn('Day 252 - Relieved', tail)
+        self.assertNotIn('Day 251 - Relieved', tail)
+        self.assertIn('Construction completed in 450 days', tail)
+        self.assertIn('href="?log_page=2">Previous', tail)
+
+        first = self.client.get('/thewall/?log_page=1').content.decode()
+        self.assertIn('Lines 1-200 of 451', first)
+        self.assertIn('Day 1 - Relieved', first)
+        self.assertNotIn('Day 201 - Relieved', first)
+        self.assertIn('href="?log_page=2">Next', first)
+        self.assertIn('No lines on this page', self.client.get('/thewall/?log_page=9').content.decode())
+
+        os.remove(self.path)
+        self.assertIn('No construction log available', self.client.get('/thewall/').content.decode())
+
+    def test_index_is_extended_and_pages_are_cached(self):
+        html = log_viewer.render_page()
+        self.assertIs(log_viewer.render_page(), html)
+
+        index = log_viewer.get_index()
+        offsets = index.offsets
+        self.append('not json <b>\n{"event": "relieved", "day": 451, "te')
+        self.assertIn('not json &lt;b&gt;', log_viewer.render_page())
+        # Extended in place, the incomplete last line is left out
+        self.assertIs(index.offsets, offsets)
+        self.assertEqual(index.line_count, 452)
+
+        self.write_log(3)
+        self.assertIn('Lines 1-4 of 4', log_viewer.render_page())
+        self.assertIsNot(index.offsets, offsets)
+
+    def test_polling_after_offset(self):
+        response = self.client.get('/thewall/log/?limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([line['record']['event'] for line in response.data['lines']], ['relieved', 'finished'])
+        self.assertEqual(response.data['next'], os.path.getsize(self.path))
+        log_id = response.data['log_id']
+
+        following = self.client.get(f"/thewall/log/?after={response.data['next']}&log_id={log_id}").data
+        self.assertEqual(following['lines'], [])
+        self.assertFalse(following['reset'])
+
+        self.append('{"time": "t", "event": "relieved", "day": 451, "team": 2}\n{"event": "reli')
+        following = self.client.get(f"/thewall/log/?after={following['next']}&log_id={log_id}").data
+        self.assertEqual([line['text'] for line in following['lines']], ['t - Team 2 - Day 451 - Relieved (all sections completed)'])
+        self.assertEqual(following['lines'][0]['offset'], response.data['next'])
+
+        first_page = self.client.get('/thewall/log/?after=0&limit=1000').data
+        self.assertEqual(len(first_page['lines']), 452)
+        self.assertEqual(first_page['lines'][0]['record']['day'], 1)
+
+        # A new run rewrites the log
+        self.write_log(2)
+        rewritten = self.client.get(f"/thewall/log/?after={following['next']}&log_id={log_id}").data
+        self.assertTrue(rewritten['reset'])
+        self.assertNotEqual(rewritten['log_id'], log_id)
+        self.assertEqual([line['record']['day'] for line in rewritten['lines'][:2]], [1, 2])
+
+        self.assertEqual(self.client.get('/thewall/log/?after=-1').status_code, 400)
+        self.assertEqual(self.client.get('/thewall/log/?limit=ten').status_code, 400)
+
+
+class LiveEventsTests(UploadTestCase):
+    def setUp(self):
+        super().setUp()
+        live.broker.clear()
+        metrics_registry.reset()
+
+    async def next_chunk(self, stream):
+        chunk = await asyncio.wait_for(anext(stream), 5)
+        return chunk.decode() if isinstance(chunk, bytes) else chunk
+
+    def events(self, text):
+        return [
+            (line.split(': ', 1)[1], json.loads(data.split(': ', 1)[1]))
+            for line, data in (block.splitlines()[-2:] for block in text.split('\n\n') if 'data: ' in block)
+        ]
+
+    async def test_streams_events_with_day_changes(self):
+        stream = live.broker.stream()
+        state = self.events(await self.next_chunk(stream))
+        self.assertEqual(state, [('state', {
+            'running': False, 'started': None, 'finished': None, 'day': 0, 'persisted': {}, 'plan_id': None,
+        })])
+        self.assertEqual(live.broker.subscribers, 1)
+
+        def run():
+            # The log is off, the events still reach the subscribers
+            with ProgressLog(enabled=False) as progress_log:
+                progress_log.event('started', teams=2, max_height=30)
+                progress_log.event('completed', day=1, team=1, profile='Profile 1', section=1, height=30)
+                progress_log.event('completed', day=3, team=2, profile='Profile 1', section=2, height=30)
+                progress_log.event('relieved', day=4, team=1)
+                progress_log.finish(days=3, teams=2)
+
+        await asyncio.to_thread(run)
+        text = await self.next_chunk(stream)
+        while 'event: finished' not in text:
+            text += await self.next_chunk(stream)
+        received = [(event, data.get('day')) for event, data in self.events(text)]
+        self.assertEqual(received, [
+            ('started', None), ('day', 1), ('completed', 1), ('day', 3), ('completed', 3),
+            ('day', 4), ('relieved', 4), ('finished', None),
+        ])
+        self.assertEqual(self.events(text)[2][1]['section'], 1)
+        self.assertIn('id: 2\nevent: finished', text)
+        self.assertEqual(live.broker.state()['day'], 4)
+
+        await stream.aclose()
+        self.assertEqual(live.broker.subscribers, 0)
+
+    async def test_slow_subscriber_gets_the_coalesced_state(self):
+        with override_settings(WALL_CONSTRUCTION={**settings.WALL_CONSTRUCTION, 'LIVE_BUFFER_EVENTS': 10}):
+            stream = live.broker.stream()
+            await self.next_chunk(stream)
+            live.broker.publish_event('started', teams=1, max_height=30)
+            for day in range(1, 21):
+                live.broker.publish([(0.0, 'relieved', {'day': day, 'team': team}) for team in (1, 2)])
+            live.broker.publish_event('persisted', table='thewall_progresssegment', rows=40)
+
+            lagged, state = self.events(await self.next_chunk(stream))
+            self.assertEqual(lagged, ('lagged', {'dropped': 42}))
+            self.assertEqual(state[1]['day'], 20)
+            self.assertEqual(state[1]['persisted'], {'thewall_progresssegment': 40})
+            self.assertTrue(state[1]['running'])
+
+            # Back in step with the broker
+            live.broker.publish_event('finished', days=20, teams=1, dropped=0)
+            self.assertEqual([event for event, _ in self.events(await self.next_chunk(stream))], ['finished'])
+            await stream.aclose()
+
+    async def test_resumes_after_last_event_id(self):
+        for day in range(1, 4):
+            live.broker.publish_event('relieved', day=day, team=1)
+        stream = live.broker.stream(last_event_id=1)
+        await self.next_chunk(stream)
+        self.assertEqual([data['day'] for event, data in self.events(await self.next_chunk(stream)) if event == 'relieved'], [2, 3])
+        await stream.aclose()
+
+    async def test_heartbeat(self):
+        stream = live.broker.stream(heartbeat_seconds=0.01)
+        await self.next_chunk(stream)
+        self.assertEqual(await self.next_chunk(stream), ': keepalive\n\n')
+        self.assertEqual(await self.next_chunk(stream), ': keepalive\n\n')
+        # An idle stream does not leave a waiter behind for every heartbeat
+        self.assertEqual(live.broker._waiters, {})
+        await stream.aclose()
+
+    async def test_endpoint_over_asgi(self):
+        response = await self.async_client.get('/thewall/live/', headers={'Last-Event-ID': '0'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        stream = aiter(response.streaming_content)
+        self.assertIn('event: state', await self.next_chunk(stream))
+        live.broker.publish_event('activated', plan_id=7)
+        self.assertIn('"plan_id": 7', await self.next_chunk(stream))
+        # The server cancels the stream when the client disconnects
+        waiting = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(live.broker.subscribers, 0)
+
+        # Recorded by the middleware once the stream is closed
+        self.assertIn('thewall_http_responses_total{view="live_events",method="GET",status="2xx"} 1', metrics_registry.render())
+        self.assertEqual((await self.async_client.get('/thewall/live/?last_event_id=x')).status_code, 400)
+
+    def test_needs_an_asgi_server(self):
+        response = self.client.get('/thewall/live/')
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.json()['success'])
+
+    def test_upload_publishes_persistence_progress(self):
+        response = self.upload(query='?engine=events&teams=2')
+        self.assertEqual(response.status_code, 201)
+        state = live.broker.state()
+        self.assertEqual(state['plan_id'], response.data['plan_id'])
+        self.assertFalse(state['running'])
+        self.assertEqual(state['finished']['teams'], 2)
+        self.assertEqual(state['persisted'], response.data['ingestion']['rows'])
+
+
+class SegmentStorageTests(UploadTestCase):
+    """
+    The read endpoints answer from the segments alone, with or without daily rows.
+    """
+
+    def responses(self):
+        batch = self.client.post(
+            '/thewall/profiles/days/batch/',
+            {'pairs': [[1, 1], [3, 9], [3, 60], [2, 300]], 'ranges': [{'profile_id': 3, 'from': 1, 'to': 80}]},
+            format='json',
+        )
+        paths = ['/thewall/profiles/overview/']
+        for day in (1, 5, 13, 40, 87, 200):
+            paths.append(f'/thewall/profiles/overview/{day}/')
+            for profile_id in (1, 2, 3):
+                paths.append(f'/thewall/profiles/{profile_id}/days/{day}/')
+                paths.append(f'/thewall/profiles/{profile_id}/overview/{day}/')
+        series = self.client.get('/thewall/profiles/3/series/?from=10&to=70')
+        return (
+            [self.client.get(path).json() for path in paths],
+            batch.json(),
+            json.loads(b''.join(series.streaming_content)),
+        )
+
+    def test_daily_rows_are_optional(self):
+        self.upload(query='?engine=events&teams=2')
+        with_daily_rows = self.responses()
+        daily_rows = active_progress().count()
+
+        with override_settings(WALL_CONSTRUCTION={**settings.WALL_CONSTRUCTION, 'STORE_DAILY_PROGRESS': False}):
+            response = self.upload(query='?engine=events&teams=2')
+            self.assertEqual(response.data['daily_progress_rows'], daily_rows)
+            self.assertFalse(active_progress().exists())
+            self.assertLess(active_segments().count(), daily_rows)
+            self.assertEqual(self.responses(), with_daily_rows)
+
+    def test_segments_match_daily_rows(self):
+        for query in ('', '?parallel=true&teams=3', '?engine=events&teams=4'):
+            with self.subTest(query=query):
+                self.upload(query=query)
+                expanded = {
+                    (profile_id, day): (crews, ice_amount, cost)
+                    for profile_id, start_day, end_day, crews, ice_amount, cost in
+                    active_segments().values_list('profile_id', 'start_day', 'end_day', 'active_crews', 'ice_amount', 'cost')
+                    for day in range(start_day, end_day + 1)
+                }
+                daily = {
+                    (profile_id, day): (crews, ice_amount, cost)
+                    for profile_id, day, crews, ice_amount, cost in
+                    active_progress().values_list('profile_id', 'day', 'active_crews', 'ice_amount', 'cost')
+                }
+                self.assertEqual(expanded, daily)
+
+
+class SimulateTests(UploadTestCase):
+    def test_resimulates_stored_plan(self):
+        self.upload()
+        unlimited = progress_snapshot()
+        plan = [(number, height) for number, heights in enumerate([[21, 25, 28], [17], [17, 22, 17, 19, 17]], 1) for height in heights]
+        profiles = list(plans.active_profiles().order_by('number').values_list('number', 'name', 'heights'))
+
+        response = self.client.post('/thewall/simulate/?teams=2&engine=events')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['engine'], 'events')
+        self.upload(query='?engine=events&teams=2')
+        uploaded = progress_snapshot()
+        self.client.post('/thewall/simulate/?teams=2&engine=events')
+        self.assertEqual(progress_snapshot(), uploaded)
+
+        for num_teams in (1, 3):
+            with self.subTest(num_teams=num_teams):
+                response = self.client.post(f'/thewall/simulate/?teams={num_teams}')
+                self.assertEqual(response.data['engine'], 'threads')
+                self.assertEqual(
+                    active_progress().aggregate(last_day=Max('day'))['last_day'],
+                    max(day for _, day in reference_team_schedule([(p, None, h) for p, h in plan], num_teams, 30)),
+                )
+
+        response = self.client.post('/thewall/simulate/')
+        self.assertEqual(response.data['engine'], 'analytic')
+        self.assertEqual(progress_snapshot(), unlimited)
+
+        # Every simulation is a new version of the same profiles
+        self.assertEqual(
+            list(plans.active_profiles().order_by('number').values_list('number', 'name', 'heights')), profiles
+        )
+        self.assertEqual(section_heights(), [height for _, height in plan])
+
+    def test_invalidates_cached_reads(self):
+        self.upload()
+        before = self.client.get('/thewall/profiles/overview/1/').json()
+        self.client.post('/thewall/simulate/?teams=1')
+        self.assertNotEqual(self.client.get('/thewall/profiles/overview/1/').json(), before)
+
+    def test_errors(self):
+        self.assertEqual(self.client.post('/thewall/simulate/?teams=2').status_code, 404)
+        self.upload()
+        self.assertEqual(self.client.post('/thewall/simulate/?teams=two').status_code, 400)
+        self.assertEqual(self.client.post('/thewall/simulate/?engine=gpu').status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.post('/thewall/simulate/?teams=2').status_code, (401, 403))
+
+
+class PackedPlanTests(UploadTestCase):
+    def test_heights_are_packed_per_profile(self):
+        self.upload()
+
+        profile = Profile.objects.get(name='Profile 3')
+        self.assertEqual(bytes(profile.heights), bytes([17, 22, 17, 19, 17]))
+        self.assertEqual(profile.heights_view().tolist(), [17, 22, 17, 19, 17])
+        self.assertEqual(load_plan_heights()[profile.id].tolist(), [17, 22, 17, 19, 17])
+
+    def test_admin_compatibility_view(self):
+        self.upload()
+        self.client.force_login(User.objects.get(username='admin'))
+
+        response = self.client.get('/admin/thewall/section/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '9 sections')
+        self.assertEqual(self.client.get('/admin/thewall/section/5/change/').status_code, 200)
+
+        # Sections follow their profile, there is nothing to cascade to
+        Profile.objects.get(name='Profile 1').delete()
+        self.assertEqual(Section.objects.count(), 6)
+
+
+class ResultStoreTests(UploadTestCase):
+    def test_same_plan_is_reused(self):
+        first = self.upload(query='?engine=events&teams=2')
+        self.assertFalse(first.data['reused'])
+        expected = progress_snapshot()
+        expected_segments = active_segments().count()
+
+        # Formatting does not change the normalized plan
+        second = self.upload(b'21, 25,28\n17\n17,22,17,19,17', query='?engine=events&teams=2')
+        self.assertTrue(second.data['reused'])
+        self.assertEqual(second.data['daily_progress_rows'], first.data['daily_progress_rows'])
+        self.assertEqual(progress_snapshot(), expected)
+        self.assertEqual(active_segments().count(), expected_segments)
+
+        # Neither do empty lines, which only shift the profile names
+        self.assertTrue(self.upload(b'21,25,28\n\n17\n17,22,17,19,17\n', query='?engine=events&teams=2').data['reused'])
+        self.assertEqual(
+            sorted({name for name, *_ in progress_snapshot()}), ['Profile 1', 'Profile 3', 'Profile 4']
+        )
+        self.assertEqual([row[1:] for row in progress_snapshot()], [row[1:] for row in expected])
+
+        self.assertFalse(self.upload(query='?engine=events&teams=3').data['reused'])
+        self.assertFalse(self.upload(query='?engine=threads&teams=2').data['reused'])
+        with override_settings(WALL_CONSTRUCTION={**settings.WALL_CONSTRUCTION, 'COST_PER_CUBIC_YARD': 2000}):
+            self.assertFalse(self.upload(query='?engine=events&teams=2').data['reused'])
+
+    def test_restored_run_is_logged_and_published(self):
+        live.broker.clear()
+        self.upload(query='?engine=events&teams=2')
+        response = self.upload(query='?engine=events&teams=2')
+        self.assertTrue(response.data['reused'])
+
+        with open(os.path.join(self.base_dir.name, 'wall_progress.log')) as log_file:
+            records = [json.loads(line) for line in log_file]
+        self.assertEqual([record['event'] for record in records], ['restored'])
+        self.assertEqual(records[0]['method'], 'events (with 2 teams)')
+        self.assertEqual(records[0]['rows'], response.data['daily_progress_rows'])
+        state = live.broker.state()
+        self.assertFalse(state['running'])
+        self.assertEqual(state['finished']['rows'], response.data['daily_progress_rows'])
+
+    def test_result_version_is_part_of_the_key(self):
+        plan = [array('B', [21, 25, 28]), array('B', [17])]
+        key = results.result_key(plan, 'events', 2)
+        version = results.RESULT_VERSION
+        results.RESULT_VERSION = version + 1
+        try:
+            self.assertNotEqual(results.result_key(plan, 'events', 2), key)
+        finally:
+            results.RESULT_VERSION = version
+
+    def test_simulate_reuses_uploaded_results(self):
+        self.upload(query='?engine=events&teams=2')
+        expected = progress_snapshot()
+        self.assertFalse(self.client.post('/thewall/simulate/?teams=1').data['reused'])
+
+        response = self.client.post('/thewall/simulate/?teams=2&engine=events')
+        self.assertTrue(response.data['reused'])
+        self.assertEqual(progress_snapshot(), expected)
+
+    def test_least_recently_used_results_are_evicted(self):
+        self.upload(query='?teams=1&engine=events')
+        self.upload(query='?teams=2&engine=events')
+        self.assertTrue(self.upload(query='?teams=1&engine=events').data['reused'])
+        plan = {1: [21, 25, 28], 2: [17], 3: [17, 22, 17, 19, 17]}
+        segments = len(list(team_limited_runs(plan_sections(plan), 3, 30)))
+
+        with override_settings(WALL_CONSTRUCTION={**settings.WALL_CONSTRUCTION, 'RESULT_STORE_MAX_ROWS': segments}):
+            self.upload(query='?teams=3&engine=events')
+            # teams=2 was used least recently and goes first, teams=1 follows to make room
+            self.assertEqual(list(SimulationResult.objects.values_list('num_teams', flat=True)), [3])
+            self.assertTrue(self.upload(query='?teams=3&engine=events').data['reused'])
+
+        with override_settings(WALL_CONSTRUCTION={**settings.WALL_CONSTRUCTION, 'RESULT_STORE_MAX_ROWS': 0}):
+            self.assertFalse(self.upload(query='?teams=3&engine=events').data['reused'])
+
+
+class PlanVersionTests(UploadTestCase):
+    def reads(self):
+        series = self.client.get('/thewall/profiles/3/series/?to=20')
+        return (
+            self.client.get('/thewall/profiles/overview/').json(),
+            self.client.get('/thewall/profiles/3/days/1/').json(),
+            self.client.get('/thewall/profiles/3/overview/2/').json(),
+            self.client.post('/thewall/profiles/days/batch/', {'pairs': [[1, 1], [3, 2]]}, format='json').json(),
+            json.loads(b''.join(series.streaming_content)) if series.status_code == 200 else series.status_code,
+        )
+
+    def test_reads_use_active_plan_during_upload(self):
+        self.upload()
+        before = self.reads()
+        during = []
+
+        def on_phase(phase, progress):
+            if phase == 'simulating':
+                # Uncached reads while the new version is being built
+                response_cache.clear()
+                during.append(self.reads())
+
+        result = process_plan([array('B', [0, 0]), array('B', []), array('B', [29])], 'analytic', on_phase=on_phase)
+
+        # At the start of the phase and again as the progress rows are stored
+        self.assertTrue(during)
+        self.assertEqual(during, [before] * len(during))
+        self.assertEqual(plans.active_plan_id(), result['plan_id'])
+        after = self.reads()
+        self.assertNotEqual(after, before)
+        self.assertEqual(after[0]['cost'], f"{61 * 195 * 1900:,}")
+        self.assertEqual(after[4], 404)
+
+    def test_failed_upload_keeps_active_plan(self):
+        self.upload()
+        active = plans.active_plan_id()
+        before = self.reads()
+
+        with self.assertRaises(ValueError):
+            process_plan([array('B', [1, 2])], 'gpu')
+
+        self.assertEqual(plans.active_plan_id(), active)
+        self.assertEqual(self.reads(), before)
+        self.assertEqual(Plan.objects.get(state=Plan.FAILED).profiles.count(), 1)
+
+        self.assertEqual(len(plans.collect_garbage(delay=3600)), 1)
+        self.assertEqual(list(Plan.objects.values_list('id', 'state')), [(active, Plan.ACTIVE)])
+
+    def test_interrupted_upload_is_discarded(self):
+        self.upload()
+        active = plans.active_plan_id()
+
+        def interrupt(phase, progress):
+            if phase == 'simulating':
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            process_plan([array('B', [1, 2])], 'analytic', on_phase=interrupt)
+        self.assertEqual(plans.collect_garbage(delay=3600), [active + 1])
+        self.assertEqual(plans.active_plan_id(), active)
+
+    def test_abandoned_builds_are_collected_after_the_build_timeout(self):
+        self.upload()
+        active = plans.active_plan_id()
+        # Left building by a process that died mid-upload
+        abandoned = plans.start_version()
+        insert_plan([[1, 2]], abandoned.id)
+
+        self.assertEqual(plans.collect_garbage(), [])
+        Plan.objects.filter(id=abandoned.id).update(created_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(plans.collect_garbage(), [abandoned.id])
+        self.assertEqual(list(Plan.objects.values_list('id', flat=True)), [active])
+        self.assertFalse(Section.objects.exclude(profile__plan_id=active).exists())
+
+    def test_retired_versions_are_collected_in_background(self):
+        self.upload(query='?engine=events&teams=2')
+        first = plans.active_plan_id()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.client.post('/thewall/simulate/')
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(Plan.objects.get(id=first).state, Plan.RETIRED)
+        before = self.reads()
+
+        # Kept for reads that resolved it just before the switch-over
+        self.assertEqual(plans.collect_garbage(delay=3600), [])
+        self.assertEqual(plans.collect_garbage(delay=0), [first])
+
+        self.assertEqual(list(Plan.objects.values_list('state', flat=True)), [Plan.ACTIVE])
+        self.assertEqual(Profile.objects.count(), 3)
+        self.assertEqual(ProgressSegment.objects.count(), active_segments().count())
+        self.assertEqual(DailyProgress.objects.count(), active_progress().count())
+        self.assertEqual(self.reads(), before)
+
+
+    def test_activations_share_one_pending_collection(self):
+        self.addCleanup(plans.wait_for_gc)
+        with override_settings(WALL_CONSTRUCTION={**settings.WALL_CONSTRUCTION, 'PLAN_GC_DELAY': 3600}):
+            with self.captureOnCommitCallbacks(execute=True):
+                plans.schedule_gc()
+            timer = plans._gc_timer
+            with self.captureOnCommitCallbacks(execute=True):
+                plans.schedule_gc()
+        self.assertIs(plans._gc_timer, timer)
+        # Never keeps the interpreter from exiting
+        self.assertTrue(timer.daemon)
+        timer.cancel()
+
+class ReadDatabaseTests(TransactionTestCase):
+    """
+    Outside a test transaction the read alias is a connection of its own.
+    """
+    databases = {'default', 'readonly'}
+
+    def setUp(self):
+        response_cache.clear()
+        plan = Plan.objects.create(state=Plan.ACTIVE)
+        profile = Profile.objects.create(plan=plan, number=1, name='Profile 1', heights=bytes([28]))
+        DatasetState.objects.create(pk=1, active_plan=plan)
+        write_progress((profile.id, day, 1, 195, 370500) for day in (1, 2))
+
+    def test_get_endpoints_use_read_alias(self):
+        with CaptureQueriesContext(connections['readonly']) as reads, CaptureQueriesContext(connection) as writes:
+            self.assertEqual(self.client.get('/thewall/profiles/1/days/2/').json()['ice_amount'], '195')
+            self.assertEqual(self.client.get('/thewall/profiles/overview/').json()['cost'], '741,000')
+            series = self.client.get('/thewall/profiles/1/series/?fields=cumulative_cost')
+            self.assertEqual(json.loads(b''.join(series.streaming_content))['cumulative_cost'], [370500, 741000])
+
+        self.assertGreater(len(reads), 0)
+        self.assertEqual(len(writes), 0)
+
+    def test_read_alias_refuses_writes(self):
+        with self.assertRaises(OperationalError):
+            with connections['readonly'].cursor() as cursor:
+                cursor.execute("DELETE FROM progress_segments")
+
+    def test_bulk_load_restores_pragmas(self):
+        def synchronous():
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA synchronous")
+                return cursor.fetchone()[0]
+
+        before = synchronous()
+        with bulk_load():
+            self.assertEqual(synchronous(), 0)
+        self.assertEqual(synchronous(), before)
+
+
+class MetricsTests(UploadTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics_registry.reset()
+
+    def sample(self, text, series):
+        for line in text.splitlines():
+            if line.startswith(series + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        return None
+
+    def test_records_latency_and_queries_per_url_name(self):
+        self.upload()
+        self.assertEqual(self.client.get('/thewall/profiles/3/days/2/').status_code, 200)
+        series = self.client.get('/thewall/profiles/3/series/')
+        b''.join(series.streaming_content)
+        self.client.get('/thewall/no-such-page/')
+
+        response = self.client.get('/thewall/metrics/')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+
+        labels = '{view="profile_day_detail",method="GET"}'
+        self.assertEqual(self.sample(text, f'thewall_http_request_duration_seconds_count{labels}'), 1)
+        # Cache generation, then one seek for the segment
+        self.assertEqual(self.sample(text, f'thewall_db_queries_per_request_sum{labels}'), 2)
+        self.assertEqual(
+            self.sample(text, 'thewall_http_request_duration_seconds_bucket{view="profile_day_detail",method="GET",le="+Inf"}'), 1
+        )
+        self.assertEqual(
+            self.sample(text, 'thewall_http_responses_total{view="profile_day_detail",method="GET",status="2xx"}'), 1
+        )
+        # The series queries run while the body streams
+        self.assertGreater(self.sample(text, 'thewall_db_queries_per_request_sum{view="profile_series",method="GET"}'), 0)
+        self.assertGreater(self.sample(text, 'thewall_db_query_duration_seconds_total{view="upload_csv",method="POST"}'), 0)
+        self.assertEqual(
+            self.sample(text, 'thewall_http_responses_total{view="<unmatched>",method="GET",status="4xx"}'), 1
+        )
+        self.assertGreater(self.sample(text, 'thewall_metrics_overhead_seconds_total'), 0)
+
+    def test_counts_queries_of_sync_views_under_asgi(self):
+        self.upload()
+        response_cache.clear()
+        client = AsyncClient()
+
+        async def overlapping_requests():
+            # Each request keeps its own counter while they run together
+            return await asyncio.gather(*[client.get(f'/thewall/profiles/{profile_id}/overview/2/') for profile_id in (1, 2, 3)])
+
+        self.assertEqual([response.status_code for response in async_to_sync(overlapping_requests)()], [200] * 3)
+
+        text = self.client.get('/thewall/metrics/').content.decode()
+        labels = '{view="profile_overview",method="GET"}'
+        self.assertEqual(self.sample(text, f'thewall_http_request_duration_seconds_count{labels}'), 3)
+        # Cache generation and the cost lookup of each request, run in sync_to_async threads
+        self.assertEqual(self.sample(text, f'thewall_db_queries_per_request_sum{labels}'), 6)
+        self.assertGreater(self.sample(text, f'thewall_db_query_duration_seconds_total{labels}'), 0)
+
+    def test_can_be_disabled(self):
+        with override_settings(WALL_CONSTRUCTION={**settings.WALL_CONSTRUCTION, 'METRICS_ENABLED': False}):
+            client = APIClient()
+            client.get('/thewall/profiles/1/days/1/')
+            text = client.get('/thewall/metrics/').content.decode()
+        self.assertNotIn('view="profile_day_detail"', text)
+
+
+class BenchWallTests(TestCase):
+    def test_generated_plans_are_seeded(self):
+        self.assertEqual(generate_plan('small', 'uniform', seed=3), generate_plan('small', 'uniform', seed=3))
+        self.assertNotEqual(generate_plan('small', 'uniform', seed=3), generate_plan('small', 'uniform', seed=4))
+        for distribution in DISTRIBUTIONS:
+            plan = generate_plan((4, 50), distribution)
+            self.assertEqual([len(heights) for heights in plan], [50] * 4)
+            self.assertTrue(all(0 <= height <= 30 for heights in plan for height in heights))
+        self.assertEqual(set(generate_plan((2, 10), 'zero')[0]), {0})
+        self.assertTrue(all(height >= 28 for heights in generate_plan((3, 100), 'near_complete') for height in heights))
+        with self.assertRaises(ValueError):
+            generate_plan('tiny', 'bimodal')
+
+    def test_compare_flags_regressions_beyond_threshold_and_noise(self):
+        def result(case, status='ok', **metrics):
+            return {'case': case, 'status': status, **metrics}
+
+        baseline = {'results': [
+            result('a', wall_seconds=1.0, peak_rss_mb=60.0, queries=10, rows_written=100),
+            result('b', wall_seconds=0.01, peak_rss_mb=60.0, queries=10, rows_written=100),
+            result('c', wall_seconds=1.0),
+            result('d', status='timeout'),
+        ]}
+        regressions = bench_wall.compare([
+            result('a', wall_seconds=1.3, peak_rss_mb=62.0, queries=11, rows_written=100),
+            # Three times slower, but by less than the noise floor
+            result('b', wall_seconds=0.03, peak_rss_mb=60.0, queries=10, rows_written=100),
+            result('c', status='error'),
+            result('d', wall_seconds=50.0),
+            result('new', wall_seconds=9.0),
+        ], baseline, threshold=20)
+        self.assertEqual(regressions, [('a', 'wall_seconds', 1.0, 1.3), ('c', 'status', 'ok', 'error')])
+
+    def test_reports_every_case_as_json(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command(
+                'bench_wall', sizes=['tiny'], distributions=['uniform'], engines=['analytic', 'events'], teams=[2],
+                output=output, stdout=io.StringIO(),
+            )
+            with open(output) as report_file:
+                report = json.load(report_file)
+            self.assertEqual([r['case'] for r in report['results']], ['tiny/uniform/analytic', 'tiny/uniform/events/2'])
+            for r in report['results']:
+                self.assertEqual(r['status'], 'ok')
+                self.assertGreater(r['peak_rss_mb'], 0)
+                self.assertGreater(r['queries'], 0)
+                self.assertEqual(r['rows']['profiles'], 5)
+                self.assertEqual(r['rows_written'], sum(r['rows'].values()))
+
+            # A baseline that used a tenth of the queries fails the run
+            for r in report['results']:
+                r['queries'] //= 10
+            with open(output, 'w') as report_file:
+                json.dump(report, report_file)
+            with self.assertRaises(CommandError):
+                call_command(
+                    'bench_wall', sizes=['tiny'], distributions=['uniform'], engines=['analytic'],
+                    baseline=output, stdout=io.StringIO(), stderr=io.StringIO(),
+                )
+
+
+class BenchAsyncReadsTests(TestCase):
+    def test_requests_follow_the_mix(self):
+        rng = random.Random(0)
+        paths = [bench_async_reads.request_path(rng, 3, 5) for _ in range(10000)]
+        kinds = [
+            sum(1 for path in paths if path.count('/') == 6 and '/days/' in path),
+            sum(1 for path in paths if path.count('/') == 6 and '/overview/' in path),
+            sum(1 for path in paths if path.count('/') == 5 and path != '/thewall/profiles/overview/'),
+            paths.count('/thewall/profiles/overview/'),
+        ]
+        for count, (share, _) in zip(kinds, bench_async_reads.MIX):
+            self.assertAlmostEqual(count / len(paths), share, delta=0.02)
+        self.assertEqual(
+            {path for path in paths if '/days/' in path},
+            {f'/thewall/profiles/{number}/days/{day}/' for number in range(1, 4) for day in range(1, 6)},
+        )
@@ -1,20 +1,60 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
 
+# Read views served under ASGI: the async ones skip the thread hop of a sync view
+if settings.WALL_CONSTRUCTION.get('ASYNC_READ_VIEWS', False):
+    profile_day_detail = views.aprofile_day_detail
+    profile_overview = views.aprofile_overview
+    profiles_overview = views.aprofiles_overview
+    all_profiles_overview = views.aall_profiles_overview
+else:
+    profile_day_detail = views.profile_day_detail
+    profile_overview = views.profile_overview
+    profiles_overview = views.profiles_overview
+    all_profiles_overview = views.all_profiles_overview
+
 urlpatterns = [
     path("", views.index, name="index"),
     path("upload-csv/", views.upload_csv, name="upload_csv"),
+
+    # POST /simulate/?teams=5&engine=events
+    path("simulate/", views.simulate, name="simulate"),
+
+    # GET /jobs/1/
+    path("jobs/<int:job_id>/", views.job_detail, name="job_detail"),
+
+    # GET /uploads/profiles/20260101-120000000000-0123abcd/
+    path("uploads/profiles/<slug:profile_id>/", views.upload_profile, name="upload_profile"),
     
     # GET /profiles/1/days/1/
-    path("profiles/<int:profile_id>/days/<int:day_num>/", views.profile_day_detail, name="profile_day_detail"),
+    path("profiles/<int:profile_id>/days/<int:day_num>/", profile_day_detail, name="profile_day_detail"),
     
+    # GET /profiles/1/series/?from=1&to=30&fields=days,ice
+    path("profiles/<int:profile_id>/series/", views.profile_series, name="profile_series"),
+
+    # POST /profiles/days/batch/
+    path("profiles/days/batch/", views.profile_days_batch, name="profile_days_batch"),
+
     # GET /profiles/1/overview/1/
-    path("profiles/<int:profile_id>/overview/<int:day_num>/", views.profile_overview, name="profile_overview"),
+    path("profiles/<int:profile_id>/overview/<int:day_num>/", profile_overview, name="profile_overview"),
     
     # GET /profiles/overview/1/
-    path("profiles/overview/<int:day_num>/", views.profiles_overview, name="profiles_overview"),
+    path("profiles/overview/<int:day_num>/", profiles_overview, name="profiles_overview"),
 
     # GET /profiles/overview/
-    path("profiles/overview/", views.all_profiles_overview, name="profiles_overview"),
+    path("profiles/overview/", all_profiles_overview, name="all_profiles_overview"),
+
+    # GET /cache/
+    path("cache/", views.cache_stats, name="cache_stats"),
+
+    # GET /metrics/
+    path("metrics/", views.metrics, name="metrics"),
+
+    # GET /log/?after=0
+    path("log/", views.construction_log, name="construction_log"),
+
+    # GET /live/ (Server-Sent Events, ASGI only)
+    path("live/", views.live_events, name="live_events"),
 ]
@@ -1,18 +1,47 @@
-from django.http import HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.models import Group, User
 from django.conf import settings
-from django.db import transaction
-from django.db.models import Sum
+from django.db import connection, router
+from django.db.models import BigIntegerField, F, Q, Sum, Value
+from django.db.models.functions import Least
+from django.views.decorators.http import require_GET, require_safe
 from rest_framework import permissions, viewsets, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 import os
-import csv
-import io
+import json
 import time
-
-from thewall.serializers import GroupSerializer, UserSerializer, CSVUploadSerializer
-from thewall.models import Profile, Section, DailyProgress
+from array import array
+from bisect import bisect_right
+from itertools import repeat
+
+from thewall.serializers import GroupSerializer, UserSerializer, CSVUploadSerializer, BatchLookupSerializer
+from thewall import jobs
+from thewall import plans
+from thewall import results
+from thewall import cache as response_cache
+from thewall import live
+from thewall import log_viewer
+from thewall.cache import cached_response, current_generation
+from thewall.db import bulk_load, read_database
+from thewall.metrics import registry as metrics_registry
+from thewall import profiling
+from thewall.profiling import PhaseTimer
+from thewall.models import (
+    DailyProgress, Profile, SimulationJob, ProgressSegment,
+)
+from thewall.engines import (
+    height_histogram, unlimited_crew_series, daily_progress_rows, plan_sections, team_limited_runs,
+    parallel_profile_series, expected_daily_rows,
+)
+from thewall.ingestion import (
+    IngestionStats, batched, insert_plan, load_plan_heights, write_progress, write_runs,
+)
+from thewall.plans import active_profiles, plan_profiles
+from thewall.progress_log import ProgressLog
 
 class UserViewSet(viewsets.ModelViewSet):
     """
@@ -32,6 +61,324 @@ class GroupViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
 
+SEQUENTIAL_ENGINES = ('analytic', 'processes', 'loop')
+TEAM_LIMITED_ENGINES = ('threads', 'events')
+
+
+def parse_engine_params(params):
+    """
+    Read the engine selection from upload query parameters.
+
+    ?parallel=true&teams=N selects the team-limited simulation ('threads' by
+    default), otherwise the unlimited-crew one ('analytic' by default).
+    ?engine= picks a specific implementation; a team-limited engine may be
+    requested on its own, with ?teams= defaulting to one team per section.
+    ?workers=N sets the process count of the 'processes' engine.
+
+    Returns:
+        tuple: (engine, num_teams, workers)
+
+    Raises:
+        ValidationError: for a malformed team count or an unknown engine.
+    """
+    use_parallel = params.get('parallel', 'false').lower() == 'true'
+    teams_param = params.get('teams', None)
+    engine = params.get('engine', None)
+
+    num_teams = None
+    if teams_param:
+        try:
+            num_teams = int(teams_param)
+        except ValueError:
+            raise ValidationError({'teams': ['Number of teams must be a valid integer']})
+
+    workers = None
+    workers_param = params.get('workers', None)
+    if workers_param:
+        try:
+            workers = int(workers_param)
+        except ValueError:
+            raise ValidationError({'workers': ['Number of workers must be a valid integer']})
+        if workers < 1:
+            raise ValidationError({'workers': ['Number of workers must be at least 1']})
+
+    team_limited = (use_parallel and teams_param) or engine in TEAM_LIMITED_ENGINES
+    if engine is None:
+        engine = 'threads' if team_limited else 'analytic'
+
+    allowed = TEAM_LIMITED_ENGINES if team_limited else SEQUENTIAL_ENGINES
+    if engine not in allowed:
+        raise ValidationError({'engine': [f"Unknown engine '{engine}'. Choose one of: {', '.join(allowed)}"]})
+
+    return engine, num_teams if team_limited else None, workers
+
+
+def get_worker_count(workers=None):
+    """
+    Worker processes for the 'processes' engine, from settings.WALL_CONSTRUCTION['WORKERS'] by default.
+    """
+    if workers is None:
+        workers = settings.WALL_CONSTRUCTION.get('WORKERS') or os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def run_engine(engine, num_teams=None, stats=None, workers=None, heights_by_profile=None, plan_id=None):
+    """
+    Calculate daily progress of a plan version (the active one by default) with the given engine.
+
+    heights_by_profile lets the unlimited-crew engines use the parsed plan
+    directly instead of reading the sections back from the database.
+
+    Returns:
+        int: Number of daily rows calculated.
+    """
+    if engine == 'threads':
+        return calculate_daily_progress_parallel(num_teams=num_teams, stats=stats, plan_id=plan_id)
+    if engine == 'events':
+        return calculate_daily_progress_events(num_teams=num_teams, stats=stats, plan_id=plan_id)
+    return calculate_daily_progress(
+        engine=engine, stats=stats, workers=workers, heights_by_profile=heights_by_profile, plan_id=plan_id,
+    )
+
+
+def run_or_reuse(key, engine, num_teams=None, stats=None, workers=None, heights_by_profile=None, plan_id=None,
+                 timer=None):
+    """
+    Restore the stored result for key into a plan version, or run the engine and store its result.
+
+    The time spent is added to the 'lookup', 'restore' or 'simulation' and
+    'result_store' phases of timer, a thewall.profiling.PhaseTimer.
+
+    Returns:
+        tuple: (daily rows, whether a stored result was reused)
+    """
+    if timer is None:
+        timer = PhaseTimer()
+
+    with timer.phase('lookup'):
+        stored = results.lookup(key)
+    if stored is not None:
+        with timer.phase('restore'):
+            progress_rows = results.restore(stored, plan_id, stats=stats)
+        # The engine did not run, the log and the live page still get a record of the run
+        with ProgressLog() as progress_log:
+            progress_log.event('restored', method=describe_engine(engine, num_teams, workers), rows=progress_rows)
+        return progress_rows, True
+
+    with timer.phase('simulation'):
+        progress_rows = run_engine(
+            engine, num_teams, stats=stats, workers=workers, heights_by_profile=heights_by_profile, plan_id=plan_id,
+        )
+    with timer.phase('result_store'):
+        results.save(key, engine, num_teams, progress_rows, plan_id)
+    return progress_rows, False
+
+
+def describe_engine(engine, num_teams=None, workers=None):
+    """
+    Human-readable calculation method for API responses.
+    """
+    if engine == 'threads':
+        return f"parallel (with {num_teams} teams)"
+    if engine in TEAM_LIMITED_ENGINES:
+        return f"{engine} (with {num_teams} teams)"
+    if engine == 'analytic':
+        return "sequential"
+    if engine == 'processes':
+        return f"sequential (processes, {get_worker_count(workers)} workers)"
+    return f"sequential ({engine})"
+
+
+def process_plan(plan, engine, num_teams=None, workers=None, on_phase=None, timer=None):
+    """
+    Store a new plan version, calculate its daily progress (or restore it
+    when the result store already has it) and switch the reads over to it.
+
+    The version is built without a long transaction: nothing reads it until
+    plans.activate() moves the pointer, so the previous version keeps
+    answering requests meanwhile and a failed upload leaves it in place.
+
+    Args:
+        plan (list): Section heights per CSV line, see thewall.parsing.parse_plan_chunks().
+        engine (str): One of SEQUENTIAL_ENGINES or TEAM_LIMITED_ENGINES.
+        num_teams (int): Teams for a team-limited engine.
+        workers (int): Worker processes for the 'processes' engine.
+        on_phase (callable): Optional callback, called as on_phase(phase, progress)
+            with progress in percent whenever a new phase starts, and again
+            from the progress writer as the daily rows are stored, against
+            thewall.engines.expected_daily_rows().
+        timer (PhaseTimer): Collects the time of every phase, a new one by default.
+            Its totals are returned as 'timings'.
+
+    Returns:
+        dict: Row counts, engine and timings for the upload response.
+    """
+    if on_phase is not None:
+        on_phase('inserting', 10)
+
+    if timer is None:
+        timer = PhaseTimer()
+    expected_rows = 0
+    if on_phase is not None:
+        expected_rows = expected_daily_rows(
+            plan, settings.WALL_CONSTRUCTION['MAX_HEIGHT'], num_teams if engine in TEAM_LIMITED_ENGINES else None,
+        )
+
+    def on_record(table, rows):
+        live.persisted(table, rows)
+        if expected_rows and table == DailyProgress._meta.db_table:
+            # 30% once the plan is stored, at most 95% until the result is activated
+            on_phase('simulating', 30 + min(65, 65 * rows // expected_rows))
+
+    ingestion = IngestionStats(on_record=on_record)
+    with timer.phase('version'):
+        version = plans.start_version()
+
+    try:
+        # Nothing reads the new version until plans.activate()
+        with bulk_load():
+            with timer.phase('insert'):
+                profiles_created, sections_created = insert_plan(plan, version.id, stats=ingestion)
+                profile_ids = Profile.objects.filter(plan=version).order_by('number').values_list('id', flat=True)
+                heights_by_profile = dict(zip(profile_ids, [heights for heights in plan if heights]))
+            insert_seconds = ingestion.seconds
+
+            if on_phase is not None:
+                on_phase('simulating', 30)
+
+            # calculate daily progress for all profiles
+            start_time = time.time()
+            with timer.phase('lookup'):
+                key = results.result_key(plan, engine, num_teams)
+            progress_rows, reused = run_or_reuse(
+                key, engine, num_teams, stats=ingestion, workers=workers,
+                heights_by_profile=heights_by_profile, plan_id=version.id, timer=timer,
+            )
+            # Spent in INSERT statements, mostly by the writer thread while the simulation runs
+            timer.add('progress_write', ingestion.seconds - insert_seconds)
+
+            if engine == 'threads' and not reused:
+                print(f"Parallel calculation with {num_teams} teams completed.")
+            calculation_method = describe_engine(engine, num_teams, workers)
+
+            end_time = time.time()
+            calculation_time_ms = (end_time - start_time) * 1000
+    except BaseException:
+        # Also on SystemExit or KeyboardInterrupt, a killed process leaves it to the build timeout
+        plans.discard(version)
+        raise
+
+    with timer.phase('activation'):
+        plans.activate(version)
+    live.broker.publish_event('activated', plan_id=version.id)
+
+    return {
+        'plan_id': version.id,
+        'profiles_created': profiles_created,
+        'sections_created': sections_created,
+        'daily_progress_calculated': True,
+        'daily_progress_rows': progress_rows,
+        'calculation_method': calculation_method,
+        'engine': engine,
+        'reused': reused,
+        'calculation_time_ms': round(calculation_time_ms, 2),
+        'timings': timer.as_dict(),
+        'ingestion': ingestion.as_dict(),
+    }
+
+
+def simulate_stored_plan(engine, num_teams=None, workers=None):
+    """
+    Recalculate the daily progress of the stored plan with another engine or team count.
+
+    The profiles of the active version are copied into a new version, which
+    only costs one row per profile, and the new progress is written there.
+    The current progress keeps being served until the switch-over.
+
+    Returns:
+        dict: Row counts, engine and timings for the simulate response.
+    """
+    timer = PhaseTimer()
+    stats = IngestionStats(on_record=live.persisted)
+    with timer.phase('version'):
+        version = plans.copy_version(plans.active_plan_id())
+
+    try:
+        # Nothing reads the new version until plans.activate()
+        with bulk_load():
+            start_time = time.time()
+            with timer.phase('load'):
+                heights_by_profile = load_plan_heights(version.id)
+            with timer.phase('lookup'):
+                key = results.result_key(list(heights_by_profile.values()), engine, num_teams)
+            progress_rows, reused = run_or_reuse(
+                key, engine, num_teams, stats=stats, workers=workers,
+                heights_by_profile=heights_by_profile, plan_id=version.id, timer=timer,
+            )
+            timer.add('progress_write', stats.seconds)
+            calculation_time_ms = (time.time() - start_time) * 1000
+    except BaseException:
+        # Also on SystemExit or KeyboardInterrupt, a killed process leaves it to the build timeout
+        plans.discard(version)
+        raise
+
+    with timer.phase('activation'):
+        plans.activate(version)
+    live.broker.publish_event('activated', plan_id=version.id)
+
+    return {
+        'plan_id': version.id,
+        'daily_progress_calculated': True,
+        'daily_progress_rows': progress_rows,
+        'calculation_method': describe_engine(engine, num_teams, workers),
+        'engine': engine,
+        'reused': reused,
+        'calculation_time_ms': round(calculation_time_ms, 2),
+        'timings': timer.as_dict(),
+        'ingestion': stats.as_dict(),
+    }
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAdminUser])
+def simulate(request):
+    """
+    POST /thewall/simulate/?teams=N&engine=...
+    Recalculates the daily progress of the stored plan without re-uploading it.
+    Accepts the engine parameters of upload_csv; ?teams=N alone selects the
+    team-limited simulation. The initial heights are left untouched.
+    """
+    params = request.GET.copy()
+    params.setdefault('parallel', 'true')
+    try:
+        engine, num_teams, workers = parse_engine_params(params)
+    except ValidationError as e:
+        return Response({
+            'success': False,
+            'errors': e.detail
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if plans.active_plan_id() is None:
+        return Response({
+            'success': False,
+            'errors': {'plan': ['No plan has been uploaded yet']}
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        result = simulate_stored_plan(engine, num_teams=num_teams, workers=workers)
+    except Exception as e:
+        return Response({
+            'success': False,
+            'errors': {'engine': [f'Error simulating plan: {str(e)}']}
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return Response({
+        'success': True,
+        'message': 'Daily progress recalculated from the stored plan',
+        **result,
+    })
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAdminUser])
 def upload_csv(request):
@@ -39,87 +386,80 @@ def upload_csv(request):
     API for upload mechanism of CSV file config for the wall sections.
     Saves to wall_construction_plan.csv
     Creates profiles and sections from CSV data and calculates daily progress.
+
+    With ?async=true the plan is stored as a SimulationJob and processed in
+    the background; the response is 202 with the job id to poll.
+
+    The response reports the time of every phase in 'timings'. With
+    ?profile=cprofile the upload runs under cProfile, and the response links
+    the stored pstats dump (see upload_profile).
     """
-    serializer = CSVUploadSerializer(data=request.data)
+    started = time.perf_counter()
+    timer = PhaseTimer()
+    serializer = CSVUploadSerializer(
+        data=request.data,
+        context={'copy_to': os.path.join(settings.BASE_DIR, 'wall_construction_plan.csv'), 'timer': timer},
+    )
+
+    # Check if parallel processing is requested, before any table is touched
+    try:
+        engine, num_teams, workers = parse_engine_params(request.GET)
+    except ValidationError as e:
+        return Response({
+            'success': False,
+            'errors': e.detail
+        }, status=status.HTTP_400_BAD_REQUEST)
 
-    if serializer.is_valid():
+    run_async = request.GET.get('async', 'false').lower() == 'true'
+    profiler = request.GET.get('profile')
+    if profiler is not None:
+        if profiler not in profiling.PROFILERS:
+            return Response({
+                'success': False,
+                'errors': {'profile': [f"Unknown profiler '{profiler}'. Use one of: {', '.join(profiling.PROFILERS)}"]}
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if run_async:
+            return Response({
+                'success': False,
+                'errors': {'profile': ['Background uploads cannot be profiled, leave out async=true']}
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        with profiling.capture() as dump:
+            response = _handle_upload(request, serializer, engine, num_teams, workers, run_async, timer, started)
+        response.data['profile'] = {
+            'id': dump['id'],
+            'url': request.build_absolute_uri(f"/thewall/uploads/profiles/{dump['id']}/"),
+        }
+        return response
+
+    return _handle_upload(request, serializer, engine, num_teams, workers, run_async, timer, started)
+
+
+def _handle_upload(request, serializer, engine, num_teams, workers, run_async, timer, started):
+    with timer.phase('validation'):
+        valid = serializer.is_valid()
+
+    if valid:
         try:
-            uploaded_file = serializer.validated_data['file']
-
-            file_path = os.path.join(settings.BASE_DIR, 'wall_construction_plan.csv')
-            with open(file_path, 'wb') as destination:
-                for chunk in uploaded_file.chunks():
-                    destination.write(chunk)
-
-            uploaded_file.seek(0)
-            file_content = uploaded_file.read().decode('utf-8')
-            csv_reader = csv.reader(io.StringIO(file_content))
-            rows = list(csv_reader)
-
-            with transaction.atomic():
-                DailyProgress.objects.all().delete()
-                Section.objects.all().delete() 
-                Profile.objects.all().delete()
-
-                # Reset auto-increment counters to ensure IDs start from 1
-                from django.db import connection
-                cursor = connection.cursor()
-                cursor.execute("DELETE FROM sqlite_sequence WHERE name='profiles';")
-                cursor.execute("DELETE FROM sqlite_sequence WHERE name='sections';")
-                cursor.execute("DELETE FROM sqlite_sequence WHERE name='daily_progress';")
-                print("Tables cleared and auto-increment reset.")
-
-                for profile_idx, row in enumerate(rows, 1):
-                    if not row or all(cell.strip() == '' for cell in row):
-                        continue
-
-                    # create profile
-                    profile = Profile.objects.create(name=f"Profile {profile_idx}")
-
-                    # create sections for this profile
-                    for section_value in row:
-                        if section_value.strip():
-                            Section.objects.create(
-                                profile=profile,
-                                height=int(section_value.strip())
-                            )
-
-                # calculate daily progress for all profiles
-                start_time = time.time()
-
-                # Check if parallel processing is requested
-                use_parallel = request.GET.get('parallel', 'false').lower() == 'true'
-                teams_param = request.GET.get('teams', None)
-
-                if use_parallel and teams_param:
-                    try:
-                        num_teams = int(teams_param)
-
-                        # Call the parallel implementation with specified teams
-                        calculate_daily_progress_parallel(num_teams=num_teams)
-                        print(f"Parallel calculation with {num_teams} teams completed.")
-
-                        calculation_method = f"parallel (with {num_teams} teams)"
-                    except ValueError:
-                        return Response({
-                            'success': False,
-                            'errors': {'teams': ['Number of teams must be a valid integer']}
-                        }, status=status.HTTP_400_BAD_REQUEST)
-                else:
-                    # Default calculation
-                    calculate_daily_progress()
-                    calculation_method = "sequential"
-
-                end_time = time.time()
-                calculation_time_ms = (end_time - start_time) * 1000
+            # Parsed while validating, in the same pass that saved wall_construction_plan.csv
+            plan = serializer.validated_data['plan']
+
+            if run_async:
+                job = jobs.submit(plan, engine, num_teams=num_teams, workers=workers)
+                return Response({
+                    'success': True,
+                    'message': 'CSV file uploaded, processing in the background',
+                    'job_id': job.id,
+                    'status_url': request.build_absolute_uri(f'/thewall/jobs/{job.id}/'),
+                }, status=status.HTTP_202_ACCEPTED)
+
+            result = process_plan(plan, engine, num_teams=num_teams, workers=workers, timer=timer)
+            result['timings']['total_ms'] = round((time.perf_counter() - started) * 1000, 2)
 
             return Response({
                 'success': True,
                 'message': 'CSV file uploaded and processed successfully',
-                'profiles_created': len(rows),
-                'daily_progress_calculated': True,
-                'calculation_method': calculation_method if 'calculation_method' in locals() else "sequential",
-                'calculation_time_ms': round(calculation_time_ms, 2)
+                **result,
             }, status=status.HTTP_201_CREATED)
 
         except Exception as e:
@@ -135,7 +475,57 @@ def upload_csv(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
-def calculate_daily_progress_parallel(num_teams=None):
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def upload_profile(request, profile_id):
+    """
+    GET /thewall/uploads/profiles/{id}/
+    Downloads the pstats dump of an upload made with ?profile=cprofile,
+    to be read with python -m pstats or a viewer such as snakeviz.
+    """
+    path = profiling.profile_path(profile_id)
+    if path is None or not os.path.exists(path):
+        return Response({'error': f'Profile {profile_id} not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    return FileResponse(
+        open(path, 'rb'), as_attachment=True, filename=f'{profile_id}.pstats', content_type='application/octet-stream',
+    )
+
+
+@read_database
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def job_detail(request, job_id):
+    """
+    GET /thewall/jobs/{id}/
+    Returns state, progress, timings and errors of a background upload
+    """
+    try:
+        job = SimulationJob.objects.defer('plan').get(id=job_id)
+    except SimulationJob.DoesNotExist:
+        return Response({'error': f'Job {job_id} not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    jobs.fail_if_stale(job)
+    phase, progress = jobs.live_status(job.id) or (job.phase, job.progress)
+
+    return Response({
+        'id': job.id,
+        'state': job.state,
+        'phase': phase,
+        'progress': progress,
+        'engine': job.engine,
+        'teams': job.num_teams,
+        'workers': job.workers,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'timings': job.timings,
+        'error': job.error or None,
+        'result': job.result,
+    })
+
+
+def calculate_daily_progress_parallel(num_teams=None, stats=None, plan_id=None):
     """
     Calculate daily progress for all profiles based on construction rules:
     - Limited number of teams available
@@ -145,29 +535,20 @@ def calculate_daily_progress_parallel(num_teams=None):
     - Construction stops when section reaches max height (configurable)
     - Teams move to the next available section after finishing one
 
+    The simulation yields each day's per-profile tallies as soon as the teams
+    of that day are done, and write_progress() stores them in batches while
+    the simulation carries on. Section heights are only kept in memory.
+
     Args:
         num_teams (int): Number of available teams. If None, one team per section.
+        stats (IngestionStats): Optional collector for insert counts and timings.
+        plan_id (int): Plan version to simulate, the active one by default.
+
+    Returns:
+        int: Number of DailyProgress rows written.
     """
     import threading
     import queue
-    import os
-    import logging
-    from datetime import datetime
-
-    # Setup logging to file with timestamps
-    log_file = os.path.join(settings.BASE_DIR, 'wall_progress.log')
-    logging.basicConfig(
-        filename=log_file,
-        level=logging.INFO,
-        format='%(asctime)s - Team %(name)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-
-    # Clear the log file at the start of a new calculation
-    with open(log_file, 'w') as f:
-        start_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        f.write(f"Wall Construction Progress Log - Started on {start_time}\n")
-        f.write("-" * 80 + "\n\n")
 
     # Load config values from settings
     config = settings.WALL_CONSTRUCTION
@@ -175,239 +556,243 @@ def calculate_daily_progress_parallel(num_teams=None):
     COST_PER_CUBIC_YARD = config['COST_PER_CUBIC_YARD']
     MAX_HEIGHT = config['MAX_HEIGHT']
 
-    # Load profiles and sections from database (read-only)
-    profiles = list(Profile.objects.all().prefetch_related('sections'))
-
-    # Create a dictionary to track the current state of all sections (in-memory only)
+    # Current state of all sections in plan order (in-memory only)
+    profile_names = dict(plan_profiles(plan_id).values_list('id', 'name'))
     section_heights = {}
     section_profiles = {}
-
-    # Initial population of section heights dictionary
-    for profile in profiles:
-        for section in profile.sections.all():
-            section_heights[(profile.id, section.id)] = section.height
-            section_profiles[section.id] = profile.name
-
-    #print(f"Configuration: {CUBIC_YARDS_PER_CREW_PER_DAY} cubic yards per crew per day")
-    #print(f"Cost per cubic yard: ${COST_PER_CUBIC_YARD}")
-    #print(f"Max wall height: {MAX_HEIGHT} feet")
-
-    logging.getLogger("Simulation").info(f"Started with {num_teams} teams - Max height: {MAX_HEIGHT}ft")
+    for profile_id, section_id, height in plan_sections(load_plan_heights(plan_id)):
+        section_heights[(profile_id, section_id)] = height
+        section_profiles[section_id] = profile_names[profile_id]
 
     if num_teams is None:
-        total_sections = sum(1 for height in section_heights.values() if height < MAX_HEIGHT)
-        num_teams = total_sections
-        #print(f"No team count specified. Using {num_teams} teams (one per unfinished section)")
-    else:
-        pass
-        #print(f"Using {num_teams} teams")
-
+        num_teams = sum(1 for height in section_heights.values() if height < MAX_HEIGHT)
     if num_teams <= 0:
-        #print("WARNING: No teams specified or zero teams provided. Setting to 1 team.")
         num_teams = 1
 
-    day = 1
-    total_project_ice = 0
-
     # Track teams that have already been relieved to avoid duplicate log entries
     relieved_teams = set()
+    days_worked = 0
 
-    # Continue until all work is complete
-    while True:
-        #print(f"\n=== DAY {day} ===")
-        day_has_work = False
-        daily_work = {}  # Format: {profile_id: {'active_crews': count, 'ice_amount': total}}
+    def simulate_days():
+        """
+        Run the simulation day by day, yielding (profile_id, day, active_crews, ice_amount, cost) rows.
+        """
+        nonlocal days_worked
+        day = 1
+
+        while True:
+            daily_work = {}  # Format: {profile_id: active_crews}
+
+            # Queue the sections that still need work, in plan order
+            work_queue = queue.Queue()
+            for (profile_id, section_id), height in section_heights.items():
+                if height < MAX_HEIGHT:
+                    work_queue.put((profile_id, section_id))
+
+            if work_queue.empty():
+                break
+
+            lock = threading.Lock()
+
+            def team_worker(team_id):
+                """
+                Worker function that will be executed by each team
+                """
+                try:
+                    profile_id, section_id = work_queue.get(block=False)
+                except queue.Empty:
+                    # Only log when the team is relieved for the first time
+                    with lock:
+                        first_relief = team_id not in relieved_teams
+                        relieved_teams.add(team_id)
+                    if first_relief:
+                        progress_log.event('relieved', day=day, team=team_id)
+                    return
 
-        # Create a list of work items for sections that still need work
-        work_items = []
-        for (profile_id, section_id), height in section_heights.items():
-            if height < MAX_HEIGHT:
-                work_items.append((profile_id, section_id))
+                with lock:
+                    # Add 1 foot per day until max height
+                    new_height = section_heights[(profile_id, section_id)] + 1
+                    section_heights[(profile_id, section_id)] = new_height
+                    daily_work[profile_id] = daily_work.get(profile_id, 0) + 1
+
+                # Only log when the section reaches maximum height, outside the lock:
+                # the log only queues the record, the file is written by its own thread
+                if new_height == MAX_HEIGHT:
+                    progress_log.event(
+                        'completed', day=day, team=team_id, profile=section_profiles[section_id],
+                        section=section_id, height=new_height,
+                    )
 
-        if not work_items:
-            #print("All sections completed! Construction finished.")
-            break
+                work_queue.task_done()
 
-        # Create a work queue with all the work items
-        work_queue = queue.Queue()
-        for item in work_items:
-            work_queue.put(item)
+            # Process work with threads
+            threads = [threading.Thread(target=team_worker, args=(team_id,)) for team_id in range(1, num_teams + 1)]
+            for thread in threads:
+                thread.start()
 
-        lock = threading.Lock()
+            # Wait for all workers to finish the day's work
+            for thread in threads:
+                thread.join()
 
-        def team_worker(team_id):
-            """
-            Worker function that will be executed by each team
-            """
-            team_logger = logging.getLogger(str(team_id))
+            for profile_id in sorted(daily_work):
+                active_crews = daily_work[profile_id]
+                ice_amount = active_crews * CUBIC_YARDS_PER_CREW_PER_DAY
+                yield (profile_id, day, active_crews, ice_amount, ice_amount * COST_PER_CUBIC_YARD)
 
-            try:
-                # Try to get work from the queue
-                profile_id, section_id = work_queue.get(block=False)
+            days_worked = day
+            day += 1
 
-                # Get current height from our local copy
-                current_height = section_heights[(profile_id, section_id)]
+    with ProgressLog() as progress_log:
+        progress_log.event('started', teams=num_teams, max_height=MAX_HEIGHT)
+        rows_written = write_progress(simulate_days(), stats=stats)
+        progress_log.finish(days=days_worked, teams=num_teams)
 
-                if current_height < MAX_HEIGHT:
-                    # Add 1 foot per day until max height
-                    new_height = min(current_height + 1, MAX_HEIGHT)
+    if progress_log.enabled:
+        print(f"See full logs in {progress_log.path}")
+    return rows_written
 
-                    # Get profile name for output
-                    profile_name = section_profiles[section_id]
 
-                    # Update our in-memory section height
-                    with lock:
-                        section_heights[(profile_id, section_id)] = new_height
+def calculate_daily_progress_events(num_teams=None, stats=None, plan_id=None):
+    """
+    Calculate daily progress with a limited number of teams, using the
+    event-driven scheduler in thewall.engines.team_limited_runs().
 
-                        # Only log to file when the section reaches maximum height
-                        if new_height == MAX_HEIGHT:
-                            team_logger.info(f"Day {day} - Completed section on {profile_name}, Section {section_id} - Final height {new_height}")
+    Same construction rules as calculate_daily_progress_parallel(): every day
+    the teams work on the first unfinished sections in plan order. Instead of
+    starting a thread per team per day, the scheduler jumps from one section
+    completion to the next and emits runs of identical days.
 
-                        # Add to the daily work counter for this profile
-                        if profile_id not in daily_work:
-                            daily_work[profile_id] = {'active_crews': 0, 'ice_amount': 0}
+    Args:
+        num_teams (int): Number of available teams. If None, one team per section.
+        stats (IngestionStats): Optional collector for insert counts and timings.
+        plan_id (int): Plan version to simulate, the active one by default.
 
-                        daily_work[profile_id]['active_crews'] += 1
-                        daily_work[profile_id]['ice_amount'] += CUBIC_YARDS_PER_CREW_PER_DAY
+    Returns:
+        int: Number of DailyProgress rows written.
+    """
+    config = settings.WALL_CONSTRUCTION
+    MAX_HEIGHT = config['MAX_HEIGHT']
 
-                        # Mark that we have work for this day
-                        nonlocal day_has_work
-                        day_has_work = True
+    profile_names = dict(plan_profiles(plan_id).values_list('id', 'name'))
+    sections = plan_sections(load_plan_heights(plan_id))
+
+    last_day = 0
+    teams_used = set()
+
+    def log_event(event_type, day, team, profile_id, section_id):
+        nonlocal last_day
+        teams_used.add(team)
+        if event_type == 'completed':
+            last_day = max(last_day, day)
+            progress_log.event(
+                'completed', day=day, team=team, profile=profile_names[profile_id],
+                section=section_id, height=MAX_HEIGHT,
+            )
+        else:
+            progress_log.event('relieved', day=day, team=team)
 
-                work_queue.task_done()
-                return True
-            except queue.Empty:
-                # Only log to file when the team is relieved and there's no more work at all
-                # and this team hasn't already been logged as relieved
-                if work_queue.empty() and team_id not in relieved_teams:
-                    team_logger.info(f"Day {day} - Relieved (all sections completed)")
-                    # Add this team to the set of relieved teams
-                    relieved_teams.add(team_id)
-                return False
-
-        # Process work with threads
-        threads = []
-        for team_id in range(1, num_teams + 1):
-
-            # Start worker thread
-            thread = threading.Thread(target=team_worker, args=(team_id,))
-            thread.start()
-            threads.append(thread)
-
-        # Wait for all workers to finish the day's work
-        for thread in threads:
-            thread.join()
+    with ProgressLog() as progress_log:
+        progress_log.event('started', teams=num_teams, max_height=MAX_HEIGHT)
+        runs = team_limited_runs(sections, num_teams, MAX_HEIGHT, on_event=log_event)
+        rows_written = write_runs(runs, config, stats=stats)
+        progress_log.finish(days=last_day, teams=num_teams if num_teams is not None else len(teams_used))
+    return rows_written
 
-        if not day_has_work:
-            #print("All sections completed! Construction finished.")
-            break
-        day += 1
 
-    # Print final statistics
-    #print("\n=== FINAL STATISTICS ===")
-    #print(f"Days required: {day-1}")
+def calculate_daily_progress(engine='analytic', stats=None, workers=None, heights_by_profile=None, plan_id=None):
+    """
+    Calculate daily progress for all profiles based on construction rules:
+    - Each crew works on one section at a time
+    - Each crew produces X cubic yards per day (configurable)
+    - Each cubic yard costs Y (configurable)
+    - Construction stops when section reaches max height (configurable)
 
-    # Calculate total statistics
-    total_cost = total_project_ice * COST_PER_CUBIC_YARD
-    #print(f"Total ice used: {total_project_ice} cubic yards")
-    #print(f"Total cost: ${total_cost:,}")
+    Args:
+        engine (str): 'analytic' (default) computes every profile's series in
+            closed form from a histogram of its section heights.
+            'processes' computes the same series on a process pool, sharded by profile.
+            'loop' runs the original day-by-day simulation, kept for verification.
+        stats (IngestionStats): Optional collector for insert counts and timings.
+        workers (int): Worker processes for the 'processes' engine, defaults to
+            settings.WALL_CONSTRUCTION['WORKERS'].
+        heights_by_profile (dict): profile_id -> section heights in plan order.
+            Read from the stored plan when not given.
+        plan_id (int): Plan version to simulate, the active one by default.
+
+    Returns:
+        int: Number of DailyProgress rows written.
+    """
+    if engine == 'loop':
+        return calculate_daily_progress_loop(plan_id)
+    if engine not in ('analytic', 'processes'):
+        raise ValueError(f"Unknown sequential engine '{engine}'")
 
-    # Log only completion information to file
-    completion_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    summary_logger = logging.getLogger("Summary")
-    summary_logger.info(f"Construction completed in {day-1} days with {num_teams} teams")
+    config = settings.WALL_CONSTRUCTION
+    MAX_HEIGHT = config['MAX_HEIGHT']
 
-    # Add separator to log file for readability
-    with open(log_file, 'a') as f:
-        f.write("\n" + "-" * 80 + "\n")
-        f.write(f"End of simulation - {completion_time}\n")
+    if heights_by_profile is None:
+        heights_by_profile = load_plan_heights(plan_id)
 
-    # Always update the database
-    #print("\nUpdating database with simulation results...")
-    try:
-        with transaction.atomic():
-            # First, reset all sections to their initial heights as loaded from DB
-                for profile in profiles:
-                    profile_sections = list(profile.sections.all())
-                    for section in profile_sections:
-                        section.height = section_heights.get((profile.id, section.id), section.height)
-                        section.save()
-
-                # Then create daily progress records based on the simulation
-                DailyProgress.objects.all().delete()  # Clear existing records
-
-                current_heights = {}
-                for profile in profiles:
-                    for section in profile.sections.all():
-                        current_heights[(profile.id, section.id)] = 0
-
-                for day_num in range(1, day):
-                    for profile in profiles:
-                        active_crews = 0
-                        total_ice_amount = 0
-                        sections = profile.sections.all()
-
-                        for section in sections:
-                            current_height = current_heights.get((profile.id, section.id), 0)
-                            target_height = min(current_height + 1, MAX_HEIGHT)
-                            
-                            if current_height < MAX_HEIGHT:
-                                active_crews += 1
-                                total_ice_amount += CUBIC_YARDS_PER_CREW_PER_DAY
-                                current_heights[(profile.id, section.id)] = target_height
-
-                        if active_crews > 0:
-                            total_cost = total_ice_amount * COST_PER_CUBIC_YARD
-                            DailyProgress.objects.create(
-                                profile=profile,
-                                day=day_num,
-                                active_crews=active_crews,
-                                ice_amount=total_ice_amount,
-                                cost=total_cost
-                            )
-
-                print("Database updated successfully!")
+    if engine == 'processes':
+        profile_series = parallel_profile_series(heights_by_profile, MAX_HEIGHT, get_worker_count(workers))
+    else:
+        profile_series = (
+            (profile_id, unlimited_crew_series(height_histogram(heights, MAX_HEIGHT)))
+            for profile_id, heights in heights_by_profile.items()
+        )
 
-    except Exception as e:
-        print(f"Error updating database: {str(e)}")
-        logging.getLogger("Error").error(f"Failed to update database: {str(e)}")
+    rows_written = write_progress(daily_progress_rows(profile_series, config), stats=stats)
 
-    print(f"See full logs in {log_file}")
+    return rows_written
 
-def calculate_daily_progress():
+
+def calculate_daily_progress_loop(plan_id=None):
     """
     Calculate daily progress for all profiles based on construction rules:
     - Each crew works on one section at a time
     - Each crew produces X cubic yards per day (configurable)
     - Each cubic yard costs Y (configurable)
     - Construction stops when section reaches max height (configurable)
+
+    Original day-by-day implementation, visiting every section on every day.
+    Kept as the reference for calculate_daily_progress().
+    """
+    # Read before writing: the progress writer owns the connection while the rows are produced
+    profiles = list(plan_profiles(plan_id).order_by('number'))
+    return write_progress(_loop_progress_rows(profiles))
+
+
+def _loop_progress_rows(profiles):
+    """
+    Day-by-day simulation behind calculate_daily_progress_loop(), yielding
+    (profile_id, day, active_crews, ice_amount, cost) rows.
     """
     config = settings.WALL_CONSTRUCTION
     CUBIC_YARDS_PER_CREW_PER_DAY = config['CUBIC_YARDS_PER_CREW_PER_DAY']
     COST_PER_CUBIC_YARD = config['COST_PER_CUBIC_YARD']
     MAX_HEIGHT = config['MAX_HEIGHT']
 
-    profiles = Profile.objects.all()
     day = 1
 
+    # Heights reached so far; the stored initial heights are never changed
+    heights = {}
+
     # Continue until all work is complete
     while True:
         day_has_work = False
 
         for profile in profiles:
-            sections = profile.sections.all()
+            sections = profile.height_array()
             active_crews = 0
             total_ice_amount = 0
 
             # Count active crews
-            for section in sections:
-                if section.height < MAX_HEIGHT:
+            for position, initial_height in enumerate(sections):
+                height = heights.get((profile.id, position), initial_height)
+                if height < MAX_HEIGHT:
                     active_crews += 1
                     # Add 1 foot per day until max height
-                    # This will rewrite the height each day, simulating daily progress
-                    new_height = min(section.height + 1, MAX_HEIGHT)
-                    section.height = new_height
-                    section.save()
+                    heights[(profile.id, position)] = min(height + 1, MAX_HEIGHT)
 
                     # Calculate ice amount for this crew
                     total_ice_amount += CUBIC_YARDS_PER_CREW_PER_DAY
@@ -416,14 +801,7 @@ def calculate_daily_progress():
             # Create daily progress record if there's work
             if active_crews > 0:
                 total_cost = total_ice_amount * COST_PER_CUBIC_YARD
-
-                DailyProgress.objects.create(
-                    profile=profile,
-                    day=day,
-                    active_crews=active_crews,
-                    ice_amount=total_ice_amount,
-                    cost=total_cost
-                )
+                yield (profile.id, day, active_crews, total_ice_amount, total_cost)
 
         if not day_has_work:
             break
@@ -431,6 +809,39 @@ def calculate_daily_progress():
         day += 1
 
 
+def find_segment(profile_id, day_num):
+    """
+    The ProgressSegment of a profile of the active plan that covers day_num, or None.
+
+    Segments of a profile do not overlap, so the first one ending on or after
+    the day is found with a single seek on the (profile, end_day) index.
+    """
+    return _covering(_segment_query(profile_id, day_num).first(), day_num)
+
+
+async def afind_segment(profile_id, day_num):
+    """
+    Async version of find_segment().
+    """
+    return _covering(await _segment_query(profile_id, day_num).afirst(), day_num)
+
+
+def _segment_query(profile_id, day_num):
+    return (
+        ProgressSegment.objects
+        .filter(profile__in=active_profiles().filter(number=profile_id), end_day__gte=day_num)
+        .order_by('end_day')
+    )
+
+
+def _covering(segment, day_num):
+    if segment is None or segment.start_day > day_num:
+        return None
+    return segment
+
+
+@read_database
+@cached_response
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def profile_day_detail(request, profile_id, day_num):
@@ -439,20 +850,251 @@ def profile_day_detail(request, profile_id, day_num):
     Returns ice amount for specific profile on specific day
     """
     try:
-        progress = DailyProgress.objects.get(profile_id=profile_id, day=day_num)
+        segment = find_segment(profile_id, day_num)
         return Response({
             'day': str(day_num),
-            'ice_amount': str(progress.ice_amount)
-        })
-    except DailyProgress.DoesNotExist:
-        return Response({
-            'day': str(day_num),
-            'ice_amount': '0'
+            'ice_amount': str(segment.ice_amount if segment else 0)
         })
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+def lookup_ice_amounts(pairs, ranges):
+    """
+    Resolve many (profile_id, day) lookups against the active plan with a few set-based queries.
+
+    For every profile the segments overlapping the span of its requested days
+    are fetched with one "number = p AND end_day >= a AND start_day <= b"
+    term, the terms are OR-ed together in as few queries as the database
+    parameter limit allows, and the days are then resolved in memory.
+
+    Returns:
+        dict: (profile_id, day) -> ice_amount for the days that have progress.
+    """
+    spans = {}  # profile_id -> [first_day, last_day]
+    for profile_id, day in pairs:
+        span = spans.setdefault(profile_id, [day, day])
+        span[0], span[1] = min(span[0], day), max(span[1], day)
+    for day_range in ranges:
+        span = spans.setdefault(day_range['profile_id'], [day_range['from'], day_range['to']])
+        span[0], span[1] = min(span[0], day_range['from']), max(span[1], day_range['to'])
+
+    segments = {}  # profile_id -> [(start_day, end_day, ice_amount)]
+    max_terms = max(1, (connection.features.max_query_params or 999) // 3)
+    for chunk in batched(spans.items(), max_terms):
+        query = Q()
+        for profile_id, (first_day, last_day) in chunk:
+            query |= Q(profile__number=profile_id, end_day__gte=first_day, start_day__lte=last_day)
+        for profile_id, start_day, end_day, ice_amount in (
+            ProgressSegment.objects.filter(query, profile__in=active_profiles())
+            .order_by('profile__number', 'start_day')
+            .values_list('profile__number', 'start_day', 'end_day', 'ice_amount')
+        ):
+            segments.setdefault(profile_id, []).append((start_day, end_day, ice_amount))
+
+    found = {}
+    for profile_id, day in pairs:
+        profile_segments = segments.get(profile_id, [])
+        index = bisect_right(profile_segments, (day, float('inf'))) - 1
+        if index >= 0 and profile_segments[index][1] >= day:
+            found[(profile_id, day)] = profile_segments[index][2]
+    for day_range in ranges:
+        profile_id = day_range['profile_id']
+        for start_day, end_day, ice_amount in segments.get(profile_id, []):
+            for day in range(max(start_day, day_range['from']), min(end_day, day_range['to']) + 1):
+                found[(profile_id, day)] = ice_amount
+
+    return found
+
+
+@read_database
+@api_view(['POST'])
+@permission_classes([permissions.AllowAny])
+def profile_days_batch(request):
+    """
+    POST /thewall/profiles/days/batch/
+    Returns ice amounts for many (profile, day) pairs and day ranges at once.
+    Body: {"pairs": [[profile_id, day], ...], "ranges": [{"profile_id": 1, "from": 1, "to": 30}, ...]}
+    Days without progress report 0, like profile_day_detail.
+    """
+    serializer = BatchLookupSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    pairs = serializer.validated_data['pairs']
+    ranges = serializer.validated_data['ranges']
+    found = lookup_ice_amounts(pairs, ranges)
+
+    results = [[profile_id, day, found.get((profile_id, day), 0)] for profile_id, day in pairs]
+    for day_range in ranges:
+        profile_id = day_range['profile_id']
+        results.extend(
+            [profile_id, day, found.get((profile_id, day), 0)]
+            for day in range(day_range['from'], day_range['to'] + 1)
+        )
+
+    return Response({
+        'fields': ['profile_id', 'day', 'ice_amount'],
+        'count': len(results),
+        'results': results,
+    })
+
+
+SERIES_FIELDS = ('days', 'crews', 'ice', 'cost', 'cumulative_cost')
+
+
+def segment_values(field, segments, day_from, day_to):
+    """
+    Expand (start_day, end_day, active_crews, ice_amount, cost, cumulative_cost)
+    segments into the daily values of one series field, clipped to day_from..day_to.
+    """
+    for start_day, end_day, crews, ice_amount, cost, cumulative in segments:
+        first = max(start_day, day_from)
+        last = end_day if day_to is None else min(end_day, day_to)
+        count = last - first + 1
+        if count <= 0:
+            continue
+        if field == 'days':
+            yield from range(first, last + 1)
+        elif field == 'cumulative_cost':
+            total = cumulative - cost * (end_day - first)
+            for _ in range(count):
+                yield total
+                total += cost
+        else:
+            yield from repeat({'crews': crews, 'ice': ice_amount, 'cost': cost}[field], count)
+
+
+def stream_series(profile, day_from, day_to, fields, chunk_size, using=None):
+    """
+    Yield a profile's series as a JSON object of columnar arrays.
+
+    The segments are read in one query, before anything is sent, and kept
+    packed in an array; every column is then expanded from them one chunk
+    at a time, so the daily values are never all in memory. The profile row
+    is resolved once and its segments are read once, so all columns come
+    from the same plan version, and a version retired and collected while
+    the body is being sent cannot leave later columns empty. The body is
+    produced after the view has returned, so the database alias is passed in.
+    """
+    queryset = ProgressSegment.objects.using(using).filter(profile_id=profile.id, end_day__gte=day_from)
+    if day_to is not None:
+        queryset = queryset.filter(start_day__lte=day_to)
+    packed = array('q')
+    for segment in queryset.order_by('start_day').values_list(
+        'start_day', 'end_day', 'active_crews', 'ice_amount', 'cost', 'cumulative_cost'
+    ).iterator(chunk_size=chunk_size):
+        packed.extend(segment)
+
+    yield json.dumps({'profile_id': profile.number, 'from': day_from, 'to': day_to, 'fields': fields})[:-1]
+
+    for field in fields:
+        # Six values per segment
+        segments = zip(*[iter(packed)] * 6)
+        yield f', "{field}": ['
+        separator = ''
+        for batch in batched(segment_values(field, segments, day_from, day_to), chunk_size):
+            yield separator + ','.join(map(str, batch))
+            separator = ','
+        yield ']'
+
+    yield '}'
+
+
+@read_database
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def profile_series(request, profile_id):
+    """
+    GET /thewall/profiles/{id}/series/?from=&to=&fields=
+    Streams the daily series of a profile as columnar arrays.
+    fields is a comma-separated subset of days, crews, ice, cost, cumulative_cost (all by default).
+    Only days with progress are included; the days array gives their numbers.
+    """
+    try:
+        day_from = int(request.GET.get('from') or 1)
+        day_to = int(request.GET['to']) if request.GET.get('to') else None
+    except ValueError:
+        return Response({'error': "'from' and 'to' must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+    if day_from < 1 or (day_to is not None and day_to < day_from):
+        return Response({'error': "Expected 1 <= from <= to"}, status=status.HTTP_400_BAD_REQUEST)
+
+    fields = [field.strip() for field in request.GET.get('fields', '').split(',') if field.strip()]
+    fields = fields or list(SERIES_FIELDS)
+    unknown = [field for field in fields if field not in SERIES_FIELDS]
+    if unknown:
+        return Response(
+            {'error': f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(SERIES_FIELDS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    profile = active_profiles().filter(number=profile_id).only('id', 'number').first()
+    if profile is None:
+        return Response({'error': f'Profile {profile_id} not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    chunk_size = settings.WALL_CONSTRUCTION.get('SERIES_CHUNK_SIZE', 5000)
+    return StreamingHttpResponse(
+        stream_series(profile, day_from, day_to, fields, chunk_size, using=router.db_for_read(ProgressSegment)),
+        content_type='application/json'
+    )
+
+
+def cumulative_cost(day_num, profile_id=None):
+    """
+    Total cost up to and including day_num (all days if None), for one
+    profile or for all profiles of the active plan.
+
+    For one profile this is a single indexed lookup of the last segment
+    starting on or before day_num, minus the days of that segment after
+    day_num. For all profiles every segment contributes the cost of its days
+    up to day_num.
+    """
+    if profile_id is not None:
+        return _cost_up_to(_last_segment_query(day_num, profile_id).first(), day_num)
+    queryset, total = _total_cost_query(day_num)
+    return queryset.aggregate(total=total)['total'] or 0
+
+
+async def acumulative_cost(day_num, profile_id=None):
+    """
+    Async version of cumulative_cost().
+    """
+    if profile_id is not None:
+        return _cost_up_to(await _last_segment_query(day_num, profile_id).afirst(), day_num)
+    queryset, total = _total_cost_query(day_num)
+    return (await queryset.aaggregate(total=total))['total'] or 0
+
+
+def _last_segment_query(day_num, profile_id):
+    queryset = ProgressSegment.objects.filter(profile__in=active_profiles().filter(number=profile_id))
+    if day_num is not None:
+        queryset = queryset.filter(start_day__lte=day_num)
+    return queryset.order_by('-start_day').values_list('end_day', 'cost', 'cumulative_cost')
+
+
+def _cost_up_to(segment, day_num):
+    if segment is None:
+        return 0
+    end_day, cost, total = segment
+    if day_num is not None and day_num < end_day:
+        total -= cost * (end_day - day_num)
+    return total
+
+
+def _total_cost_query(day_num):
+    """
+    Segments of the active plan that start by day_num and the aggregate of their cost up to it.
+    """
+    queryset = ProgressSegment.objects.filter(profile__in=active_profiles())
+    last_day = F('end_day')
+    if day_num is not None:
+        queryset = queryset.filter(start_day__lte=day_num)
+        last_day = Least(F('end_day'), Value(day_num))
+    return queryset, Sum(F('cost') * (last_day - F('start_day') + 1), output_field=BigIntegerField())
+
+
+@read_database
+@cached_response
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def profile_overview(request, profile_id, day_num=1):
@@ -461,10 +1103,7 @@ def profile_overview(request, profile_id, day_num=1):
     Returns total cost for specific profile up to specified day
     """
     try:
-        total_cost = DailyProgress.objects.filter(
-            profile_id=profile_id,
-            day__lte=day_num
-        ).aggregate(total=Sum('cost'))['total'] or 0
+        total_cost = cumulative_cost(day_num, profile_id=profile_id)
 
         return Response({
             'day': str(day_num),
@@ -474,6 +1113,8 @@ def profile_overview(request, profile_id, day_num=1):
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+@read_database
+@cached_response
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def profiles_overview(request, day_num=None):
@@ -484,9 +1125,7 @@ def profiles_overview(request, day_num=None):
     try:
         if day_num:
             day_num = int(day_num)
-            total_cost = DailyProgress.objects.filter(
-                day__lte=day_num
-            ).aggregate(total=Sum('cost'))['total'] or 0
+            total_cost = cumulative_cost(day_num)
 
             return Response({
                 'day': str(day_num),
@@ -496,6 +1135,8 @@ def profiles_overview(request, day_num=None):
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+@read_database
+@cached_response
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def all_profiles_overview(request):
@@ -504,9 +1145,7 @@ def all_profiles_overview(request):
     Returns total cost for all profiles across all days
     """
     try:
-        total_cost = DailyProgress.objects.aggregate(
-            total=Sum('cost')
-        )['total'] or 0
+        total_cost = cumulative_cost(None)
 
         return Response({
             'day': None,
@@ -515,6 +1154,176 @@ def all_profiles_overview(request):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+
+# Async versions of the read views above, routed instead of them when
+# settings.WALL_CONSTRUCTION['ASYNC_READ_VIEWS'] is set (see thewall/urls.py).
+# DRF views are sync only, so these answer JSON whatever the Accept header.
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    """
+    JSON response rendered like the DRF views render it.
+    """
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status_code)
+
+
+@read_database
+@cached_response
+@require_safe
+async def aprofile_day_detail(request, profile_id, day_num):
+    """
+    Async version of profile_day_detail().
+    """
+    try:
+        segment = await afind_segment(profile_id, day_num)
+        return json_response({
+            'day': str(day_num),
+            'ice_amount': str(segment.ice_amount if segment else 0)
+        })
+    except Exception as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+
+@read_database
+@cached_response
+@require_safe
+async def aprofile_overview(request, profile_id, day_num=1):
+    """
+    Async version of profile_overview().
+    """
+    try:
+        total_cost = await acumulative_cost(day_num, profile_id=profile_id)
+        return json_response({
+            'day': str(day_num),
+            'cost': f"{total_cost:,}"
+        })
+    except Exception as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+
+@read_database
+@cached_response
+@require_safe
+async def aprofiles_overview(request, day_num):
+    """
+    Async version of profiles_overview().
+    """
+    try:
+        total_cost = await acumulative_cost(int(day_num))
+        return json_response({
+            'day': str(day_num),
+            'cost': f"{total_cost:,}"
+        })
+    except Exception as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+
+@read_database
+@cached_response
+@require_safe
+async def aall_profiles_overview(request):
+    """
+    Async version of all_profiles_overview().
+    """
+    try:
+        total_cost = await acumulative_cost(None)
+        return json_response({
+            'day': None,
+            'cost': f"{total_cost:,}"
+        })
+    except Exception as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def construction_log(request):
+    """
+    GET /thewall/log/?after=<offset>&log_id=<id>&limit=N
+    Lines of the construction log written after a byte offset, for
+    incremental polling: pass the 'next' offset and 'log_id' of the previous
+    response. Without ?after the last lines are returned. 'reset' is true
+    when the log was rewritten by a new run and is read from its start.
+    """
+    errors = {}
+    values = {}
+    for name in ('after', 'limit'):
+        if name not in request.GET:
+            values[name] = None
+            continue
+        try:
+            values[name] = int(request.GET[name])
+            if values[name] < 0:
+                raise ValueError
+        except ValueError:
+            errors[name] = ['A non-negative integer is required.']
+    if errors:
+        return Response({
+            'success': False,
+            'errors': errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(log_viewer.read_after(values['after'], values['limit'], request.GET.get('log_id')))
+
+
+@require_GET
+async def live_events(request):
+    """
+    GET /thewall/live/
+    Server-Sent Events of the simulations of this process while they run:
+    'state' on connect, then 'started', 'day', 'completed', 'relieved',
+    'finished', 'restored', 'persisted' and 'activated', see thewall.live. A reconnecting
+    browser resumes after its Last-Event-ID while that is still buffered.
+
+    The stream never ends, so it is only served by an ASGI server: a WSGI
+    worker would be held for as long as the client stays.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({
+            'success': False,
+            'errors': {'server': ['Live events need an ASGI server, poll /thewall/log/?after=<offset> instead.']}
+        }, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    last_event_id = request.headers.get('Last-Event-ID', request.GET.get('last_event_id'))
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return JsonResponse({
+                'success': False,
+                'errors': {'last_event_id': ['An integer is required.']}
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(live.broker.stream(last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep proxies such as nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@read_database
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def cache_stats(request):
+    """
+    GET /thewall/cache/
+    Returns hit and miss counters of the read endpoint cache in this process
+    """
+    return Response({
+        'generation': current_generation(),
+        'entries': len(response_cache.memory_cache),
+        'max_entries': response_cache.memory_cache.max_size,
+        **response_cache.stats.as_dict(),
+    })
+
+
+def metrics(request):
+    """
+    GET /thewall/metrics/
+    Returns request latency and SQL metrics per URL name in Prometheus text format
+    """
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 def index(request):
     """
     Show all available thewall API endpoints
@@ -542,6 +1351,36 @@ def index(request):
                     "description": "Upload CSV file with parallel calculation using 10 teams (Admin only)",
                     "authentication": "Admin required"
                 },
+                "csv_upload_async": {
+                    "url": f"{base_url}upload-csv/?async=true",
+                    "method": "POST",
+                    "description": "Upload CSV file and process it in the background, returns a job id (Admin only)",
+                    "authentication": "Admin required"
+                },
+                "simulate": {
+                    "url": f"{base_url}simulate/",
+                    "method": "POST",
+                    "description": "Recalculate daily progress of the stored plan with another engine or team count (?teams=N&engine=...) (Admin only)",
+                    "authentication": "Admin required"
+                },
+                "csv_upload_profiled": {
+                    "url": f"{base_url}upload-csv/?profile=cprofile",
+                    "method": "POST",
+                    "description": "Upload CSV file under cProfile and store a pstats dump of the run (Admin only)",
+                    "authentication": "Admin required"
+                },
+                "job_detail": {
+                    "url": f"{base_url}jobs/{{job_id}}/",
+                    "method": "GET",
+                    "description": "Get state, progress, timings and errors of a background upload (Admin only)",
+                    "authentication": "Admin required"
+                },
+                "upload_profile": {
+                    "url": f"{base_url}uploads/profiles/{{profile_id}}/",
+                    "method": "GET",
+                    "description": "Download the pstats dump of a profiled upload (Admin only)",
+                    "authentication": "Admin required"
+                },
                 "profile_day_detail": {
                     "url": f"{base_url}profiles/{{profile_id}}/days/{{day}}/",
                     "method": "GET",
@@ -554,6 +1393,12 @@ def index(request):
                     "description": "Get total cost for specific profile up to specified day",
                     "example": f"{base_url}profiles/1/overview/1/"
                 },
+                "profile_series": {
+                    "url": f"{base_url}profiles/{{profile_id}}/series/",
+                    "method": "GET",
+                    "description": "Stream the daily series of a profile as columnar arrays (?from=&to=&fields=)",
+                    "example": f"{base_url}profiles/1/series/?from=1&to=30"
+                },
                 "profiles_overview_with_day": {
                     "url": f"{base_url}profiles/overview/{{day}}/",
                     "method": "GET",
@@ -564,6 +1409,27 @@ def index(request):
                     "url": f"{base_url}profiles/overview/",
                     "method": "GET",
                     "description": "Get total cost for all profiles across all days"
+                },
+                "cache_stats": {
+                    "url": f"{base_url}cache/",
+                    "method": "GET",
+                    "description": "Get hit ratio of the read endpoint cache"
+                },
+                "metrics": {
+                    "url": f"{base_url}metrics/",
+                    "method": "GET",
+                    "description": "Request latency and SQL metrics per URL name in Prometheus text format"
+                },
+                "construction_log": {
+                    "url": f"{base_url}log/?after={{offset}}&log_id={{log_id}}",
+                    "method": "GET",
+                    "description": "Construction log lines written after a byte offset, for incremental polling",
+                    "example": f"{base_url}log/?after=0"
+                },
+                "live_events": {
+                    "url": f"{base_url}live/",
+                    "method": "GET",
+                    "description": "Server-Sent Events of the running simulation (ASGI server only)"
                 }
             },
             "configuration": {
@@ -577,15 +1443,12 @@ def index(request):
             content_type='application/json'
         )
     else:
-        log_content = ""
-        log_file_path = os.path.join(settings.BASE_DIR, 'wall_progress.log')
-        if os.path.exists(log_file_path):
-            try:
-                with open(log_file_path, 'r') as log_file:
-                    log_content = log_file.read()
-            except Exception as e:
-                log_content = f"Error reading log file: {str(e)}"
-        
+        try:
+            log_page = int(request.GET['log_page'])
+        except (KeyError, ValueError):
+            log_page = None
+        log_html = log_viewer.render_page(log_page if log_page is None or log_page >= 1 else 1)
+
         styles = """
         <style>
             body {
@@ -673,23 +1536,15 @@ def index(request):
                 color: #e74c3c;
                 font-weight: bold;
             }
+            .log-nav {
+                margin-bottom: 10px;
+            }
+            .log-nav a {
+                margin-left: 10px;
+            }
         </style>
         """
         
-        # Format log content with syntax highlighting
-        formatted_log = ""
-        if log_content:
-            lines = log_content.split('\n')
-            for line in lines:
-                if "Wall Construction Progress Log" in line or "Started on" in line or "End of simulation" in line or "-"*10 in line:
-                    formatted_log += f'<div class="header-line">{line}</div>'
-                elif "Completed section" in line:
-                    formatted_log += f'<div class="team-line highlight">{line}</div>'
-                else:
-                    formatted_log += f'<div class="team-line">{line}</div>'
-        else:
-            formatted_log = "No construction log available."
-
         html = f"""
         <!DOCTYPE html>
         <html lang="en">
@@ -709,10 +1564,18 @@ def index(request):
                         <li><a href="{request.build_absolute_uri('/thewall/')}?api=1">API Overview (JSON)</a></li>
                         <li><strong>POST</strong> <a href="{request.build_absolute_uri('/thewall/upload-csv/')}">/thewall/upload-csv/</a> - Upload CSV (Admin only)</li>
                         <li><strong>POST</strong> <a href="{request.build_absolute_uri('/thewall/upload-csv/?parallel=true&teams=10')}">/thewall/upload-csv/?parallel=true&teams=10</a> - Upload CSV with parallel simulation (Admin only)</li>
+                        <li><strong>POST</strong> <a href="{request.build_absolute_uri('/thewall/upload-csv/?async=true')}">/thewall/upload-csv/?async=true</a> - Upload CSV and process it in the background (Admin only)</li>
+                        <li><strong>POST</strong> <a href="{request.build_absolute_uri('/thewall/simulate/?teams=10')}">/thewall/simulate/?teams=10</a> - Re-simulate the stored plan (Admin only)</li>
+                        <li><strong>GET</strong> <a href="{request.build_absolute_uri('/thewall/jobs/1/')}">/thewall/jobs/1/</a> - Background upload status (Admin only)</li>
+                        <li><strong>GET</strong> /thewall/uploads/profiles/{{id}}/ - pstats dump of an upload made with ?profile=cprofile (Admin only)</li>
                         <li><strong>GET</strong> <a href="{request.build_absolute_uri('/thewall/profiles/1/days/1/')}">/thewall/profiles/1/days/1/</a> - Profile day details</li>
                         <li><strong>GET</strong> <a href="{request.build_absolute_uri('/thewall/profiles/1/overview/1/')}">/thewall/profiles/1/overview/1/</a> - Profile overview</li>
+                        <li><strong>GET</strong> <a href="{request.build_absolute_uri('/thewall/profiles/1/series/?from=1&to=30')}">/thewall/profiles/1/series/?from=1&to=30</a> - Profile daily series</li>
                         <li><strong>GET</strong> <a href="{request.build_absolute_uri('/thewall/profiles/overview/1/')}">/thewall/profiles/overview/1/</a> - All profiles overview</li>
                         <li><strong>GET</strong> <a href="{request.build_absolute_uri('/thewall/profiles/overview/')}">/thewall/profiles/overview/</a> - Total overview</li>
+                        <li><strong>GET</strong> <a href="{request.build_absolute_uri('/thewall/metrics/')}">/thewall/metrics/</a> - Request and SQL metrics (Prometheus)</li>
+                        <li><strong>GET</strong> <a href="{request.build_absolute_uri('/thewall/log/')}">/thewall/log/?after=0</a> - Construction log lines after a byte offset</li>
+                        <li><strong>GET</strong> /thewall/live/ - Server-Sent Events of the running simulation (ASGI server only)</li>
                     </ul>
                     
                     <h2>Configuration</h2>
@@ -727,9 +1590,7 @@ def index(request):
                 
                 <div class="log-container">
                     <h2>Wall Construction Progress Log</h2>
-                    <div class="log-viewer">
-                        {formatted_log}
-                    </div>
+                    {log_html}
                 </div>
             </div>
         </body>